@@ -0,0 +1,84 @@
+from collections.abc import Awaitable, Callable
+
+from starlette import status
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+
+from keycloak_oauth import User
+
+GetUser = Callable[[Request], Awaitable[User]]
+
+_NO_ROLES: frozenset[str] = frozenset()
+
+
+class Requirement:
+    """Authorization rule, compiled once when it is declared.
+
+    Use it as FastAPI dependency, e.g.
+    `Depends(require_roles("admin", get_user=keycloak.get_user))`, which returns the
+    user, or responds with `401` without a user and `403` if the rule is not met.
+    The user is taken from `KeycloakAuthMiddleware` if installed, otherwise from
+    `get_user`. Use :meth:`allows` for checks in code, e.g. in
+    `is_accessible` of starlette-admin views.
+
+    Requirements can be combined with `&` and `|`.
+
+    :param check: Predicate on the user
+    :param get_user: Dependency to get the user, e.g. `keycloak.get_user` of the
+        instance, which uses its session store, token refresh and logouts
+    """
+
+    def __init__(self, check: Callable[[User], bool], get_user: GetUser) -> None:
+        self.check = check
+        self.get_user = get_user
+
+    def allows(self, user: User | None) -> bool:
+        return user is not None and self.check(user)
+
+    def __and__(self, other: "Requirement") -> "Requirement":
+        first, second = self.check, other.check
+        return Requirement(lambda user: first(user) and second(user), self.get_user)
+
+    def __or__(self, other: "Requirement") -> "Requirement":
+        first, second = self.check, other.check
+        return Requirement(lambda user: first(user) or second(user), self.get_user)
+
+    async def __call__(self, request: Request) -> User:
+        user = request.scope.get("user")
+        if not isinstance(user, User):
+            user = await self.get_user(request)
+        if not self.check(user):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized"
+            )
+        return user
+
+
+def _roles(client: str | None) -> Callable[[User], frozenset[str]]:
+    if client is None:
+        return lambda user: user.roles
+    return lambda user: user.client_roles.get(client, _NO_ROLES)
+
+
+def require_roles(
+    *roles: str, get_user: GetUser, client: str | None = None
+) -> Requirement:
+    """Require all of the realm roles, or of the roles of `client` if given."""
+    required = frozenset(roles)
+    user_roles = _roles(client)
+    return Requirement(lambda user: required <= user_roles(user), get_user)
+
+
+def require_any(
+    *roles: str, get_user: GetUser, client: str | None = None
+) -> Requirement:
+    """Require at least one of the realm roles, or of the roles of `client` if given."""
+    required = frozenset(roles)
+    user_roles = _roles(client)
+    return Requirement(lambda user: not required.isdisjoint(user_roles(user)), get_user)
+
+
+def require_scope(*scopes: str, get_user: GetUser) -> Requirement:
+    """Require all of the scopes in the access token."""
+    required = frozenset(scopes)
+    return Requirement(lambda user: required <= user.scopes, get_user)
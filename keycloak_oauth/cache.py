@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded LRU cache whose entries expire after a time-to-live.
+
+    :param maxsize: Maximum number of entries, least recently used are evicted first
+    :param ttl: Default lifetime of an entry in seconds
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: K) -> V | None:
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return None
+        if expires <= self._timer():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store value, the lifetime is capped at the cache's default `ttl`."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (self._timer() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        try:
+            expires, value = self._data.pop(key)
+        except KeyError:
+            return None
+        return value if expires > self._timer() else None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class StripedTTLCache(Generic[K, V]):
+    """Thread-safe `TTLCache`, split into independently locked stripes.
+
+    Each key belongs to one stripe by its hash, so threads accessing different
+    keys rarely wait for the same lock. Entries are evicted per stripe.
+
+    :param maxsize: Maximum number of entries over all stripes
+    :param ttl: Default lifetime of an entry in seconds
+    :param stripes: Number of stripes, each with its own lock
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stripes: int = 16,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        size = -(-maxsize // stripes)
+        self._stripes = [
+            (threading.Lock(), TTLCache[K, V](size, ttl, timer)) for _ in range(stripes)
+        ]
+
+    def _stripe(self, key: K) -> tuple[threading.Lock, TTLCache[K, V]]:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def __len__(self) -> int:
+        return sum(len(cache) for _, cache in self._stripes)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: K) -> V | None:
+        lock, cache = self._stripe(key)
+        with lock:
+            return cache.get(key)
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store value, the lifetime is capped at the cache's default `ttl`."""
+        lock, cache = self._stripe(key)
+        with lock:
+            cache.set(key, value, ttl)
+
+    def pop(self, key: K) -> V | None:
+        lock, cache = self._stripe(key)
+        with lock:
+            return cache.pop(key)
+
+    def clear(self) -> None:
+        for lock, cache in self._stripes:
+            with lock:
+                cache.clear()
+
+
+class SingleFlight(Generic[K, V]):
+    """Coalesce concurrent calls with the same key into one in-flight call."""
+
+    def __init__(self) -> None:
+        self._calls: dict[K, asyncio.Future[V]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._calls
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        """Await `fn`, or the call already in flight for `key`.
+
+        The call is shielded, so a cancelled caller does not cancel it for the others.
+        """
+        if (future := self._calls.get(key)) is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
@@ -0,0 +1,113 @@
+import time
+from collections.abc import Callable
+from typing import Literal
+
+import httpx
+
+from keycloak_oauth.instrumentation import Event, Instrumentation
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class KeycloakUnavailableError(httpx.TransportError):
+    """Request to Keycloak rejected without sending it, because recent ones failed.
+
+    :param retry_after: Seconds until Keycloak is tried again
+    """
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        request: httpx.Request | None = None,
+        retry_after: float = 0.0,
+    ) -> None:
+        super().__init__(message, request=request)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fail fast while Keycloak is unavailable.
+
+    After `failure_threshold` consecutive failures (connection errors, timeouts and
+    `5xx` responses) the circuit opens and requests are rejected immediately with
+    `KeycloakUnavailableError`. After `reset_timeout` seconds a single trial request
+    is let through: if it succeeds the circuit closes, otherwise it opens again.
+
+    :param failure_threshold: Consecutive failures to open the circuit, `0` disables it
+    :param reset_timeout: Seconds the circuit stays open before a trial request
+    :param instrumentation: Observer of state changes and rejected requests
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        instrumentation: Instrumentation | None = None,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.instrumentation = instrumentation or Instrumentation()
+        self._timer = timer
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or self._timer() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next trial request, `0` unless the circuit is open."""
+        if self._opened_at is None:
+            return 0.0
+        return max(self._opened_at + self.reset_timeout - self._timer(), 0.0)
+
+    def acquire(self, request: httpx.Request | None = None) -> bool:
+        """Check whether a request may be sent, `True` if it is the trial request.
+
+        :raises KeycloakUnavailableError: if the circuit is open, or half-open with
+            the trial request still in flight
+        """
+        state = self.state
+        if state == "closed" or (state == "half_open" and not self._trial):
+            self._trial = state == "half_open"
+            return self._trial
+        self.instrumentation.on_event(Event("circuit", "rejected"))
+        retry_after = self.retry_after
+        raise KeycloakUnavailableError(
+            f"Keycloak is unavailable after {self._failures} consecutive failures, "
+            f"retrying in {retry_after:.0f}s",
+            request=request,
+            retry_after=retry_after,
+        )
+
+    def record(self, success: bool | None, trial: bool = False) -> None:
+        """Record the result of a request let through by :meth:`acquire`.
+
+        :param success: Whether Keycloak responded properly, `None` if the request
+            was abandoned (e.g. cancelled) without a result
+        :param trial: Whether it was the trial request
+        """
+        if trial:
+            self._trial = False
+        if success is None:
+            return
+        if success:
+            self._failures = 0
+            if self._opened_at is not None:
+                self._opened_at = None
+                self.instrumentation.on_event(Event("circuit", "closed"))
+            return
+        self._failures += 1
+        if 0 < self.failure_threshold <= self._failures and (
+            trial or self._opened_at is None
+        ):
+            self._opened_at = self._timer()
+            self.instrumentation.on_event(Event("circuit", "open"))
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Generator
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+from keycloak_oauth.cache import SingleFlight
+
+if TYPE_CHECKING:
+    from keycloak_oauth import KeycloakOAuth2
+
+log = logging.getLogger(__name__)
+
+
+class ClientCredentials(httpx.Auth):
+    """Service account token of the client, for calls to other services.
+
+    The token is fetched with the client credentials grant, using the client
+    authentication of the registration (client secret or `setup_signed_jwt`). It is
+    cached and refreshed in the background `refresh_ahead` seconds before it
+    expires, concurrent fetches share a single token request.
+
+    Use it as `auth` of an `httpx.AsyncClient` to send it as Bearer token. A `401`
+    response is retried once with a new token.
+
+    :param keycloak_oauth: Registered Keycloak client
+    :param scope: Requested scope, the scope of the registration if omitted
+    :param refresh_ahead: Refresh the token in the background when it expires within
+        this many seconds
+    :param min_validity: Wait for a new token when the cached one expires within
+        this many seconds
+    """
+
+    requires_request_body = True
+
+    def __init__(
+        self,
+        keycloak_oauth: "KeycloakOAuth2",
+        scope: str | None = None,
+        refresh_ahead: float = 60,
+        min_validity: float = 10,
+    ) -> None:
+        self.keycloak_oauth = keycloak_oauth
+        self.scope = scope
+        self.refresh_ahead = refresh_ahead
+        self.min_validity = min_validity
+        self._token: dict[str, Any] | None = None
+        self._single_flight: SingleFlight[str, dict[str, Any]] = SingleFlight()
+        self._background: asyncio.Future[None] | None = None
+
+    def _expires_in(self, token: dict[str, Any]) -> float:
+        if (expires_at := token.get("expires_at")) is None:
+            return float("inf")
+        return expires_at - time.time()
+
+    async def get_token(self) -> dict[str, Any]:
+        """Cached token, fetches a new one if it expires soon."""
+        instrumentation = self.keycloak_oauth.instrumentation
+        with instrumentation.measure("client_credentials", "hit") as event:
+            if (token := self._token) is not None:
+                expires_in = self._expires_in(token)
+                if expires_in > self.min_validity:
+                    if (
+                        expires_in <= self.refresh_ahead
+                        and "token" not in self._single_flight
+                    ):
+                        event.outcome = "refresh_ahead"
+                        self._background = asyncio.ensure_future(
+                            self._refresh_in_background()
+                        )
+                    return token
+            event.outcome = "coalesced" if "token" in self._single_flight else "miss"
+            return await self.refresh()
+
+    async def refresh(self) -> dict[str, Any]:
+        """Fetch a new token, shared by all concurrent callers."""
+        return await self._single_flight.do("token", self._fetch)
+
+    def invalidate(self, token: dict[str, Any] | None = None) -> None:
+        """Drop the cached token, only if it is still `token` if given."""
+        if token is None or token is self._token:
+            self._token = None
+
+    async def _fetch(self) -> dict[str, Any]:
+        params = {} if self.scope is None else {"scope": self.scope}
+        self._token = await self.keycloak_oauth.fetch_token(
+            grant_type="client_credentials", **params
+        )
+        return self._token
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            log.exception("Failed to refresh client credentials token")
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> AsyncGenerator[httpx.Request, httpx.Response]:
+        token = await self.get_token()
+        request.headers["Authorization"] = f"Bearer {token['access_token']}"
+        response = yield request
+        if response.status_code == httpx.codes.UNAUTHORIZED:
+            # e.g. the token was revoked, retry once with a new one
+            self.invalidate(token)
+            token = await self.get_token()
+            request.headers["Authorization"] = f"Bearer {token['access_token']}"
+            yield request
+
+    def sync_auth_flow(
+        self, request: httpx.Request
+    ) -> Generator[httpx.Request, httpx.Response, None]:
+        raise RuntimeError("ClientCredentials only supports httpx.AsyncClient")
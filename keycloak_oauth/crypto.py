@@ -0,0 +1,286 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Literal, TypeVar
+
+from authlib.jose import JsonWebKey, JsonWebToken, JWTClaims
+from authlib.jose.rfc7517 import Key
+from authlib.oauth2.rfc7523 import PrivateKeyJWT, private_key_jwt_sign
+
+from keycloak_oauth.verifier import TokenVerifier
+
+log = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# client assertion signed ahead of the token request that is about to be sent
+_client_assertion: contextvars.ContextVar[bytes | None] = contextvars.ContextVar(
+    "client_assertion", default=None
+)
+
+
+class PresignedPrivateKeyJWT(PrivateKeyJWT):
+    """`private_key_jwt` client authentication which uses a client assertion signed
+    in advance by :meth:`CryptoRunner.client_assertion` or taken from an
+    `AssertionPool`, if there is one.
+    """
+
+    def sign(self, auth: Any, token_endpoint: str) -> bytes:
+        if (assertion := _client_assertion.get()) is not None:
+            return assertion
+        return super().sign(auth, token_endpoint)
+
+
+class CryptoRunner:
+    """Runs CPU-bound signature operations on or off the event loop.
+
+    :param executor: `None` to run inline, `"thread"` for the default thread pool of
+        the event loop or any `concurrent.futures.Executor`. Process pools only
+        receive picklable arguments, keys are imported once per worker process.
+    """
+
+    def __init__(self, executor: Executor | Literal["thread"] | None = None) -> None:
+        self.executor = executor
+
+    @property
+    def offloaded(self) -> bool:
+        return self.executor is not None
+
+    async def run(self, fn: Callable[..., _T], *args: Any) -> _T:
+        if self.executor is None:
+            return fn(*args)
+        executor = self.executor if isinstance(self.executor, Executor) else None
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def decode(
+        self,
+        verifier: TokenVerifier,
+        token: str,
+        key: Key,
+        claims_options: dict[str, Any] | None = None,
+    ) -> JWTClaims:
+        """Verify the signature of a token, claims are not validated yet."""
+        if not isinstance(self.executor, ProcessPoolExecutor):
+            return await self.run(verifier.decode, token, key, claims_options)
+        payload, header = await self.run(
+            decode_jwt, token, _serialize_key(key), tuple(verifier.algorithms)
+        )
+        return JWTClaims(payload, header, options=claims_options)
+
+    async def sign_client_assertion(
+        self,
+        auth_method: PrivateKeyJWT,
+        client_id: str,
+        private_key: Key,
+        expires_in: int = 3600,
+    ) -> bytes:
+        """Sign a client assertion for the token endpoint of `auth_method`."""
+        key: Key | str = private_key
+        if isinstance(self.executor, ProcessPoolExecutor):
+            key = _serialize_key(private_key, is_private=True)
+        return await self.run(
+            sign_client_assertion,
+            key,
+            client_id,
+            auth_method.token_endpoint,
+            auth_method.alg,
+            auth_method.claims,
+            auth_method.headers,
+            expires_in,
+        )
+
+    @contextlib.asynccontextmanager
+    async def client_assertion(
+        self,
+        auth_method: PrivateKeyJWT | None,
+        client_id: str,
+        private_key: Key,
+        pool: "AssertionPool | None" = None,
+    ) -> AsyncIterator[None]:
+        """Provide the client assertion of the token request sent in this block.
+
+        Taken from `pool` if it has one ready, otherwise only signed here if signing
+        is offloaded. Else authlib signs it inline.
+        """
+        if not isinstance(auth_method, PresignedPrivateKeyJWT):
+            yield
+            return
+        assertion = None if pool is None else pool.take()
+        if assertion is None and self.offloaded:
+            assertion = await self.sign_client_assertion(
+                auth_method, client_id, private_key
+            )
+        if assertion is None:
+            yield
+            return
+        token = _client_assertion.set(assertion)
+        try:
+            yield
+        finally:
+            _client_assertion.reset(token)
+
+
+class AssertionPool:
+    """Client assertions signed ahead of time in the background, so token requests
+    (e.g. the code exchange of the login callback) don't wait for signing.
+
+    Every assertion has its own `jti` and expires after `expires_in` seconds. It is
+    only handed out during the first half of its lifetime, afterwards it is replaced.
+
+    :param sign: Sign a new client assertion valid for the given seconds
+    :param size: Number of assertions kept ready
+    :param expires_in: Lifetime of an assertion in seconds
+    """
+
+    def __init__(
+        self,
+        sign: Callable[[int], Awaitable[bytes]],
+        size: int = 8,
+        expires_in: int = 60,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._sign = sign
+        self.size = size
+        self.expires_in = expires_in
+        self._timer = timer
+        # assertions with the time until which they are handed out
+        self._assertions: collections.deque[tuple[float, bytes]] = collections.deque()
+        # incremented by `clear`, assertions signed before are discarded
+        self._generation = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._assertions)
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def take(self) -> bytes | None:
+        """A ready assertion, `None` if there is none."""
+        now = self._timer()
+        try:
+            while self._assertions:
+                usable_until, assertion = self._assertions.popleft()
+                if usable_until > now:
+                    return assertion
+            return None
+        finally:
+            self._notify()
+
+    def clear(self) -> None:
+        """Discard all assertions, e.g. after the signing key was rotated."""
+        self._generation += 1
+        self._assertions.clear()
+        self._notify()
+
+    async def fill(self) -> None:
+        """Sign assertions until the pool is full, replacing those past half of their
+        lifetime.
+        """
+        now = self._timer()
+        while self._assertions and self._assertions[0][0] <= now:
+            self._assertions.popleft()
+        while len(self._assertions) < self.size:
+            generation = self._generation
+            assertion = await self._sign(self.expires_in)
+            if generation == self._generation:
+                usable_until = self._timer() + self.expires_in / 2
+                self._assertions.append((usable_until, assertion))
+
+    async def _run(self) -> None:
+        self._wakeup = wakeup = asyncio.Event()
+        while True:
+            wakeup.clear()
+            try:
+                await self.fill()
+            except Exception:
+                log.exception("Failed to sign client assertion")
+            if self._assertions:
+                delay = self._assertions[0][0] - self._timer()
+            else:
+                delay = self.expires_in / 2
+            # not `wait_for`, which may swallow the cancellation by `stop`
+            waiter = asyncio.ensure_future(wakeup.wait())
+            try:
+                await asyncio.wait([waiter], timeout=max(delay, 0))
+            finally:
+                waiter.cancel()
+
+    def start(self) -> None:
+        """Start keeping the pool filled in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background signing."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._wakeup = None
+
+
+@functools.lru_cache(maxsize=32)
+def _serialize_key(key: Key, is_private: bool = False) -> str:
+    """Key as JSON for worker processes, serialized once per key."""
+    return json.dumps(key.as_dict(is_private=is_private), sort_keys=True)
+
+
+@functools.lru_cache(maxsize=32)
+def _import_key(jwk: str) -> Key:
+    return JsonWebKey.import_key(json.loads(jwk))
+
+
+@functools.lru_cache(maxsize=8)
+def _jwt(algorithms: tuple[str, ...]) -> JsonWebToken:
+    return JsonWebToken(list(algorithms))
+
+
+def sign_client_assertion(
+    key: Key | str,
+    client_id: str,
+    token_endpoint: str,
+    alg: str,
+    claims: dict[str, Any] | None = None,
+    header: dict[str, Any] | None = None,
+    expires_in: int = 3600,
+) -> bytes:
+    """Sign a client assertion with a new `jti`.
+
+    :param key: Private key, as JSON in a worker process, imported once per process
+    """
+    if isinstance(key, str):
+        key = _import_key(key)
+    return private_key_jwt_sign(
+        key,
+        client_id=client_id,
+        token_endpoint=token_endpoint,
+        alg=alg,
+        # copied, authlib adds the `jti` to them
+        claims=dict(claims or {}),
+        header=dict(header or {}),
+        expires_in=expires_in,
+    )
+
+
+def decode_jwt(
+    token: str, jwk: str, algorithms: tuple[str, ...]
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Verify the signature of a token in a worker process.
+
+    :param jwk: Public key as JSON, imported once per process
+    :return: Payload and header of the token
+    """
+    key = _import_key(jwk)
+    claims = _jwt(algorithms).decode(token, key=lambda header, payload: key)
+    return dict(claims), dict(claims.header)
@@ -0,0 +1,50 @@
+import httpx
+
+from keycloak_oauth.circuit import CircuitBreaker
+
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=30
+)
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """Connection pool shared by all HTTP clients talking to Keycloak.
+
+    authlib opens a short-lived client for every operation (server metadata, JWKS,
+    token requests). They all send their requests through this transport, so
+    connections are kept alive across operations. Closing one of these clients
+    leaves the pool open, it is only closed by :meth:`close`.
+
+    :param circuit_breaker: Fail fast instead of sending requests while Keycloak is
+        unavailable
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        circuit_breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.transport = transport
+        self.circuit_breaker = circuit_breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if (breaker := self.circuit_breaker) is None:
+            return await self.transport.handle_async_request(request)
+        trial = breaker.acquire(request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            breaker.record(False, trial)
+            raise
+        except BaseException:
+            breaker.record(None, trial)
+            raise
+        breaker.record(response.status_code < 500, trial)
+        return response
+
+    async def aclose(self) -> None:
+        """Called by each client on exit, keep the pool open."""
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        await self.transport.aclose()
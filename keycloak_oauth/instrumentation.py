@@ -0,0 +1,74 @@
+import contextlib
+import dataclasses
+import time
+from collections.abc import Iterator
+
+
+@dataclasses.dataclass
+class Event:
+    """A timed interaction with Keycloak or a step of token verification.
+
+    `name` is one of
+
+    - `metadata`: loading the server metadata, `coalesced` if a concurrent load was
+      reused, `refresh` if it is refreshed in the background and `stale` if it was
+      too old to be served while refreshing
+    - `warm_up`: loading server metadata and public keys in `warm_up`, `miss` if
+      fetched, `snapshot` if loaded from the snapshot file, `revalidate` for the
+      background refetch after loading a snapshot
+    - `jwks`: fetching the public keys, `outcome` is `miss` for the initial load,
+      `refresh` for scheduled refreshes, `rotation` for unknown keys and `stale` if
+      the keys were too old to be served while refreshing
+    - `token`: code-for-token exchange in `auth`
+    - `token_refresh`: refreshing the access token of a session, `hit` if the result
+      of a concurrent refresh was reused
+    - `token_exchange`: exchanging a token for a downstream audience, `hit` if it
+      was cached, `coalesced` if a concurrent exchange was reused
+    - `client_credentials`: getting the service account token of `ClientCredentials`,
+      `hit` if it was cached, `refresh_ahead` if it is refreshed in the background
+    - `decode`: JWT signature verification in `parse_claims` and `SyncTokenVerifier`
+    - `verify_token`: Bearer token verification, `hit` if it was cached
+    - `introspect`: token introspection, `hit` if it was cached, `coalesced` if a
+      concurrent introspection was reused
+    - `session`: loading the user of a session in `get_user`, `hit` if it was
+      memoized in the request, `anonymous` if there is no user, `revoked` if the
+      session was ended by back-channel logout
+    - `backchannel_logout`: handling a logout token sent by Keycloak
+    - `circuit`: the circuit breaker changed its state to `open` or `closed`, or
+      `rejected` a request to Keycloak
+    """
+
+    name: str
+    outcome: str = "ok"
+    """Error class name if the interaction failed"""
+    error: str | None = None
+    """Wall clock time when the interaction started"""
+    start_time: float = dataclasses.field(default_factory=time.time)
+    """Duration in seconds"""
+    duration: float = 0.0
+
+
+class Instrumentation:
+    """Observer of Keycloak interactions, ignores all events by default.
+
+    Subclass and override :meth:`on_event` to export events, e.g. as metrics or
+    traces. See `keycloak_oauth.prometheus` and `keycloak_oauth.opentelemetry`.
+    """
+
+    def on_event(self, event: Event) -> None:
+        pass
+
+    @contextlib.contextmanager
+    def measure(self, name: str, outcome: str = "ok") -> Iterator[Event]:
+        """Time the block and report it, the outcome can be changed on the event."""
+        event = Event(name, outcome)
+        start = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event.outcome = "error"
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.duration = time.perf_counter() - start
+            self.on_event(event)
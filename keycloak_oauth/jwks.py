@@ -0,0 +1,189 @@
+import asyncio
+import binascii
+import contextlib
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from authlib.common.encoding import urlsafe_b64decode
+from authlib.jose import JsonWebKey
+from authlib.jose.errors import DecodeError
+from authlib.jose.rfc7517 import Key
+
+from keycloak_oauth.cache import SingleFlight
+from keycloak_oauth.instrumentation import Instrumentation
+
+if TYPE_CHECKING:
+    from authlib.integrations.starlette_client import StarletteOAuth2App
+
+log = logging.getLogger(__name__)
+
+
+def unverified_header(token: str) -> dict[str, Any]:
+    """Decode the header of a compact JWT without verifying its signature."""
+    try:
+        header = json.loads(urlsafe_b64decode(token.partition(".")[0].encode()))
+    except (binascii.Error, ValueError) as e:
+        raise DecodeError(f"Invalid header: {e}") from e
+    if not isinstance(header, dict):
+        raise DecodeError("Header must be a json object")
+    return header
+
+
+def unverified_claims(token: str) -> dict[str, Any]:
+    """Decode the payload of a compact JWT without verifying its signature."""
+    try:
+        claims = json.loads(urlsafe_b64decode(token.split(".")[1].encode()))
+    except (binascii.Error, IndexError, ValueError) as e:
+        raise DecodeError(f"Invalid payload: {e}") from e
+    if not isinstance(claims, dict):
+        raise DecodeError("Payload must be a json object")
+    return claims
+
+
+class JWKSManager:
+    """Imported JSON Web Keys of a Keycloak realm, indexed by `kid`.
+
+    Keys are refetched once they are older than `refresh_interval`, either by the
+    background task or lazily on access. Until then known keys are served for up to
+    `max_stale` more seconds, e.g. while Keycloak is unavailable, afterwards they
+    are only used once a refetch succeeds. A token with an unknown `kid` (e.g. during
+    key rotation) triggers a single refetch shared by all concurrent callers, at most
+    once per `min_refetch_interval`.
+
+    :param keycloak: Registered Keycloak client to fetch the key set with, `None` if
+        the keys are only loaded with :meth:`load`, e.g. by `SyncTokenVerifier`
+    :param refresh_interval: Seconds after which the key set is refetched
+    :param min_refetch_interval: Minimum seconds between refetches for unknown `kid`
+        and between background refetches
+    :param instrumentation: Observer of key set fetches
+    :param max_stale: Seconds beyond `refresh_interval` keys are served while
+        refetching
+    """
+
+    def __init__(
+        self,
+        keycloak: "StarletteOAuth2App | None",
+        refresh_interval: float = 300,
+        min_refetch_interval: float = 10,
+        instrumentation: Instrumentation | None = None,
+        max_stale: float = float("inf"),
+    ) -> None:
+        self._keycloak = keycloak
+        self.instrumentation = instrumentation or Instrumentation()
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.max_stale = max_stale
+        self._keys: dict[str | None, Key] = {}
+        self._fetched_at = -float("inf")
+        self._refetched_at = -float("inf")
+        self._single_flight: SingleFlight[str, None] = SingleFlight()
+        self._task: asyncio.Task[None] | None = None
+        self._background: asyncio.Future[None] | None = None
+
+    @property
+    def keys(self) -> dict[str | None, Key]:
+        """Currently imported keys by `kid`."""
+        return self._keys
+
+    @property
+    def age(self) -> float:
+        """Seconds since the key set was last fetched."""
+        return time.monotonic() - self._fetched_at
+
+    def lookup(self, kid: str | None) -> Key | None:
+        """Imported key for the `kid` of a JWT header, without refetching."""
+        if (
+            (key := self._keys.get(kid)) is None
+            and kid is None
+            and len(self._keys) == 1
+        ):
+            # token without `kid` can only be matched against a single key
+            return next(iter(self._keys.values()))
+        return key
+
+    async def get_key(self, kid: str | None) -> Key:
+        """Find the key for the `kid` of a JWT header.
+
+        :raises ValueError: if no key with this `kid` exists after refetching
+        """
+        if (key := self.lookup(kid)) is not None:
+            age = self.age
+            if age < self.refresh_interval:
+                return key
+            if age < self.refresh_interval + self.max_stale:
+                # serve the known key, refresh without blocking the request
+                if (
+                    "jwks" not in self._single_flight
+                    and time.monotonic() - self._refetched_at
+                    >= self.min_refetch_interval
+                ):
+                    self._background = asyncio.ensure_future(
+                        self._refresh_in_background()
+                    )
+                return key
+            await self.refresh("stale")
+            if (key := self.lookup(kid)) is not None:
+                return key
+            raise ValueError(f"Unknown JSON Web Key {kid!r}")
+
+        # limited by the last attempt, so failing fetches are not retried per request
+        if (
+            "jwks" in self._single_flight
+            or time.monotonic() - self._refetched_at >= self.min_refetch_interval
+        ):
+            await self.refresh("rotation" if self._keys else "miss")
+            if (key := self.lookup(kid)) is not None:
+                return key
+        raise ValueError(f"Unknown JSON Web Key {kid!r}")
+
+    async def refresh(self, reason: str = "refresh") -> None:
+        """Refetch the key set, concurrent callers share a single request.
+
+        :param reason: Outcome reported to the instrumentation
+        """
+        await self._single_flight.do("jwks", lambda: self._fetch(reason))
+
+    async def _fetch(self, reason: str) -> None:
+        if self._keycloak is None:
+            raise RuntimeError("Key set can only be loaded synchronously")
+        self._refetched_at = time.monotonic()
+        with self.instrumentation.measure("jwks", reason):
+            # first load may use the key set already included in the server metadata
+            jwk_set = await self._keycloak.fetch_jwk_set(force=bool(self._keys))
+            self.load(jwk_set)
+
+    def load(self, jwk_set: dict[str, Any]) -> None:
+        """Import a key set, e.g. from a snapshot."""
+        key_set = JsonWebKey.import_key_set(jwk_set)
+        self._keys = {key.kid: key for key in key_set.keys}
+        self._fetched_at = time.monotonic()
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            log.exception("Failed to refresh JSON Web Key Set")
+
+    async def _run(self) -> None:
+        while True:
+            # keys loaded at startup are only refetched once they are due
+            delay = self.refresh_interval - self.age
+            if delay <= 0:
+                await self._refresh_in_background()
+                delay = self.refresh_interval
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        """Start refreshing the key set on a schedule in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background refresh."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,95 @@
+from collections.abc import Sequence
+
+import httpx
+from authlib.jose.errors import JoseError
+from starlette import status
+from starlette.authentication import AuthCredentials, UnauthenticatedUser
+from starlette.exceptions import HTTPException
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+from keycloak_oauth import KeycloakOAuth2, User
+
+
+class KeycloakAuthMiddleware:
+    """Pure ASGI middleware which authenticates each HTTP and WebSocket request once.
+
+    The user is resolved from an `Authorization: Bearer` header or otherwise from the
+    session and stored in `scope["user"]` and `scope["auth"]`, like Starlette's
+    `AuthenticationMiddleware`. Use `request.user`, `request.auth` or
+    `starlette.authentication.requires` in endpoints. Sessions require the
+    `SessionMiddleware` to be added after (i.e. outside of) this middleware. While
+    Keycloak is unavailable, Bearer requests are answered with `503` and WebSocket
+    connections are closed with `1013 Try Again Later`.
+
+    :param keycloak: Keycloak client to verify tokens and load sessions with
+    :param public_paths: Paths which are passed through unauthenticated, including
+        everything below them, e.g. `/public` matches `/public/docs` but not
+        `/publicity`
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        keycloak: KeycloakOAuth2,
+        public_paths: Sequence[str] = (),
+    ) -> None:
+        self.app = app
+        self.keycloak = keycloak
+        self.public_paths = tuple(path.rstrip("/") for path in public_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        if self.is_public(scope["path"]):
+            scope["user"] = UnauthenticatedUser()
+            scope["auth"] = AuthCredentials()
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            user = await self.authenticate(HTTPConnection(scope))
+        except httpx.HTTPError as e:
+            if scope["type"] == "websocket":
+                await WebSocketClose(status.WS_1013_TRY_AGAIN_LATER)(
+                    scope, receive, send
+                )
+                return
+            error = self.keycloak.unavailable(e)
+            response = JSONResponse(
+                {"detail": error.detail}, error.status_code, error.headers
+            )
+            await response(scope, receive, send)
+            return
+        if user is None:
+            scope["user"] = UnauthenticatedUser()
+            scope["auth"] = AuthCredentials()
+        else:
+            scope["user"] = user
+            scope["auth"] = AuthCredentials(["authenticated"])
+        await self.app(scope, receive, send)
+
+    def is_public(self, path: str) -> bool:
+        return any(
+            path == public_path or path.startswith(f"{public_path}/")
+            for public_path in self.public_paths
+        )
+
+    async def authenticate(self, request: HTTPConnection) -> User | None:
+        scheme, _, access_token = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme.lower() == "bearer" and access_token:
+            try:
+                return await self.keycloak.verify_token(access_token)
+            except (JoseError, ValueError):
+                return None
+        if "session" not in request.scope:
+            return None
+        try:
+            return await self.keycloak.get_user(request)
+        except HTTPException:
+            return None
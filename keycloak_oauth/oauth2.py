@@ -0,0 +1,957 @@
+import asyncio
+import contextlib
+import hashlib
+import math
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import Executor
+from pathlib import Path
+import time
+import types
+from typing import Any, Concatenate, Generic, Literal, ParamSpec, TypeVar
+import logging
+import httpx
+from authlib.common.security import generate_token
+from authlib.integrations.starlette_client import (
+    OAuth,
+    OAuthError,
+    StarletteOAuth2App,
+)
+from authlib.jose import JWTClaims
+from authlib.jose.errors import JoseError
+
+from starlette import status
+from starlette.datastructures import URL
+from starlette.exceptions import HTTPException
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import JSONResponse, RedirectResponse, Response
+
+from keycloak_oauth.cache import SingleFlight, TTLCache
+from keycloak_oauth.circuit import CircuitBreaker, KeycloakUnavailableError
+from keycloak_oauth.client_credentials import ClientCredentials
+from keycloak_oauth.crypto import AssertionPool, CryptoRunner, PresignedPrivateKeyJWT
+from keycloak_oauth.http import DEFAULT_LIMITS, SharedTransport
+from keycloak_oauth.instrumentation import Event, Instrumentation
+from keycloak_oauth.jwks import JWKSManager, unverified_header
+from keycloak_oauth.revocation import RevocationList, is_revoked_in_process
+from keycloak_oauth.session import SessionCodec, SessionStore
+from keycloak_oauth.signing import SigningKeys, load_signing_key
+from keycloak_oauth.snapshot import Discovery, DiscoverySnapshot
+from keycloak_oauth.sync import SyncTokenVerifier
+from keycloak_oauth.user import User
+from keycloak_oauth.verifier import TokenVerifier
+
+
+log = logging.getLogger(__name__)
+
+TOKEN_EXCHANGE_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:token-exchange"
+ACCESS_TOKEN_TYPE = "urn:ietf:params:oauth:token-type:access_token"
+
+# request state attribute to memoize the user for the rest of the request
+_USER_STATE = "keycloak_user"
+# key of the session data encoded by a `SessionCodec`
+_ENCODED_SESSION_KEY = "keycloak"
+# keys of the session data written by `KeycloakOAuth2.auth`
+_SESSION_KEYS = (
+    "user",
+    "refresh_token",
+    "expires_at",
+    "sid",
+    "sub",
+    "auth_time",
+    _ENCODED_SESSION_KEY,
+)
+_WELL_KNOWN = "/.well-known/openid-configuration"
+
+_P = ParamSpec("_P")
+_R = TypeVar("_R")
+
+
+class _hybridmethod(Generic[_P, _R]):
+    """Method bound to the instance, or to the class if accessed on the class."""
+
+    def __init__(self, func: Callable[Concatenate[Any, _P], _R]) -> None:
+        self.__func__ = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance: object, owner: type) -> Callable[_P, _R]:
+        return types.MethodType(self.__func__, owner if instance is None else instance)
+
+
+def _decode_session(session: dict[str, Any]) -> dict[str, Any]:
+    """Session data, decoded if it was written with a `SessionCodec`."""
+    if (encoded := session.get(_ENCODED_SESSION_KEY)) is None:
+        return session
+    try:
+        return SessionCodec.decode(encoded)
+    except ValueError:
+        log.info("Ignoring invalid session", exc_info=True)
+        return {}
+
+
+class _KeycloakApp(StarletteOAuth2App):
+    """authlib client which reports loading the server metadata and refreshes it."""
+
+    instrumentation = Instrumentation()
+    """Seconds after which the server metadata is refetched"""
+    metadata_refresh_interval = float("inf")
+    """Seconds beyond the refresh interval the metadata is served while refetching"""
+    max_stale = float("inf")
+    """Minimum seconds between background refetches"""
+    min_refetch_interval = 10.0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._metadata_loads: SingleFlight[str, dict[str, Any]] = SingleFlight()
+        self._refetched_at = -float("inf")
+        self._background: asyncio.Future[None] | None = None
+
+    async def load_server_metadata(self) -> dict[str, Any]:
+        if (loaded_at := self.server_metadata.get("_loaded_at")) is not None:
+            age = time.time() - loaded_at
+            if age < self.metadata_refresh_interval:
+                return self.server_metadata
+            if age < self.metadata_refresh_interval + self.max_stale:
+                # serve the stale metadata, refresh without blocking the request
+                if (
+                    "metadata" not in self._metadata_loads
+                    and time.monotonic() - self._refetched_at
+                    >= self.min_refetch_interval
+                ):
+                    self._background = asyncio.ensure_future(
+                        self._refresh_in_background()
+                    )
+                return self.server_metadata
+        outcome = "miss" if loaded_at is None else "stale"
+        with self.instrumentation.measure("metadata", outcome) as event:
+            if "metadata" in self._metadata_loads:
+                event.outcome = "coalesced"
+            return await self._metadata_loads.do("metadata", self._fetch_metadata)
+
+    async def _fetch_metadata(self) -> dict[str, Any]:
+        self._refetched_at = time.monotonic()
+        metadata = await self._get_json(self._server_metadata_url)  # type: ignore[attr-defined]
+        self.server_metadata.update(metadata, _loaded_at=time.time())
+        return self.server_metadata
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            with self.instrumentation.measure("metadata", "refresh"):
+                await self._metadata_loads.do("metadata", self._fetch_metadata)
+        except Exception:
+            log.warning("Failed to refresh server metadata", exc_info=True)
+
+    async def _get_json(self, url: str) -> dict[str, Any]:
+        async with self.client_cls(**self.client_kwargs) as client:
+            response = await client.request("GET", url, withhold_token=True)
+        response.raise_for_status()
+        return response.json()
+
+    async def discover(self) -> Discovery:
+        """Fetch the server metadata and the key set in parallel.
+
+        Keycloak serves the key set at a fixed path below the issuer, so it is
+        requested without waiting for the metadata. Only if the metadata announces a
+        different `jwks_uri`, that one is fetched afterwards.
+        """
+        metadata_url: str = self._server_metadata_url  # type: ignore[attr-defined]
+        jwks_uri = None
+        jwk_set: asyncio.Future[dict[str, Any]] | None = None
+        if metadata_url.endswith(_WELL_KNOWN):
+            issuer = metadata_url.removesuffix(_WELL_KNOWN)
+            jwks_uri = f"{issuer}/protocol/openid-connect/certs"
+            jwk_set = asyncio.ensure_future(self._get_json(jwks_uri))
+            # not retrieved if the metadata fails or announces another `jwks_uri`
+            jwk_set.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            metadata = await self._get_json(metadata_url)
+        except BaseException:
+            if jwk_set is not None:
+                jwk_set.cancel()
+            raise
+        if jwk_set is not None:
+            if metadata.get("jwks_uri") == jwks_uri:
+                return Discovery(metadata, await jwk_set)
+            jwk_set.cancel()
+        return Discovery(metadata, await self._get_json(metadata["jwks_uri"]))
+
+    def load_discovery(self, discovery: Discovery) -> None:
+        """Use server metadata and key set fetched before."""
+        self.server_metadata.update(
+            discovery.metadata, jwks=discovery.jwk_set, _loaded_at=time.time()
+        )
+
+    async def introspect_token(self, token: str, **kwargs: Any) -> dict[str, Any]:
+        metadata = await self.load_server_metadata()
+        async with self._get_oauth_client(**metadata) as client:  # type: ignore[attr-defined]
+            response = await client.introspect_token(
+                metadata["introspection_endpoint"], token=token, **kwargs
+            )
+        response.raise_for_status()
+        return response.json()
+
+
+class KeycloakOAuth2:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str | bytes | None,
+        server_metadata_url: str,
+        client_kwargs: dict[str, Any],
+        base_url: str = "/",
+        logout_target: str = "/",
+        audience: str | None = None,
+        token_cache_size: int = 4096,
+        token_cache_ttl: float = 300,
+        jwks_refresh_interval: float = 300,
+        jwks_min_refetch_interval: float = 10,
+        http_limits: httpx.Limits = DEFAULT_LIMITS,
+        http2: bool = False,
+        transport: httpx.AsyncBaseTransport | None = None,
+        session_store: SessionStore | None = None,
+        token_refresh_leeway: float = 30,
+        instrumentation: Instrumentation | None = None,
+        crypto_executor: Executor | Literal["thread"] | None = None,
+        revocation_ttl: float = 36_000,
+        introspection_cache_ttl: float = 10,
+        snapshot_path: Path | str | None = None,
+        snapshot_max_age: float = 86_400,
+        http_timeout: float | httpx.Timeout = 5,
+        metadata_refresh_interval: float = 3600,
+        max_stale: float = 3600,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_timeout: float = 30,
+        session_codec: SessionCodec | None = None,
+    ) -> None:
+        """
+        :param audience: Required `aud` claim of Bearer tokens, not checked if omitted
+        :param token_cache_size: Maximum number of verified Bearer tokens kept in memory
+        :param token_cache_ttl: Maximum lifetime in seconds of a verified Bearer token in the cache
+        :param jwks_refresh_interval: Seconds after which Keycloak's public keys are refetched
+        :param jwks_min_refetch_interval: Minimum seconds between refetches for an unknown `kid`
+        :param http_limits: Size and keep-alive of the connection pool to Keycloak
+        :param http2: Use HTTP/2 for Keycloak requests, requires `httpx[http2]`
+        :param transport: Custom transport for Keycloak requests instead of the connection pool
+        :param session_store: Keep sessions server-side, the cookie only carries a session id
+        :param token_refresh_leeway: Refresh the access token of a session when it expires
+            within this many seconds
+        :param instrumentation: Observer of Keycloak interactions, e.g. for metrics
+        :param crypto_executor: Run RSA signing and verification off the event loop,
+            `"thread"` for the default thread pool or a custom executor
+        :param revocation_ttl: Seconds sessions ended by back-channel logout are
+            remembered, should cover Keycloak's maximum SSO session lifetime
+        :param introspection_cache_ttl: Seconds a token introspection result is cached
+        :param snapshot_path: File to persist server metadata and public keys to, used
+            by :meth:`warm_up` on the next start
+        :param snapshot_max_age: Seconds after which a snapshot is no longer used
+        :param http_timeout: Timeout of Keycloak requests in seconds
+        :param metadata_refresh_interval: Seconds after which the server metadata is
+            refetched
+        :param max_stale: Seconds the server metadata and public keys are still served
+            beyond their refresh interval while refetching, e.g. if Keycloak is down
+        :param circuit_failure_threshold: Consecutive failed Keycloak requests after
+            which further requests fail fast with `KeycloakUnavailableError`, `0`
+            disables the circuit breaker
+        :param circuit_reset_timeout: Seconds until a request is tried again
+        :param session_codec: Store sessions in a compact encoding, optionally with
+            only some of the user fields
+        """
+        self.code_verifier = generate_token(48)
+        self._base_url = base_url
+        self._logout_page = logout_target
+        self._audience = audience
+        self.session_store = session_store
+        self.session_codec = session_codec
+        self.instrumentation = instrumentation or Instrumentation()
+        self.crypto = CryptoRunner(crypto_executor)
+        self.revocations = RevocationList(revocation_ttl)
+        self._auth_method: PresignedPrivateKeyJWT | None = None
+        self.signing_keys: SigningKeys | None = None
+        self.assertions: AssertionPool | None = None
+        self.snapshot = (
+            None
+            if snapshot_path is None
+            else DiscoverySnapshot(snapshot_path, snapshot_max_age)
+        )
+        self._server_metadata_url = server_metadata_url
+        self._revalidation: asyncio.Future[None] | None = None
+        self._token_refresh_leeway = token_refresh_leeway
+        self._token_refreshes: SingleFlight[bytes, dict[str, Any]] = SingleFlight()
+        # rotated refresh tokens, for requests which still carry the previous one
+        self._refreshed_tokens: TTLCache[bytes, dict[str, Any]] = TTLCache(
+            1024, token_refresh_leeway
+        )
+        self._token_cache: TTLCache[bytes, User] = TTLCache(
+            token_cache_size, token_cache_ttl
+        )
+        self._exchanged_tokens: TTLCache[
+            tuple[bytes, str, str | None], dict[str, Any]
+        ] = TTLCache(token_cache_size, float("inf"))
+        self._token_exchanges: SingleFlight[
+            tuple[bytes, str, str | None], dict[str, Any]
+        ] = SingleFlight()
+        self._introspections: TTLCache[bytes, dict[str, Any]] = TTLCache(
+            token_cache_size, introspection_cache_ttl
+        )
+        self._introspection_flights: SingleFlight[bytes, dict[str, Any]] = (
+            SingleFlight()
+        )
+
+        oauth = OAuth()
+        oauth.oauth2_client_cls = _KeycloakApp
+
+        client_kwargs = dict(client_kwargs)
+        # TLS settings belong to the shared transport, not to each client
+        verify = client_kwargs.pop("verify", True)
+        cert = client_kwargs.pop("cert", None)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                verify=verify,
+                cert=cert,
+                http2=http2,
+                limits=http_limits,
+            )
+        # all clients opened by authlib share one connection pool
+        self.circuit_breaker = CircuitBreaker(
+            circuit_failure_threshold, circuit_reset_timeout, self.instrumentation
+        )
+        self._transport = SharedTransport(transport, self.circuit_breaker)
+        client_kwargs["transport"] = self._transport
+        client_kwargs.setdefault("timeout", http_timeout)
+
+        oauth.register(
+            name="keycloak",
+            # client_id and client_secret are created in keycloak
+            client_id=client_id,
+            client_secret=client_secret,
+            server_metadata_url=server_metadata_url,
+            client_kwargs=client_kwargs,
+            code_challenge_method="S256",
+        )
+
+        assert isinstance(oauth.keycloak, _KeycloakApp)
+        self.keycloak = oauth.keycloak
+        self.keycloak.instrumentation = self.instrumentation
+        self.keycloak.metadata_refresh_interval = metadata_refresh_interval
+        self.keycloak.max_stale = max_stale
+        self.keycloak.min_refetch_interval = jwks_min_refetch_interval
+        self.jwks = JWKSManager(
+            self.keycloak,
+            jwks_refresh_interval,
+            jwks_min_refetch_interval,
+            self.instrumentation,
+            max_stale,
+        )
+        self._verifier: TokenVerifier | None = None
+
+    async def setup_signed_jwt(
+        self,
+        keypair: Path,
+        public_key: Path | None = None,
+        alg: str | None = None,
+        assertion_pool_size: int = 0,
+        assertion_lifetime: int = 60,
+    ) -> None:
+        """Setup client authentication for signed JWT.
+
+        :param keypair: Path to keypair.pem, generated via `openssl genrsa -out keypair.pem 2048`
+            (RS256), `openssl ecparam -name prime256v1 -genkey -noout | openssl pkcs8 -topk8 -nocrypt -out keypair.pem`
+            (ES256) or `openssl genpkey -algorithm ed25519 -out keypair.pem` (EdDSA)
+        :param public_key: Not needed anymore, the public key is derived from `keypair`
+        :param alg: Signature algorithm, by default derived from the key type
+        :param assertion_pool_size: Number of client assertions signed ahead in the
+            background, `0` signs them per token request
+        :param assertion_lifetime: Seconds until a pre-signed client assertion expires
+        """
+        signing_key = load_signing_key(keypair.read_bytes(), alg)
+        self.signing_keys = SigningKeys(signing_key)
+        self.keycloak.client_secret = signing_key.key
+
+        await self.warm_up()
+        metadata = await self.keycloak.load_server_metadata()
+        auth_method = PresignedPrivateKeyJWT(
+            metadata["token_endpoint"], alg=signing_key.alg
+        )
+        self._auth_method = auth_method
+        self.keycloak.client_auth_methods = [auth_method]
+        self.keycloak.client_kwargs.update(
+            {
+                "token_endpoint_auth_method": auth_method.name,
+                # also used for token introspection
+                "revocation_endpoint_auth_method": auth_method.name,
+            }
+        )
+        if assertion_pool_size > 0:
+            if self.assertions is not None:
+                await self.assertions.stop()
+            self.assertions = AssertionPool(
+                self._sign_client_assertion, assertion_pool_size, assertion_lifetime
+            )
+            self.assertions.start()
+
+    def rotate_signing_key(
+        self, keypair: Path, alg: str | None = None, overlap: float = 300
+    ) -> None:
+        """Sign client assertions with a new key, without restarting.
+
+        The previous public key is still served by :meth:`public_keys` for `overlap`
+        seconds, so Keycloak accepts client assertions signed before the rotation.
+
+        :param keypair: Path to the new private key, see :meth:`setup_signed_jwt`
+        :param alg: Signature algorithm, by default derived from the key type
+        :param overlap: Seconds the previous public key is still published, should
+            exceed `assertion_lifetime`
+        """
+        if self.signing_keys is None or self._auth_method is None:
+            raise RuntimeError("Signed JWT is not set up, call setup_signed_jwt")
+        signing_key = load_signing_key(keypair.read_bytes(), alg)
+        self.signing_keys.rotate(signing_key, overlap)
+        self.keycloak.client_secret = signing_key.key
+        self._auth_method.alg = signing_key.alg
+        if self.assertions is not None:
+            self.assertions.clear()
+
+    async def _sign_client_assertion(self, expires_in: int) -> bytes:
+        assert self._auth_method is not None and self.signing_keys is not None
+        return await self.crypto.sign_client_assertion(
+            self._auth_method,
+            self.keycloak.client_id,
+            self.signing_keys.current.key,
+            expires_in,
+        )
+
+    async def warm_up(self) -> None:
+        """Load Keycloak's server metadata and public keys, so the first request
+        doesn't wait for them. Does nothing if both are loaded already.
+
+        Both are fetched in parallel and written to the snapshot, if configured. A
+        snapshot younger than `snapshot_max_age` is used instead and revalidated in
+        the background.
+        """
+        if "_loaded_at" not in self.keycloak.server_metadata:
+            if self.snapshot is not None and (
+                discovery := self.snapshot.load(self._server_metadata_url)
+            ):
+                with self.instrumentation.measure("warm_up", "snapshot"):
+                    self._load_discovery(discovery)
+                if self._revalidation is None or self._revalidation.done():
+                    self._revalidation = asyncio.ensure_future(self._revalidate())
+                return
+            with self.instrumentation.measure("warm_up", "miss"):
+                await self._discover()
+        if not self.jwks.keys:
+            await self.jwks.refresh("miss")
+
+    async def _discover(self) -> None:
+        discovery = await self.keycloak.discover()
+        self._load_discovery(discovery)
+        if self.snapshot is not None:
+            self.snapshot.save(self._server_metadata_url, discovery)
+
+    def _load_discovery(self, discovery: Discovery) -> None:
+        # also a snapshot counts as fetched now, its age is bounded by its max age
+        self.keycloak.load_discovery(discovery)
+        self.jwks.load(discovery.jwk_set)
+
+    async def _revalidate(self) -> None:
+        try:
+            with self.instrumentation.measure("warm_up", "revalidate"):
+                await self._discover()
+        except Exception:
+            log.warning("Failed to revalidate discovery snapshot", exc_info=True)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(self, app: Any = None) -> AsyncIterator[None]:
+        """Warm up, refresh Keycloak's public keys in the background and close the
+        connection pool on shutdown. Can be passed as `lifespan` to Starlette or
+        FastAPI.
+        """
+        try:
+            await self.warm_up()
+        except Exception:
+            # start anyway, metadata and keys are loaded on first use
+            log.exception("Failed to load Keycloak's server metadata and public keys")
+        self.jwks.start()
+        try:
+            yield
+        finally:
+            await self.jwks.stop()
+            if self._revalidation is not None:
+                self._revalidation.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self._revalidation
+            await self.aclose()
+
+    def _client_assertion(self) -> contextlib.AbstractAsyncContextManager[None]:
+        """Take the client assertion of a token request from the pool, or sign it off
+        the event loop.
+        """
+        return self.crypto.client_assertion(
+            self._auth_method,
+            self.keycloak.client_id,
+            self.keycloak.client_secret,
+            self.assertions,
+        )
+
+    async def aclose(self) -> None:
+        """Close all pooled connections to Keycloak and stop signing client
+        assertions in the background.
+        """
+        if self.assertions is not None:
+            await self.assertions.stop()
+        await self._transport.close()
+
+    def setup_fastapi_routes(self) -> None:
+        """Create FastAPI router and register API endpoints."""
+        import fastapi
+
+        self.router = fastapi.APIRouter()
+        self.router.add_api_route("/login", self.login_page)
+        self.router.add_api_route("/callback", self.auth)
+        self.router.add_api_route("/logout", self.logout)
+        self.router.add_api_route("/certs", self.public_keys)
+        self.router.add_api_route(
+            "/backchannel-logout", self.backchannel_logout, methods=["POST"]
+        )
+
+    async def public_keys(self, request: Request) -> dict[str, Any]:
+        """Public keys of signed JWT client authentication, e.g. for Keycloak's "JWKS
+        URL" of the client. Includes previous keys during the overlap of a rotation.
+        """
+        if self.signing_keys is None:
+            return {"keys": []}
+        return {"keys": self.signing_keys.public_keys()}
+
+    async def login_page(
+        self, request: Request, redirect_target: str | None = None
+    ) -> RedirectResponse:
+        """Redirect to Keycloak login page."""
+        redirect_uri = (
+            URL(redirect_target)
+            if redirect_target
+            else request.url_for("auth")  # /auth/callback
+        )
+        if next := request.query_params.get("next"):
+            redirect_uri = redirect_uri.include_query_params(next=next)
+        return await self.keycloak.authorize_redirect(
+            request, redirect_uri, code_verifier=self.code_verifier
+        )
+
+    async def auth(self, request: Request) -> RedirectResponse:
+        """Authorize user with Keycloak access token."""
+        with self.instrumentation.measure("token"):
+            async with self._client_assertion():
+                token = await self.keycloak.authorize_access_token(request)
+        claims = await self.parse_claims(token)
+        user = User.from_claims(claims, token["access_token"])
+        await self._save_session(request, self._session_data(user, token, claims))
+        redirect_uri = request.query_params.get("next") or self._base_url
+        return RedirectResponse(redirect_uri)
+
+    async def parse_claims(
+        self,
+        token: dict[str, Any],
+        claims_options: dict[str, Any] | None = None,
+    ) -> JWTClaims:
+        verifier = await self.get_verifier()
+        access_token = token["access_token"]
+        key = await self.jwks.get_key(unverified_header(access_token).get("kid"))
+        with self.instrumentation.measure("decode"):
+            return await self.crypto.decode(verifier, access_token, key, claims_options)
+
+    async def get_verifier(self) -> TokenVerifier:
+        """Verifier for the current server metadata, only rebuilt when it is reloaded."""
+        metadata = self.keycloak.server_metadata
+        if "_loaded_at" not in metadata:
+            metadata = await self.keycloak.load_server_metadata()
+        if self._verifier is None or self._verifier.loaded_at != metadata["_loaded_at"]:
+            self._verifier = TokenVerifier(
+                metadata, self._audience, self.keycloak.client_id
+            )
+        return self._verifier
+
+    async def verify_token(self, access_token: str) -> User:
+        """Validate signature, `typ`, `exp`, `nbf`, `iss` and `aud` of an access token
+        locally.
+
+        Verified tokens are cached until they expire, so repeated requests with the
+        same token skip signature verification.
+
+        :raises JoseError: if the token is invalid
+        """
+        with self.instrumentation.measure("verify_token", "miss") as event:
+            digest = hashlib.sha256(access_token.encode()).digest()
+            if (user := self._token_cache.get(digest)) is not None:
+                event.outcome = "hit"
+                return user
+
+            verifier = await self.get_verifier()
+            claims = await self.parse_claims(
+                {"access_token": access_token}, verifier.access_token_options
+            )
+            claims.validate()
+
+            user = User.from_claims(claims, access_token)
+            self._token_cache.set(digest, user, ttl=claims["exp"] - time.time())
+            return user
+
+    def sync_verifier(self, **kwargs: Any) -> SyncTokenVerifier:
+        """Blocking verifier sharing the server metadata and public keys of this
+        client, e.g. for WSGI views or worker threads of the same process.
+
+        :param kwargs: Further arguments of `SyncTokenVerifier`, e.g. `client_kwargs`
+        """
+        kwargs.setdefault("audience", self._audience)
+        kwargs.setdefault("instrumentation", self.instrumentation)
+        return SyncTokenVerifier(
+            self._server_metadata_url,
+            metadata_refresh_interval=self.keycloak.metadata_refresh_interval,
+            max_stale=self.keycloak.max_stale,
+            metadata=self.keycloak.server_metadata,
+            jwks=self.jwks,
+            **kwargs,
+        )
+
+    async def get_bearer_user(self, request: Request) -> User:
+        """Authenticate request by the access token in its `Authorization: Bearer` header."""
+        scheme, _, access_token = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme.lower() == "bearer" and access_token:
+            try:
+                return await self.verify_token(access_token)
+            except (JoseError, ValueError):
+                pass
+            except httpx.HTTPError as e:
+                raise self.unavailable(e) from e
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    @staticmethod
+    def unavailable(error: httpx.HTTPError) -> HTTPException:
+        """`503 Service Unavailable` for requests which can't be authenticated because
+        a request to Keycloak failed or the circuit breaker is open.
+        """
+        if not isinstance(error, KeycloakUnavailableError):
+            log.warning("Request to Keycloak failed", exc_info=error)
+            return HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Keycloak is unavailable",
+            )
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers={"Retry-After": str(math.ceil(error.retry_after))},
+        )
+
+    async def introspect_token(
+        self, token: str, token_type_hint: str | None = None
+    ) -> dict[str, Any]:
+        """Ask Keycloak whether a token is active (RFC 7662).
+
+        Unlike `verify_token` this detects revoked tokens and supports opaque tokens.
+        Results are cached for `introspection_cache_ttl` seconds, but not beyond the
+        expiry of the token. Concurrent introspections of a token share a single request.
+
+        :return: Introspection response, `active` is false for invalid tokens
+        :raises httpx.HTTPError: if Keycloak could not introspect the token
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        with self.instrumentation.measure("introspect", "miss") as event:
+            if (result := self._introspections.get(digest)) is not None:
+                event.outcome = "hit"
+                return result
+            if digest in self._introspection_flights:
+                event.outcome = "coalesced"
+
+            async def fetch() -> dict[str, Any]:
+                async with self._client_assertion():
+                    result = await self.keycloak.introspect_token(
+                        token, token_type_hint=token_type_hint
+                    )
+                ttl = None
+                if result.get("active") and (exp := result.get("exp")) is not None:
+                    ttl = exp - time.time()
+                self._introspections.set(digest, result, ttl=ttl)
+                return result
+
+            return await self._introspection_flights.do(digest, fetch)
+
+    async def get_introspected_user(self, request: Request) -> User:
+        """Authenticate request by its `Authorization: Bearer` header with token
+        introspection, for endpoints which must reject revoked tokens.
+        """
+        scheme, _, access_token = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme.lower() == "bearer" and access_token:
+            try:
+                result = await self.introspect_token(access_token, "access_token")
+            except httpx.HTTPError as e:
+                raise self.unavailable(e) from e
+            if result.get("active") and "preferred_username" in result:
+                try:
+                    return User.from_claims(result, access_token)
+                except JoseError:
+                    pass
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    @staticmethod
+    def _session_data(
+        user: User,
+        token: dict[str, Any],
+        claims: JWTClaims,
+        auth_time: float | None = None,
+    ) -> dict[str, Any]:
+        return {
+            "user": user.model_dump(mode="json"),
+            "refresh_token": token.get("refresh_token"),
+            "expires_at": token.get("expires_at"),
+            # to match back-channel logouts
+            "sid": claims.get("sid"),
+            "sub": claims.get("sub"),
+            "auth_time": auth_time or claims.get("auth_time") or claims.get("iat"),
+        }
+
+    async def _save_session(
+        self, request: HTTPConnection, data: dict[str, Any], renew: bool = True
+    ) -> None:
+        if self.session_codec is not None:
+            data = {_ENCODED_SESSION_KEY: self.session_codec.encode(data)}
+        if self.session_store is None:
+            if self.session_codec is not None:
+                for key in _SESSION_KEYS:
+                    request.session.pop(key, None)
+            request.session.update(data)
+            return
+        session_id = request.session.get("session_id")
+        if renew or session_id is None:
+            # new id for every login to prevent session fixation
+            if session_id is not None:
+                await self.session_store.delete(session_id)
+            session_id = request.session["session_id"] = generate_token(32)
+        await self.session_store.set(session_id, data)
+
+    async def _load_session(self, request: HTTPConnection) -> dict[str, Any]:
+        if self.session_store is None:
+            session = request.session
+        elif (session_id := request.session.get("session_id")) is None:
+            return {}
+        else:
+            session = await self.session_store.get(session_id) or {}
+        return _decode_session(session)
+
+    async def refresh_token(self, refresh_token: str) -> dict[str, Any]:
+        """Exchange a refresh token for a new token.
+
+        Concurrent refreshes with the same refresh token share a single request.
+        """
+        digest = hashlib.sha256(refresh_token.encode()).digest()
+        with self.instrumentation.measure("token_refresh", "miss") as event:
+            if (token := self._refreshed_tokens.get(digest)) is not None:
+                event.outcome = "hit"
+                return token
+            if digest in self._token_refreshes:
+                event.outcome = "coalesced"
+
+            async def fetch() -> dict[str, Any]:
+                token = await self.fetch_token(
+                    grant_type="refresh_token", refresh_token=refresh_token
+                )
+                token.setdefault("refresh_token", refresh_token)
+                self._refreshed_tokens.set(digest, token)
+                return token
+
+            return await self._token_refreshes.do(digest, fetch)
+
+    async def fetch_token(self, **params: Any) -> dict[str, Any]:
+        """Request a token from the token endpoint, authenticated as this client.
+
+        :param params: Form parameters such as `grant_type`
+        """
+        async with self._client_assertion():
+            return await self.keycloak.fetch_access_token(**params)
+
+    async def exchange_token(
+        self, subject_token: str, audience: str, scope: str | None = None
+    ) -> dict[str, Any]:
+        """Exchange an access token for a token of a downstream service (RFC 8693).
+
+        Use it to propagate `User.token` with the audience of the called service.
+        Exchanged tokens are cached until `token_refresh_leeway` seconds before they
+        expire, concurrent identical exchanges share a single request.
+
+        :param subject_token: Access token of the user
+        :param audience: Client id of the downstream service
+        :param scope: Requested scope, none if omitted
+        :raises OAuthError: if Keycloak denies the exchange
+        """
+        digest = hashlib.sha256(subject_token.encode()).digest()
+        key = (digest, audience, scope)
+        with self.instrumentation.measure("token_exchange", "miss") as event:
+            if (token := self._exchanged_tokens.get(key)) is not None:
+                event.outcome = "hit"
+                return token
+            if key in self._token_exchanges:
+                event.outcome = "coalesced"
+
+            async def fetch() -> dict[str, Any]:
+                token = await self.fetch_token(
+                    grant_type=TOKEN_EXCHANGE_GRANT_TYPE,
+                    subject_token=subject_token,
+                    subject_token_type=ACCESS_TOKEN_TYPE,
+                    requested_token_type=ACCESS_TOKEN_TYPE,
+                    audience=audience,
+                    # empty to not request the scope of the registration
+                    scope=scope or "",
+                )
+                if (expires_at := token.get("expires_at")) is not None:
+                    ttl = expires_at - time.time() - self._token_refresh_leeway
+                    self._exchanged_tokens.set(key, token, ttl=ttl)
+                return token
+
+            return await self._token_exchanges.do(key, fetch)
+
+    def client_credentials(
+        self,
+        scope: str | None = None,
+        refresh_ahead: float = 60,
+        min_validity: float = 10,
+    ) -> ClientCredentials:
+        """Service account token of this client for outbound calls, usable as
+        `httpx.AsyncClient(auth=...)`. Create it once and share it.
+        """
+        return ClientCredentials(self, scope, refresh_ahead, min_validity)
+
+    async def _refresh_session(
+        self, request: HTTPConnection, session: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Refresh the access token of a session shortly before it expires."""
+        expires_at = session.get("expires_at")
+        refresh_token = session.get("refresh_token")
+        if (
+            not refresh_token
+            or not expires_at
+            or expires_at - time.time() > self._token_refresh_leeway
+        ):
+            return session
+        try:
+            token = await self.refresh_token(refresh_token)
+            claims = await self.parse_claims(token)
+            user = User.from_claims(claims, token["access_token"])
+        except OAuthError:
+            # refresh token is no longer valid, don't retry on every request
+            log.info("Could not refresh access token", exc_info=True)
+            session = {**session, "refresh_token": None}
+        except (httpx.HTTPError, JoseError, ValueError):
+            log.warning("Could not refresh access token", exc_info=True)
+            return session
+        else:
+            session = self._session_data(user, token, claims, session.get("auth_time"))
+        await self._save_session(request, session, renew=False)
+        return session
+
+    async def _clear_session(self, request: HTTPConnection) -> None:
+        setattr(request.state, _USER_STATE, None)
+        for key in _SESSION_KEYS:
+            request.session.pop(key, None)
+        session_id = request.session.pop("session_id", None)
+        if self.session_store is not None and session_id is not None:
+            await self.session_store.delete(session_id)
+
+    async def logout(self, request: Request) -> RedirectResponse:
+        """Deauthorize user and redirect to logout page."""
+        await self._clear_session(request)
+        return RedirectResponse(self._logout_page)
+
+    async def verify_logout_token(self, logout_token: str) -> JWTClaims:
+        """Validate a logout token of OpenID Connect Back-Channel Logout.
+
+        :raises JoseError: if the token is invalid
+        """
+        verifier = await self.get_verifier()
+        claims = await self.parse_claims(
+            {"access_token": logout_token}, verifier.logout_token_options
+        )
+        claims.validate()
+        return claims
+
+    async def backchannel_logout(self, request: Request) -> Response:
+        """Revoke the sessions of a logout token sent by Keycloak.
+
+        Configure `<base url>/auth/backchannel-logout` as "Backchannel logout URL" of
+        the client in Keycloak.
+        """
+        headers = {"Cache-Control": "no-store"}
+        with self.instrumentation.measure("backchannel_logout"):
+            form = await request.form()
+            try:
+                claims = await self.verify_logout_token(str(form.get("logout_token")))
+                if not self.revocations.record_logout_token(claims["jti"]):
+                    raise ValueError("Logout token was already used")
+            except (JoseError, ValueError) as e:
+                log.info("Invalid logout token: %s", e)
+                return JSONResponse(
+                    {"error": "invalid_request", "error_description": str(e)},
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    headers=headers,
+                )
+            self.revocations.revoke(claims.get("sid"), claims.get("sub"), claims["iat"])
+        return Response(headers=headers)
+
+    @_hybridmethod
+    async def get_user(
+        self: "KeycloakOAuth2 | type[KeycloakOAuth2]", request: HTTPConnection
+    ) -> User:
+        """Get the user of the current session.
+
+        Use `Depends(keycloak.get_user)` to load sessions from the session store and
+        refresh expiring access tokens. `KeycloakOAuth2.get_user` on the class only
+        reads users stored in the session cookie, sessions ended by back-channel logout
+        to any client of this process are rejected by both.
+
+        The user is memoized for the rest of the request.
+        """
+        if (user := getattr(request.state, _USER_STATE, None)) is not None:
+            if isinstance(self, KeycloakOAuth2):
+                self.instrumentation.on_event(Event("session", "hit"))
+            return user
+        if isinstance(self, KeycloakOAuth2):
+            with self.instrumentation.measure("session", "miss") as event:
+                session = await self._load_session(request)
+                if session and self.revocations.is_revoked(
+                    session.get("sid"), session.get("sub"), session.get("auth_time")
+                ):
+                    event.outcome = "revoked"
+                    await self._clear_session(request)
+                    session = {}
+                if session:
+                    session = await self._refresh_session(request, session)
+                if (data := session.get("user")) is not None:
+                    user = User.from_trusted(data)
+                elif event.outcome != "revoked":
+                    event.outcome = "anonymous"
+        else:
+            session = _decode_session(request.session)
+            if session and is_revoked_in_process(
+                session.get("sid"), session.get("sub"), session.get("auth_time")
+            ):
+                for key in _SESSION_KEYS:
+                    request.session.pop(key, None)
+            elif (data := session.get("user")) is not None:
+                user = User.from_trusted(data)
+        if user is not None:
+            setattr(request.state, _USER_STATE, user)
+            return user
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
@@ -0,0 +1,27 @@
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode, TracerProvider
+
+from keycloak_oauth.instrumentation import Event, Instrumentation
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    """Export Keycloak interactions as OpenTelemetry spans.
+
+    Spans are named `keycloak_oauth.<event>` and are children of the span that is
+    current when the interaction finishes, e.g. the span of the request.
+    """
+
+    def __init__(self, tracer_provider: TracerProvider | None = None) -> None:
+        self.tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+
+    def on_event(self, event: Event) -> None:
+        start_time = int(event.start_time * 1e9)
+        span = self.tracer.start_span(
+            f"keycloak_oauth.{event.name}",
+            start_time=start_time,
+            attributes={"keycloak_oauth.outcome": event.outcome},
+        )
+        if event.error is not None:
+            span.set_attribute("error.type", event.error)
+            span.set_status(Status(StatusCode.ERROR))
+        span.end(end_time=start_time + int(event.duration * 1e9))
@@ -0,0 +1,31 @@
+from prometheus_client import REGISTRY, CollectorRegistry, Histogram
+
+from keycloak_oauth.instrumentation import Event, Instrumentation
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """Export Keycloak interactions as a Prometheus histogram.
+
+    Durations are observed in `keycloak_oauth_duration_seconds` labeled by
+    `event`, `outcome` and `error`.
+    """
+
+    def __init__(
+        self,
+        registry: CollectorRegistry = REGISTRY,
+        namespace: str = "keycloak_oauth",
+        buckets: tuple[float, ...] = Histogram.DEFAULT_BUCKETS,
+    ) -> None:
+        self.histogram = Histogram(
+            "duration_seconds",
+            "Duration of Keycloak interactions and token verification",
+            labelnames=("event", "outcome", "error"),
+            namespace=namespace,
+            registry=registry,
+            buckets=buckets,
+        )
+
+    def on_event(self, event: Event) -> None:
+        self.histogram.labels(event.name, event.outcome, event.error or "").observe(
+            event.duration
+        )
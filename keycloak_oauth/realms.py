@@ -0,0 +1,187 @@
+import re
+from collections.abc import Collection
+from typing import Any
+
+import httpx
+from authlib.jose.errors import InvalidClaimError, JoseError
+from starlette import status
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+
+from keycloak_oauth import KeycloakOAuth2, User
+from keycloak_oauth.cache import TTLCache
+from keycloak_oauth.circuit import CircuitBreaker
+from keycloak_oauth.http import DEFAULT_LIMITS, SharedTransport
+from keycloak_oauth.jwks import unverified_claims
+
+# URL-safe realm names, not `.` or `..`
+_REALM_NAME = re.compile(r"(?!\.+$)[\w.-]+", re.ASCII)
+
+
+class RealmRegistry:
+    """Bearer token verification for many realms of one Keycloak server.
+
+    The realm of a token is taken from its (not yet verified) `iss` claim, which
+    must be `<server_url>/realms/<realm>`. A `KeycloakOAuth2` client per realm is
+    created on first use and loads the realm's metadata and keys lazily. It is only
+    kept once the metadata is loaded, so tokens of unknown realms don't evict known
+    ones, and unknown realms are not requested again for `unknown_realm_ttl`
+    seconds. All realms share one connection pool and one circuit breaker. Realms
+    unused for `idle_timeout` seconds or beyond `max_realms` (least recently used
+    first) are dropped.
+
+    :param server_url: Base URL of Keycloak, e.g. `https://keycloak.example.com`
+    :param client_id: Client id in every realm
+    :param allowed_realms: Only accept tokens of these realms, any realm if omitted
+    :param max_realms: Maximum number of realms kept in memory
+    :param idle_timeout: Seconds after which an unused realm is dropped
+    :param unknown_realm_ttl: Seconds a realm not found in Keycloak is rejected
+        without asking Keycloak again
+    :param transport: Custom transport for Keycloak requests instead of the connection pool
+    :param circuit_failure_threshold: Consecutive failed Keycloak requests after
+        which further requests fail fast, `0` disables the circuit breaker
+    :param circuit_reset_timeout: Seconds until a request is tried again
+    :param kwargs: Further arguments of `KeycloakOAuth2`, e.g. `audience`
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        client_id: str,
+        client_secret: str | bytes | None = None,
+        client_kwargs: dict[str, Any] | None = None,
+        allowed_realms: Collection[str] | None = None,
+        max_realms: int = 256,
+        idle_timeout: float = 3600,
+        unknown_realm_ttl: float = 60,
+        http_limits: httpx.Limits = DEFAULT_LIMITS,
+        http2: bool = False,
+        transport: httpx.AsyncBaseTransport | None = None,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_timeout: float = 30,
+        **kwargs: Any,
+    ) -> None:
+        self.issuer_prefix = f"{server_url.rstrip('/')}/realms/"
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.client_kwargs = dict(client_kwargs or {})
+        self.allowed_realms = (
+            None if allowed_realms is None else frozenset(allowed_realms)
+        )
+        self.kwargs = kwargs
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                verify=self.client_kwargs.get("verify", True),
+                cert=self.client_kwargs.get("cert"),
+                http2=http2,
+                limits=http_limits,
+            )
+        self.circuit_breaker = CircuitBreaker(
+            circuit_failure_threshold,
+            circuit_reset_timeout,
+            kwargs.get("instrumentation"),
+        )
+        self._transport = SharedTransport(transport, self.circuit_breaker)
+        self._realms: TTLCache[str, KeycloakOAuth2] = TTLCache(max_realms, idle_timeout)
+        # realms until their metadata is loaded, shared by concurrent first requests
+        self._loading: TTLCache[str, KeycloakOAuth2] = TTLCache(
+            max_realms, idle_timeout
+        )
+        self._unknown_realms: TTLCache[str, bool] = TTLCache(
+            max_realms, unknown_realm_ttl
+        )
+
+    def __len__(self) -> int:
+        return len(self._realms)
+
+    def realm_name(self, issuer: str) -> str:
+        """Name of the realm of an issuer.
+
+        :raises InvalidClaimError: if the issuer is not an allowed realm of the server
+        """
+        if issuer.startswith(self.issuer_prefix):
+            realm = issuer[len(self.issuer_prefix) :]
+            if _REALM_NAME.fullmatch(realm) and (
+                self.allowed_realms is None or realm in self.allowed_realms
+            ):
+                return realm
+        raise InvalidClaimError("iss")
+
+    def get_realm(self, issuer: str) -> KeycloakOAuth2:
+        """Client of the realm of an issuer, created on first use.
+
+        :raises InvalidClaimError: if the issuer is not an allowed realm of the server
+            or recently not found in Keycloak
+        """
+        if (realm := self._realms.get(issuer)) is not None:
+            # reset the idle timeout
+            self._realms.set(issuer, realm)
+            return realm
+        self.realm_name(issuer)
+        if issuer in self._unknown_realms:
+            raise InvalidClaimError("iss")
+        if (realm := self._loading.get(issuer)) is None:
+            realm = KeycloakOAuth2(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                server_metadata_url=f"{issuer}/.well-known/openid-configuration",
+                client_kwargs=self.client_kwargs,
+                transport=self._transport,
+                # the registry's circuit breaker covers all realms
+                circuit_failure_threshold=0,
+                **self.kwargs,
+            )
+            self._loading.set(issuer, realm)
+        return realm
+
+    async def verify_token(self, access_token: str) -> User:
+        """Verify an access token with the keys of the realm that issued it.
+
+        :raises JoseError: if the token is invalid or not issued by an allowed realm
+        """
+        issuer = unverified_claims(access_token).get("iss")
+        if not isinstance(issuer, str):
+            raise InvalidClaimError("iss")
+        realm = self.get_realm(issuer)
+        try:
+            return await realm.verify_token(access_token)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == httpx.codes.NOT_FOUND:
+                self._realms.pop(issuer)
+                self._loading.pop(issuer)
+                self._unknown_realms.set(issuer, True)
+                raise InvalidClaimError("iss") from e
+            raise
+        finally:
+            # keep the realm once its metadata is loaded, whether the token is valid
+            if (
+                "_loaded_at" in realm.keycloak.server_metadata
+                and issuer not in self._realms
+                and issuer not in self._unknown_realms
+            ):
+                self._realms.set(issuer, realm)
+                self._loading.pop(issuer)
+
+    async def get_bearer_user(self, request: Request) -> User:
+        """Authenticate request by the access token in its `Authorization: Bearer` header."""
+        scheme, _, access_token = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme.lower() == "bearer" and access_token:
+            try:
+                return await self.verify_token(access_token)
+            except (JoseError, ValueError):
+                pass
+            except httpx.HTTPError as e:
+                raise KeycloakOAuth2.unavailable(e) from e
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    async def aclose(self) -> None:
+        """Close the connection pool shared by all realms."""
+        self._realms.clear()
+        self._loading.clear()
+        await self._transport.close()
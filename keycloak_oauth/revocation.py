@@ -0,0 +1,76 @@
+import time
+import weakref
+
+from keycloak_oauth.cache import TTLCache
+
+# revocation lists of all clients in this process, for `KeycloakOAuth2.get_user`
+_REVOCATION_LISTS: "weakref.WeakSet[RevocationList]" = weakref.WeakSet()
+
+
+class RevocationList:
+    """Sessions ended in Keycloak, as reported by back-channel logout.
+
+    Revoked session ids (`sid`) and subjects (`sub`) are kept in bounded TTL caches,
+    so checking a session costs two dictionary lookups. A revoked subject ends all of
+    its sessions authenticated up to the time of the logout.
+
+    :param ttl: Seconds a revocation is kept, should cover the maximum session lifetime
+    :param maxsize: Maximum number of revoked sessions, subjects and logout tokens
+        each, the oldest are forgotten first
+    """
+
+    def __init__(self, ttl: float = 36_000, maxsize: int = 100_000) -> None:
+        self._sessions: TTLCache[str, float] = TTLCache(maxsize, ttl)
+        self._subjects: TTLCache[str, float] = TTLCache(maxsize, ttl)
+        # `jti`s of received logout tokens
+        self._logout_tokens: TTLCache[str, float] = TTLCache(maxsize, ttl)
+        _REVOCATION_LISTS.add(self)
+
+    def __len__(self) -> int:
+        return len(self._sessions) + len(self._subjects)
+
+    def revoke(
+        self,
+        sid: str | None = None,
+        sub: str | None = None,
+        revoked_at: float | None = None,
+    ) -> None:
+        """Revoke a single session by `sid`, otherwise all sessions of `sub`."""
+        revoked_at = time.time() if revoked_at is None else revoked_at
+        if sid is not None:
+            self._sessions.set(sid, revoked_at)
+        elif sub is not None:
+            self._subjects.set(sub, revoked_at)
+
+    def record_logout_token(self, jti: str) -> bool:
+        """Remember the `jti` of a logout token, `False` if it is replayed."""
+        if jti in self._logout_tokens:
+            return False
+        self._logout_tokens.set(jti, time.time())
+        return True
+
+    def is_revoked(
+        self, sid: str | None, sub: str | None, auth_time: float | None
+    ) -> bool:
+        """Whether a session has been revoked.
+
+        :param auth_time: When the session was authenticated, sessions without are
+            revoked together with their subject
+        """
+        if not self:
+            return False
+        if sid is not None and sid in self._sessions:
+            return True
+        if sub is not None and (revoked_at := self._subjects.get(sub)) is not None:
+            return auth_time is None or auth_time <= revoked_at
+        return False
+
+
+def is_revoked_in_process(
+    sid: str | None, sub: str | None, auth_time: float | None
+) -> bool:
+    """Whether a session has been revoked by any client in this process."""
+    return any(
+        revocations.is_revoked(sid, sub, auth_time)
+        for revocations in list(_REVOCATION_LISTS)
+    )
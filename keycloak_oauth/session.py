@@ -0,0 +1,160 @@
+import base64
+import json
+import zlib
+from collections.abc import Iterable
+from typing import Any, Literal, Protocol
+
+from keycloak_oauth.cache import TTLCache
+
+USER_FIELDS: tuple[str, ...] = (
+    "name",
+    "email",
+    "roles",
+    "token",
+    "client_roles",
+    "scopes",
+)
+# further keys of the session data written by `KeycloakOAuth2.auth`
+_SESSION_FIELDS: tuple[str, ...] = (
+    "refresh_token",
+    "expires_at",
+    "sid",
+    "sub",
+    "auth_time",
+)
+_EMPTY: dict[str, Any] = {
+    "email": None,
+    "roles": [],
+    "token": "",
+    "client_roles": {},
+    "scopes": [],
+}
+
+_LENGTH = len(USER_FIELDS) + len(_SESSION_FIELDS)
+_VERSION = 0x10
+_COMPRESSED = 0x01
+_MSGPACK = 0x02
+
+
+class SessionStore(Protocol):
+    """Server-side storage of user sessions.
+
+    The session cookie only carries an opaque session id, the session data is
+    loaded from the store. Implement this protocol for shared stores such as Redis.
+    """
+
+    async def get(self, session_id: str) -> dict[str, Any] | None:
+        """Load session data, `None` if it does not exist or has expired."""
+        ...
+
+    async def set(self, session_id: str, data: dict[str, Any]) -> None:
+        """Create or replace session data."""
+        ...
+
+    async def delete(self, session_id: str) -> None:
+        """Remove session data if it exists."""
+        ...
+
+
+class MemorySessionStore:
+    """In-memory session store for a single process.
+
+    :param maxsize: Maximum number of sessions, least recently used are evicted first
+    :param ttl: Lifetime of a session in seconds
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600) -> None:
+        self._sessions: TTLCache[str, dict[str, Any]] = TTLCache(maxsize, ttl)
+
+    async def get(self, session_id: str) -> dict[str, Any] | None:
+        return self._sessions.get(session_id)
+
+    async def set(self, session_id: str, data: dict[str, Any]) -> None:
+        self._sessions.set(session_id, data)
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+
+
+class SessionCodec:
+    """Compact encoding of the session data written by `KeycloakOAuth2.auth`.
+
+    Instead of a dict with all user fields, the session stores a single url-safe
+    string: the projected fields as a positional array, serialized as compact JSON
+    or msgpack (`pip install keycloak-oauth[msgpack]`) and compressed with zlib if
+    that makes it smaller. Decoding doesn't depend on the configuration, so existing
+    sessions stay readable when it changes.
+
+    :param fields: User fields to store, the others are empty after decoding. Omit
+        `token` to drop the access token, `User.token` is then empty and can't be
+        propagated or exchanged.
+    :param compress: Compress with zlib
+    :param format: `json` or `msgpack`
+    """
+
+    def __init__(
+        self,
+        fields: Iterable[str] = USER_FIELDS,
+        compress: bool = True,
+        format: Literal["json", "msgpack"] = "json",
+    ) -> None:
+        self.fields = frozenset(fields) | {"name"}
+        if unknown := self.fields.difference(USER_FIELDS):
+            raise ValueError(f"Unknown user fields {sorted(unknown)}")
+        self.compress = compress
+        self.format = format
+        if format == "msgpack":
+            _msgpack()
+
+    def encode(self, data: dict[str, Any]) -> str:
+        user = data["user"]
+        values = [
+            user.get(field) if field in self.fields else None for field in USER_FIELDS
+        ]
+        values += [data.get(key) for key in _SESSION_FIELDS]
+        flags = _VERSION
+        if self.format == "msgpack":
+            flags |= _MSGPACK
+            raw = _msgpack().packb(values)
+        else:
+            raw = json.dumps(values, separators=(",", ":")).encode()
+        if self.compress and len(compressed := zlib.compress(raw)) < len(raw):
+            flags |= _COMPRESSED
+            raw = compressed
+        return base64.urlsafe_b64encode(bytes([flags]) + raw).rstrip(b"=").decode()
+
+    @staticmethod
+    def decode(value: str) -> dict[str, Any]:
+        """Session data in the format of `KeycloakOAuth2.auth`.
+
+        :raises ValueError: if the value is not an encoded session
+        """
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+            flags, raw = raw[0], raw[1:]
+            if flags & 0xF0 != _VERSION:
+                raise ValueError(f"Unsupported session version {flags >> 4}")
+            if flags & _COMPRESSED:
+                raw = zlib.decompress(raw)
+            values = _msgpack().unpackb(raw) if flags & _MSGPACK else json.loads(raw)
+        except (IndexError, zlib.error) as e:
+            raise ValueError(f"Invalid session: {e}") from e
+        if not isinstance(values, list) or len(values) != _LENGTH:
+            raise ValueError("Invalid session: unexpected fields")
+        user = dict(zip(USER_FIELDS, values))
+        for field, empty in _EMPTY.items():
+            if user[field] is None:
+                user[field] = empty
+        data: dict[str, Any] = dict(zip(_SESSION_FIELDS, values[len(USER_FIELDS) :]))
+        data["user"] = user
+        return data
+
+
+def _msgpack() -> Any:
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError(
+            "The msgpack session format requires `pip install keycloak-oauth[msgpack]`"
+        ) from e
+    return msgpack
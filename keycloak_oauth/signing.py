@@ -0,0 +1,93 @@
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from authlib.jose import JsonWebKey
+from authlib.jose.rfc7517 import Key
+
+# default algorithm by key type and curve
+_ALGORITHMS = {
+    ("RSA", None): "RS256",
+    ("EC", "P-256"): "ES256",
+    ("EC", "P-384"): "ES384",
+    ("EC", "P-521"): "ES512",
+    ("OKP", "Ed25519"): "EdDSA",
+    ("OKP", "Ed448"): "EdDSA",
+}
+
+
+class SigningKey(NamedTuple):
+    """Private key for signed JWT client authentication, parsed once."""
+
+    key: Key
+    alg: str
+
+    @property
+    def kid(self) -> str:
+        return self.key.kid
+
+    @property
+    def public_jwk(self) -> dict[str, Any]:
+        """Public key as published to Keycloak."""
+        return self.key.as_dict(is_private=False, alg=self.alg, use="sig")
+
+
+def load_signing_key(pem: bytes, alg: str | None = None) -> SigningKey:
+    """Parse a PEM private key, identified by its thumbprint as `kid`.
+
+    :param pem: RSA, EC or Ed25519 private key, e.g. generated via
+        `openssl genpkey -algorithm ed25519 -out keypair.pem`
+    :param alg: Signature algorithm, by default `RS256` for RSA, `ES256` for P-256
+        and `EdDSA` for Ed25519 keys
+    :raises ValueError: if the key is not a private key or its type is unsupported
+    """
+    key = JsonWebKey.import_key(pem)
+    if key.public_only:
+        raise ValueError("Signing key must be a private key")
+    if alg is None:
+        kty = key.kty
+        curve = None if kty == "RSA" else key.as_dict(is_private=False).get("crv")
+        if (alg := _ALGORITHMS.get((kty, curve))) is None:
+            raise ValueError(f"Unsupported signing key {kty} {curve}")
+    key = JsonWebKey.import_key(pem, {"kid": key.thumbprint(), "use": "sig"})
+    return SigningKey(key, alg)
+
+
+class SigningKeys:
+    """Current signing key and the public keys to publish for Keycloak.
+
+    After a rotation, the previous public keys stay published for the overlap, so
+    Keycloak still accepts client assertions signed with them.
+
+    :param current: Key used for signing
+    """
+
+    def __init__(
+        self, current: SigningKey, timer: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.current = current
+        self._timer = timer
+        # previous keys with the time until which they are published
+        self._previous: list[tuple[float, SigningKey]] = []
+
+    def rotate(self, key: SigningKey, overlap: float) -> None:
+        """Sign with `key` from now on, keep publishing the current key for `overlap`
+        seconds.
+        """
+        now = self._timer()
+        previous = [
+            (until, old)
+            for until, old in self._previous
+            if until > now and old.kid != key.kid
+        ]
+        if self.current.kid != key.kid:
+            previous.append((now + overlap, self.current))
+        self._previous = previous
+        self.current = key
+
+    def public_keys(self) -> list[dict[str, Any]]:
+        """Public keys of the current key and the previous keys still in overlap."""
+        now = self._timer()
+        return [self.current.public_jwk] + [
+            old.public_jwk for until, old in self._previous if until > now
+        ]
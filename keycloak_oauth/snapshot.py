@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+log = logging.getLogger(__name__)
+
+
+class Discovery(NamedTuple):
+    """Server metadata and key set of a realm."""
+
+    metadata: dict[str, Any]
+    jwk_set: dict[str, Any]
+    """Seconds since they were fetched from Keycloak"""
+    age: float = 0.0
+
+
+class DiscoverySnapshot:
+    """Server metadata and public keys persisted to a local file, so a restarted
+    process can authenticate before (or without) reaching Keycloak.
+
+    The file only contains public data, but it is trusted like Keycloak itself:
+    keep it in a location only the application can write to.
+
+    :param path: Location of the snapshot file
+    :param max_age: Seconds after which a snapshot is no longer used
+    """
+
+    def __init__(self, path: Path | str, max_age: float = 86_400) -> None:
+        self.path = Path(path)
+        self.max_age = max_age
+
+    def load(self, metadata_url: str) -> Discovery | None:
+        """Read the snapshot, `None` if it is missing, too old or of another realm."""
+        try:
+            data = json.loads(self.path.read_bytes())
+            if data["metadata_url"] != metadata_url:
+                return None
+            age = time.time() - data["fetched_at"]
+            discovery = Discovery(data["metadata"], data["jwks"], max(age, 0.0))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring invalid discovery snapshot %s: %s", self.path, e)
+            return None
+        if discovery.age >= self.max_age:
+            return None
+        return discovery
+
+    def save(self, metadata_url: str, discovery: Discovery) -> None:
+        """Atomically replace the snapshot, failures are logged and ignored."""
+        data = {
+            "metadata_url": metadata_url,
+            "fetched_at": time.time() - discovery.age,
+            "metadata": discovery.metadata,
+            "jwks": discovery.jwk_set,
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            log.warning("Failed to write discovery snapshot %s: %s", self.path, e)
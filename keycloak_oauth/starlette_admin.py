@@ -1,11 +1,12 @@
 from typing import Sequence
 from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.responses import JSONResponse, RedirectResponse
+from starlette.responses import JSONResponse, RedirectResponse, Response
 from starlette.routing import Route
 from starlette_admin.auth import AdminUser, AuthProvider, login_not_required
 from starlette_admin.base import BaseAdmin
 from keycloak_oauth import KeycloakOAuth2, User
+from keycloak_oauth.authorization import Requirement
 
 
 class KeycloakAuthProvider(AuthProvider):
@@ -16,17 +17,34 @@ class KeycloakAuthProvider(AuthProvider):
         logout_path: str = "/logout",
         allow_paths: Sequence[str] | None = None,
         allow_routes: Sequence[str] | None = None,
+        requirement: Requirement | None = None,
     ) -> None:
+        """
+        :param requirement: Users must meet it to access the admin, e.g.
+            `require_roles("admin", get_user=keycloak.get_user)`
+        """
         self.keycloak = keycloak
+        self.requirement = requirement
         super().__init__(login_path, logout_path, allow_paths, allow_routes)
 
-    async def is_authenticated(self, request: Request) -> bool:
+    async def _get_user(self, request: Request) -> User | None:
+        if isinstance(user := request.scope.get("user"), User):
+            # already authenticated by `KeycloakAuthMiddleware`
+            return user
         try:
-            user = await self.keycloak.get_user(request)
-            request.state.user = user
-            return True
+            return await self.keycloak.get_user(request)
         except HTTPException:
+            return None
+
+    def allows(self, request: Request, requirement: Requirement) -> bool:
+        """Check the user of an admin request, e.g. in `is_accessible` of views."""
+        return requirement.allows(getattr(request.state, "user", None))
+
+    async def is_authenticated(self, request: Request) -> bool:
+        if (user := await self._get_user(request)) is None:
             return False
+        request.state.user = user
+        return self.requirement is None or self.requirement.allows(user)
 
     def get_admin_user(self, request: Request) -> AdminUser | None:
         user: User = request.state.user
@@ -35,9 +53,14 @@ class KeycloakAuthProvider(AuthProvider):
             # photo_url=user.avatar,  # TODO
         )
 
-    async def render_login(
-        self, request: Request, admin: BaseAdmin
-    ) -> RedirectResponse:
+    async def render_login(self, request: Request, admin: BaseAdmin) -> Response:
+        if (
+            self.requirement is not None
+            and (user := await self._get_user(request))
+            and not self.requirement.allows(user)
+        ):
+            # logged in, but not allowed: logging in again would loop
+            return JSONResponse({"detail": "Not authorized"}, status_code=403)
         redirect_uri = request.url_for(admin.route_name + ":authorize_keycloak")
         return await self.keycloak.login_page(request, str(redirect_uri))
 
@@ -55,6 +78,10 @@ class KeycloakAuthProvider(AuthProvider):
         keys = await self.keycloak.public_keys(request)
         return JSONResponse(keys)
 
+    @login_not_required
+    async def backchannel_logout(self, request: Request) -> Response:
+        return await self.keycloak.backchannel_logout(request)
+
     def setup_admin(self, admin: BaseAdmin) -> None:
         super().setup_admin(admin)
         """add custom authentication callback route"""
@@ -73,3 +100,10 @@ class KeycloakAuthProvider(AuthProvider):
                 methods=["GET"],
             )
         )
+        admin.routes.append(
+            Route(
+                "/auth/backchannel-logout",
+                self.backchannel_logout,
+                methods=["POST"],
+            )
+        )
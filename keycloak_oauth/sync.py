@@ -0,0 +1,265 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import Any
+
+import httpx
+from authlib.jose.rfc7517 import Key
+
+from keycloak_oauth.cache import StripedTTLCache
+from keycloak_oauth.http import DEFAULT_LIMITS
+from keycloak_oauth.instrumentation import Instrumentation
+from keycloak_oauth.jwks import JWKSManager, unverified_header
+from keycloak_oauth.user import User
+from keycloak_oauth.verifier import TokenVerifier
+
+log = logging.getLogger(__name__)
+
+
+class SyncTokenVerifier:
+    """Blocking verification of Bearer tokens, e.g. for WSGI apps or worker threads.
+
+    A single instance is meant to be shared by all threads of a process. Server
+    metadata and public keys are fetched through one pooled `httpx.Client`, only one
+    thread fetches at a time. While they may still be served stale, one thread
+    refreshes them and the others carry on with the known ones. Verified tokens are
+    cached in a lock-striped cache, so threads rarely wait for each other.
+
+    Use `KeycloakOAuth2.sync_verifier` to share server metadata and public keys with
+    the async client of the same process.
+
+    :param server_metadata_url: OpenID Connect discovery URL of the Keycloak realm
+    :param audience: Required `aud` claim of Bearer tokens, not checked if omitted
+    :param token_cache_size: Maximum number of verified Bearer tokens kept in memory
+    :param token_cache_ttl: Maximum lifetime in seconds of a verified Bearer token in
+        the cache
+    :param jwks_refresh_interval: Seconds after which Keycloak's public keys are
+        refetched
+    :param jwks_min_refetch_interval: Minimum seconds between refetches for an
+        unknown `kid` and between refreshes
+    :param metadata_refresh_interval: Seconds after which the server metadata is
+        refetched
+    :param max_stale: Seconds the server metadata and public keys are still served
+        beyond their refresh interval while refetching
+    :param http_limits: Size and keep-alive of the connection pool to Keycloak
+    :param http_timeout: Timeout of Keycloak requests in seconds
+    :param client_kwargs: Further arguments of `httpx.Client`, e.g. `verify`
+    :param transport: Custom transport for Keycloak requests instead of the
+        connection pool
+    :param instrumentation: Observer of Keycloak interactions, e.g. for metrics
+    :param cache_stripes: Number of independently locked parts of the token cache
+    :param metadata: Server metadata to share, updated in place when it is loaded
+    :param jwks: Public keys to share, `jwks_*` and `max_stale` are taken from it
+    """
+
+    def __init__(
+        self,
+        server_metadata_url: str,
+        audience: str | None = None,
+        token_cache_size: int = 4096,
+        token_cache_ttl: float = 300,
+        jwks_refresh_interval: float = 300,
+        jwks_min_refetch_interval: float = 10,
+        metadata_refresh_interval: float = 3600,
+        max_stale: float = 3600,
+        http_limits: httpx.Limits = DEFAULT_LIMITS,
+        http_timeout: float | httpx.Timeout = 5,
+        client_kwargs: dict[str, Any] | None = None,
+        transport: httpx.BaseTransport | None = None,
+        instrumentation: Instrumentation | None = None,
+        cache_stripes: int = 16,
+        metadata: dict[str, Any] | None = None,
+        jwks: JWKSManager | None = None,
+    ) -> None:
+        self.server_metadata_url = server_metadata_url
+        self.audience = audience
+        self.metadata_refresh_interval = metadata_refresh_interval
+        self.max_stale = max_stale
+        self.instrumentation = instrumentation or Instrumentation()
+        self.metadata: dict[str, Any] = {} if metadata is None else metadata
+        self.jwks = jwks or JWKSManager(
+            None,
+            jwks_refresh_interval,
+            jwks_min_refetch_interval,
+            self.instrumentation,
+            max_stale,
+        )
+        self._token_cache: StripedTTLCache[bytes, User] = StripedTTLCache(
+            token_cache_size, token_cache_ttl, cache_stripes
+        )
+        self._client_kwargs: dict[str, Any] = {
+            "limits": http_limits,
+            "timeout": http_timeout,
+            **(client_kwargs or {}),
+        }
+        if transport is not None:
+            self._client_kwargs["transport"] = transport
+        self._client: httpx.Client | None = None
+        self._client_lock = threading.Lock()
+        self._metadata_lock = threading.Lock()
+        self._metadata_refetched_at = -float("inf")
+        self._jwks_lock = threading.Lock()
+        self._jwks_refetched_at = -float("inf")
+        self._verifier: TokenVerifier | None = None
+
+    def __enter__(self) -> "SyncTokenVerifier":  # noqa: PYI034
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    @property
+    def client(self) -> httpx.Client:
+        """HTTP client for Keycloak requests, opened on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(**self._client_kwargs)
+        return self._client
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _get_json(self, url: str) -> dict[str, Any]:
+        response = self.client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def load_server_metadata(self) -> dict[str, Any]:
+        """Server metadata of the realm, fetched on first use and once it is due."""
+        if (loaded_at := self.metadata.get("_loaded_at")) is not None:
+            age = time.time() - loaded_at
+            if age < self.metadata_refresh_interval:
+                return self.metadata
+            if age < self.metadata_refresh_interval + self.max_stale:
+                # one thread refreshes, the others serve the stale metadata
+                if self._metadata_lock.acquire(blocking=False):
+                    try:
+                        self._refresh_metadata()
+                    finally:
+                        self._metadata_lock.release()
+                return self.metadata
+        outcome = "miss" if loaded_at is None else "stale"
+        with (
+            self.instrumentation.measure("metadata", outcome) as event,
+            self._metadata_lock,
+        ):
+            if self.metadata.get("_loaded_at") != loaded_at:
+                # loaded by another thread while waiting for the lock
+                event.outcome = "coalesced"
+            else:
+                self._fetch_metadata()
+        return self.metadata
+
+    def _fetch_metadata(self) -> None:
+        self._metadata_refetched_at = time.monotonic()
+        metadata = self._get_json(self.server_metadata_url)
+        self.metadata.update(metadata, _loaded_at=time.time())
+
+    def _refresh_metadata(self) -> None:
+        if (
+            time.monotonic() - self._metadata_refetched_at
+            < self.jwks.min_refetch_interval
+        ):
+            return
+        try:
+            with self.instrumentation.measure("metadata", "refresh"):
+                self._fetch_metadata()
+        except Exception:
+            log.warning("Failed to refresh server metadata", exc_info=True)
+
+    def get_verifier(self) -> TokenVerifier:
+        """Verifier for the current server metadata, only rebuilt when it is reloaded."""
+        metadata = self.load_server_metadata()
+        verifier = self._verifier
+        if verifier is None or verifier.loaded_at != metadata["_loaded_at"]:
+            # threads racing here build equivalent verifiers, any of them may win
+            verifier = self._verifier = TokenVerifier(metadata, self.audience)
+        return verifier
+
+    def get_key(self, kid: str | None) -> Key:
+        """Find the key for the `kid` of a JWT header.
+
+        :raises ValueError: if no key with this `kid` exists after refetching
+        """
+        jwks = self.jwks
+        if (key := jwks.lookup(kid)) is not None:
+            age = jwks.age
+            if age < jwks.refresh_interval:
+                return key
+            if age < jwks.refresh_interval + jwks.max_stale:
+                # one thread refreshes, the others keep using the known key
+                if self._jwks_lock.acquire(blocking=False):
+                    try:
+                        self._refresh_jwks()
+                    finally:
+                        self._jwks_lock.release()
+                return key
+            with self._jwks_lock:
+                # unless another thread refetched while waiting for the lock
+                if jwks.age >= jwks.refresh_interval + jwks.max_stale:
+                    self._fetch_jwks("stale")
+        elif self._may_refetch_jwks() or self._jwks_lock.locked():
+            # wait for a fetch in progress, it may bring the key
+            with self._jwks_lock:
+                if jwks.lookup(kid) is None and self._may_refetch_jwks():
+                    self._fetch_jwks("rotation" if jwks.keys else "miss")
+        if (key := jwks.lookup(kid)) is not None:
+            return key
+        raise ValueError(f"Unknown JSON Web Key {kid!r}")
+
+    def _may_refetch_jwks(self) -> bool:
+        # limited by the last attempt, so failing fetches are not retried per request
+        return (
+            time.monotonic() - self._jwks_refetched_at >= self.jwks.min_refetch_interval
+        )
+
+    def _fetch_jwks(self, reason: str) -> None:
+        self._jwks_refetched_at = time.monotonic()
+        with self.instrumentation.measure("jwks", reason):
+            metadata = self.load_server_metadata()
+            # first load may use the key set already included in the server metadata
+            jwk_set = None if self.jwks.keys else metadata.get("jwks")
+            if jwk_set is None:
+                jwk_set = self._get_json(metadata["jwks_uri"])
+            self.jwks.load(jwk_set)
+
+    def _refresh_jwks(self) -> None:
+        if self.jwks.age < self.jwks.refresh_interval or not self._may_refetch_jwks():
+            return
+        try:
+            self._fetch_jwks("refresh")
+        except Exception:
+            log.exception("Failed to refresh JSON Web Key Set")
+
+    def verify_token(self, access_token: str) -> User:
+        """Validate signature, `typ`, `exp`, `nbf`, `iss` and `aud` of an access token
+        locally.
+
+        Verified tokens are cached until they expire, so repeated requests with the
+        same token skip signature verification.
+
+        :raises JoseError: if the token is invalid
+        """
+        with self.instrumentation.measure("verify_token", "miss") as event:
+            digest = hashlib.sha256(access_token.encode()).digest()
+            if (user := self._token_cache.get(digest)) is not None:
+                event.outcome = "hit"
+                return user
+
+            verifier = self.get_verifier()
+            key = self.get_key(unverified_header(access_token).get("kid"))
+            with self.instrumentation.measure("decode"):
+                claims = verifier.decode(
+                    access_token, key, verifier.access_token_options
+                )
+            claims.validate()
+
+            user = User.from_claims(claims, access_token)
+            self._token_cache.set(digest, user, ttl=claims["exp"] - time.time())
+            return user
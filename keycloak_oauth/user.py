@@ -0,0 +1,87 @@
+from typing import Any
+
+import pydantic
+
+
+class User(pydantic.BaseModel):
+    name: str
+    email: pydantic.EmailStr | None
+    roles: frozenset[str]
+    """Complete access token. Required for token propagation."""
+    token: str
+    """Roles of clients (`resource_access`) by client id"""
+    client_roles: dict[str, frozenset[str]] = {}
+    """Scopes of the access token"""
+    scopes: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_claims(cls, claims: dict[str, Any], access_token: str) -> "User":
+        """Build from the validated claims of an access token.
+
+        The name is the `preferred_username`, or the `sub` if the token has none.
+
+        :raises MissingClaimError: if the token has neither
+        :raises InvalidClaimError: if `realm_access` or `resource_access` is no object
+        """
+        name = claims.get("preferred_username") or claims.get("sub")
+        if not name:
+            from authlib.jose.errors import MissingClaimError
+
+            raise MissingClaimError("preferred_username")
+        realm_access = claims.get("realm_access") or {}
+        if not isinstance(realm_access, dict):
+            raise _invalid_claim("realm_access")
+        resource_access = claims.get("resource_access") or {}
+        if not isinstance(resource_access, dict) or not all(
+            isinstance(access, dict) for access in resource_access.values()
+        ):
+            raise _invalid_claim("resource_access")
+        return cls.model_validate(
+            {
+                "name": name,
+                "email": claims.get("email"),
+                "roles": realm_access.get("roles") or [],
+                "token": access_token,
+                "client_roles": {
+                    client: access.get("roles") or []
+                    for client, access in resource_access.items()
+                },
+                "scopes": (claims.get("scope") or "").split(),
+            }
+        )
+
+    @classmethod
+    def from_trusted(cls, data: dict[str, Any]) -> "User":
+        """Build without validation from data that was validated before, e.g. the
+        session written by `KeycloakOAuth2.auth`.
+        """
+        return cls.model_construct(
+            name=data["name"],
+            email=data.get("email"),
+            roles=frozenset(data["roles"]),
+            token=data["token"],
+            client_roles={
+                client: frozenset(roles)
+                for client, roles in data.get("client_roles", {}).items()
+            },
+            scopes=frozenset(data.get("scopes", ())),
+        )
+
+    # interface of `starlette.authentication.BaseUser`, e.g. for `request.user`
+    @property
+    def is_authenticated(self) -> bool:
+        return True
+
+    @property
+    def display_name(self) -> str:
+        return self.name
+
+    @property
+    def identity(self) -> str:
+        return self.name
+
+
+def _invalid_claim(claim: str) -> Exception:
+    from authlib.jose.errors import InvalidClaimError
+
+    return InvalidClaimError(claim)
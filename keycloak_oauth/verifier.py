@@ -0,0 +1,70 @@
+from typing import Any
+
+from authlib.jose import JsonWebToken, JWTClaims
+from authlib.jose.rfc7517 import Key
+
+BACKCHANNEL_LOGOUT_EVENT = "http://schemas.openid.net/event/backchannel-logout"
+
+
+def _is_backchannel_logout(claims: JWTClaims, events: Any) -> bool:
+    return isinstance(events, dict) and BACKCHANNEL_LOGOUT_EVENT in events
+
+
+def _is_session_or_subject(claims: JWTClaims, value: Any) -> bool:
+    return bool(claims.get("sid") or claims.get("sub"))
+
+
+class TokenVerifier:
+    """JWT verifier compiled once for a version of the server metadata.
+
+    Holds the `JsonWebToken` instance for the allowed algorithms and the claims
+    options for access tokens, so neither is rebuilt per token.
+
+    :param metadata: Server metadata of the Keycloak realm
+    :param audience: Required `aud` claim of access tokens, not checked if omitted
+    :param client_id: Required `aud` claim of logout tokens
+    """
+
+    def __init__(
+        self,
+        metadata: dict[str, Any],
+        audience: str | None = None,
+        client_id: str | None = None,
+    ) -> None:
+        self.loaded_at = metadata.get("_loaded_at")
+        self.algorithms: list[str] = metadata.get(
+            "id_token_signing_alg_values_supported"
+        ) or ["RS256"]
+        self.jwt = JsonWebToken(self.algorithms)
+        self.access_token_options: dict[str, Any] = {
+            "exp": {"essential": True},
+            # not an ID or refresh token of the same issuer
+            "typ": {"essential": True, "value": "Bearer"},
+        }
+        if issuer := metadata.get("issuer"):
+            self.access_token_options["iss"] = {"essential": True, "value": issuer}
+        if audience:
+            self.access_token_options["aud"] = {"essential": True, "value": audience}
+        # OpenID Connect Back-Channel Logout 1.0, section 2.6
+        self.logout_token_options: dict[str, Any] = {
+            "iat": {"essential": True},
+            "jti": {"essential": True},
+            "events": {"essential": True, "validate": _is_backchannel_logout},
+            "nonce": {"validate": lambda claims, nonce: nonce is None},
+            "sid": {"validate": _is_session_or_subject},
+        }
+        if issuer:
+            self.logout_token_options["iss"] = {"essential": True, "value": issuer}
+        if client_id:
+            self.logout_token_options["aud"] = {"essential": True, "value": client_id}
+
+    def decode(
+        self,
+        token: str,
+        key: Key,
+        claims_options: dict[str, Any] | None = None,
+    ) -> JWTClaims:
+        """Verify the signature of a token, claims are not validated yet."""
+        return self.jwt.decode(
+            token, key=lambda header, payload: key, claims_options=claims_options
+        )
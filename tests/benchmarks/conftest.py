@@ -0,0 +1,109 @@
+import asyncio
+import os
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+RESULTS: list[tuple[str, dict[str, Any]]] = []
+
+CONCURRENCY = int(os.getenv("BENCHMARK_CONCURRENCY", "8"))
+REQUESTS = int(os.getenv("BENCHMARK_REQUESTS", "200"))
+
+BENCHMARKS_PATH = Path(__file__).parent
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    # wall-clock comparisons depend on the machine, so they only run on request
+    if config.getoption("benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmarks")
+    for item in items:
+        if BENCHMARKS_PATH in item.path.parents:
+            item.add_marker(skip)
+
+
+@pytest.fixture()
+def concurrency() -> int:
+    return CONCURRENCY
+
+
+@pytest.fixture()
+def report(request: pytest.FixtureRequest) -> Callable[..., None]:
+    """Record benchmark metrics, printed in the terminal summary."""
+
+    def report(**metrics: Any) -> None:
+        RESULTS.append((request.node.name, metrics))
+
+    return report
+
+
+@pytest.fixture()
+def throughput() -> Callable[..., Awaitable[float]]:
+    """Measure operations per second of an async callable."""
+
+    async def throughput(
+        fn: Callable[[], Awaitable[Any]], iterations: int = 200
+    ) -> float:
+        await fn()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await fn()
+        return iterations / (time.perf_counter() - start)
+
+    return throughput
+
+
+@pytest.fixture()
+def load() -> Callable[..., Awaitable[dict[str, float]]]:
+    """Run an async operation `requests` times by `concurrency` workers.
+
+    The operation is called with the index of its worker, so workers can keep
+    their own state such as a client with session cookies. Returns throughput
+    and latency percentiles.
+
+    Configure with the `BENCHMARK_REQUESTS` and `BENCHMARK_CONCURRENCY` env vars.
+    """
+
+    async def load(
+        operation: Callable[[int], Awaitable[Any]],
+        requests: int = REQUESTS,
+        concurrency: int = CONCURRENCY,
+    ) -> dict[str, float]:
+        latencies: list[float] = []
+
+        async def worker(index: int) -> None:
+            # equal share of the requests for every worker
+            for _ in range(index, requests, concurrency):
+                start = time.perf_counter()
+                await operation(index)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "ops": len(latencies) / elapsed,
+            "p50_ms": percentiles[49] * 1000,
+            "p99_ms": percentiles[98] * 1000,
+        }
+
+    return load
+
+
+def pytest_terminal_summary(terminalreporter: Any) -> None:
+    if not RESULTS:
+        return
+    terminalreporter.section("benchmarks")
+    for name, metrics in RESULTS:
+        values = ", ".join(
+            f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in metrics.items()
+        )
+        terminalreporter.write_line(f"{name}: {values}")
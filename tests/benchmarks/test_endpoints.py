@@ -0,0 +1,167 @@
+from collections.abc import AsyncIterator, Awaitable, Callable
+from pathlib import Path
+from typing import Annotated, Any
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import Depends, FastAPI
+from mock_keycloak import MockKeycloak
+from starlette.middleware.sessions import SessionMiddleware
+
+from keycloak_oauth import KeycloakOAuth2, User
+
+RESOURCES_PATH = Path(__file__).parent.parent.absolute() / "resources/keycloak"
+
+
+class TestEndpoints:
+    @pytest_asyncio.fixture()
+    async def app(self, mock_keycloak_oauth: KeycloakOAuth2) -> AsyncIterator[FastAPI]:
+        keycloak_oauth = mock_keycloak_oauth
+        await keycloak_oauth.setup_signed_jwt(
+            RESOURCES_PATH / "keypair.pem", RESOURCES_PATH / "publickey.crt"
+        )
+        keycloak_oauth.setup_fastapi_routes()
+        app = FastAPI(lifespan=keycloak_oauth.lifespan)
+        app.include_router(keycloak_oauth.router, prefix="/auth")
+        app.add_middleware(SessionMiddleware, secret_key="!secret")
+
+        @app.get("/")
+        def root(user: Annotated[User, Depends(keycloak_oauth.get_user)]) -> str:
+            return f"Hello {user.name}"
+
+        async with keycloak_oauth.lifespan():
+            yield app
+
+    @pytest_asyncio.fixture()
+    async def clients(
+        self, app: FastAPI, concurrency: int
+    ) -> AsyncIterator[list[httpx.AsyncClient]]:
+        """One client with its own session per worker."""
+        transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        clients = [
+            httpx.AsyncClient(transport=transport, base_url="http://app.test")
+            for _ in range(concurrency)
+        ]
+        yield clients
+        for client in clients:
+            await client.aclose()
+
+    @pytest_asyncio.fixture()
+    async def keycloak_client(
+        self, mock_keycloak: MockKeycloak
+    ) -> AsyncIterator[httpx.AsyncClient]:
+        """Stands in for the browser on the Keycloak login page."""
+        transport = httpx.ASGITransport(app=mock_keycloak)  # type: ignore[arg-type]
+        async with httpx.AsyncClient(transport=transport) as client:
+            yield client
+
+    async def callback_url(
+        self, client: httpx.AsyncClient, keycloak_client: httpx.AsyncClient
+    ) -> str:
+        response = await client.get("/auth/login")
+        assert response.is_redirect
+        response = await keycloak_client.get(response.headers["location"])
+        assert response.is_redirect
+        return response.headers["location"]
+
+    async def login(
+        self, client: httpx.AsyncClient, keycloak_client: httpx.AsyncClient
+    ) -> None:
+        response = await client.get(await self.callback_url(client, keycloak_client))
+        assert response.is_redirect
+
+    @pytest.mark.asyncio
+    async def test_login_page(
+        self,
+        clients: list[httpx.AsyncClient],
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        async def login_page(worker: int) -> None:
+            response = await clients[worker].get("/auth/login")
+            assert response.is_redirect
+            # don't let pending states pile up in the session cookie
+            clients[worker].cookies.clear()
+
+        report(**await load(login_page))
+
+    @pytest.mark.asyncio
+    async def test_auth(
+        self,
+        clients: list[httpx.AsyncClient],
+        keycloak_client: httpx.AsyncClient,
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        async def auth(worker: int) -> None:
+            client = clients[worker]
+            client.cookies.clear()
+            # time the whole login, the callback alone is measured below
+            await self.login(client, keycloak_client)
+
+        report(**await load(auth, requests=5 * len(clients)))
+
+    @pytest.mark.asyncio
+    async def test_auth_callback(
+        self,
+        clients: list[httpx.AsyncClient],
+        keycloak_client: httpx.AsyncClient,
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        callback_urls = [
+            [await self.callback_url(client, keycloak_client) for _ in range(5)]
+            for client in clients
+        ]
+
+        async def callback(worker: int) -> None:
+            response = await clients[worker].get(callback_urls[worker].pop())
+            assert response.is_redirect
+
+        report(**await load(callback, requests=5 * len(clients)))
+
+    @pytest.mark.asyncio
+    async def test_parse_claims(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        token = mock_keycloak.issue_token("test-client", "sid", "openid")
+
+        async def parse_claims(worker: int) -> Any:
+            return await mock_keycloak_oauth.parse_claims(token)
+
+        report(**await load(parse_claims))
+
+    @pytest.mark.asyncio
+    async def test_get_user(
+        self,
+        clients: list[httpx.AsyncClient],
+        keycloak_client: httpx.AsyncClient,
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        for client in clients:
+            await self.login(client, keycloak_client)
+
+        async def get_user(worker: int) -> None:
+            response = await clients[worker].get("/")
+            assert response.is_success
+
+        report(**await load(get_user))
+
+    @pytest.mark.asyncio
+    async def test_public_keys(
+        self,
+        clients: list[httpx.AsyncClient],
+        load: Callable[..., Awaitable[dict[str, float]]],
+        report: Callable[..., None],
+    ):
+        async def public_keys(worker: int) -> None:
+            response = await clients[worker].get("/auth/certs")
+            assert response.is_success
+
+        report(**await load(public_keys))
@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+from authlib.oauth2.rfc7523 import private_key_jwt_sign
+from mock_keycloak import MockKeycloak
+from private_keys import private_pem
+
+from keycloak_oauth import KeycloakOAuth2
+from keycloak_oauth.crypto import CryptoRunner, PresignedPrivateKeyJWT
+from keycloak_oauth.signing import load_signing_key
+
+RESOURCES_PATH = Path(__file__).parent.parent.absolute() / "resources/keycloak"
+
+
+class TestLoginStorm:
+    async def storm(
+        self,
+        mock_keycloak: MockKeycloak,
+        keycloak_oauth: KeycloakOAuth2,
+        logins: int,
+    ) -> dict[str, float]:
+        """Run concurrent token requests with signed JWT and verify the tokens.
+
+        Meanwhile an unrelated request sleeps for 1ms in a loop, its latency beyond
+        that is the time the event loop was blocked.
+        """
+        await keycloak_oauth.setup_signed_jwt(
+            RESOURCES_PATH / "keypair.pem", RESOURCES_PATH / "publickey.crt"
+        )
+        refresh_tokens = [
+            mock_keycloak.issue_token("test-client", "sid", "openid")["refresh_token"]
+            for _ in range(logins + 1)
+        ]
+
+        async def login(refresh_token: str) -> None:
+            token = await keycloak_oauth.refresh_token(refresh_token)
+            await keycloak_oauth.parse_claims(token)
+
+        await login(refresh_tokens.pop())  # warm up, e.g. start worker processes
+
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def unrelated_request() -> None:
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                latencies.append(time.perf_counter() - start - 0.001)
+
+        probe = asyncio.create_task(unrelated_request())
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(login(refresh_token) for refresh_token in refresh_tokens)
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "logins": logins / elapsed,
+            "lag_p50_ms": percentiles[49] * 1000,
+            "lag_p99_ms": percentiles[98] * 1000,
+            "lag_max_ms": max(latencies) * 1000,
+        }
+
+    @pytest.mark.asyncio
+    async def test_tail_latency(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        concurrency: int,
+        report: Callable[..., None],
+    ):
+        results: dict[str, dict[str, Any]] = {}
+        with ProcessPoolExecutor(max_workers=2) as processes:
+            for mode, executor in [
+                ("inline", None),
+                ("thread", "thread"),
+                ("process", processes),
+            ]:
+                keycloak_oauth = make_mock_keycloak_oauth(crypto_executor=executor)
+                results[mode] = await self.storm(
+                    mock_keycloak, keycloak_oauth, logins=4 * concurrency
+                )
+                await keycloak_oauth.aclose()
+                report(mode=mode, **results[mode])
+        assert results["process"]["lag_p50_ms"] < results["inline"]["lag_p50_ms"]
+
+
+class TestClientAssertion:
+    @pytest.mark.asyncio
+    async def test_signing_throughput(
+        self,
+        throughput: Callable[..., Awaitable[float]],
+        report: Callable[..., None],
+    ):
+        pem = (RESOURCES_PATH / "keypair.pem").read_bytes()
+        auth_method = PresignedPrivateKeyJWT("http://keycloak.test/token")
+
+        async def sign_pem() -> bytes:
+            """Previous implementation, the PEM is parsed for every assertion."""
+            return private_key_jwt_sign(pem, "test-client", auth_method.token_endpoint)
+
+        results = {"pem_ops": await throughput(sign_pem)}
+        runner = CryptoRunner()
+        for alg in ("RS256", "ES256", "EdDSA"):
+            signing_key = load_signing_key(private_pem(alg))
+            auth_method.alg = signing_key.alg
+            sign = functools.partial(
+                runner.sign_client_assertion,
+                auth_method,
+                "test-client",
+                signing_key.key,
+            )
+            results[f"{alg}_ops"] = await throughput(sign)
+        report(**results)
+        assert results["ES256_ops"] > results["pem_ops"]
+        assert results["EdDSA_ops"] > results["pem_ops"]
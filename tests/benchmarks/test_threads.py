@@ -0,0 +1,122 @@
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import httpx
+import pytest
+
+from keycloak_oauth import KeycloakOAuth2, SyncTokenVerifier
+from keycloak_oauth.cache import TTLCache
+
+THREADS = 32
+
+
+class LockedTTLCache(TTLCache[Any, Any]):
+    """Previous approach, a single lock around the whole cache."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            return super().get(key)
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        with self._lock:
+            super().set(key, value, ttl)
+
+
+def threaded_throughput(
+    fn: Callable[[str], Any], tokens: list[str], threads: int, rounds: int = 1
+) -> float:
+    """Calls per second of `threads` threads, each with an equal share of the tokens
+    in every round.
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int) -> None:
+        share = tokens[index::threads]
+        barrier.wait()
+        for _ in range(rounds):
+            for token in share:
+                fn(token)
+
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(worker, index) for index in range(threads)]
+        barrier.wait()
+        start = time.perf_counter()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    return rounds * len(tokens) / elapsed
+
+
+class TestSyncTokenVerifier:
+    @pytest.fixture()
+    def verifier(self, keycloak_oauth: KeycloakOAuth2) -> SyncTokenVerifier:
+        def unexpected(request: httpx.Request) -> httpx.Response:
+            raise AssertionError(f"Unexpected request to {request.url}")
+
+        return keycloak_oauth.sync_verifier(transport=httpx.MockTransport(unexpected))
+
+    @pytest.fixture()
+    def tokens(self, issue_token: Callable[..., str]) -> list[str]:
+        return [issue_token(sub=str(i)) for i in range(256)]
+
+    def test_cached_throughput(
+        self,
+        verifier: SyncTokenVerifier,
+        tokens: list[str],
+        report: Callable[..., None],
+    ):
+        for token in tokens:
+            verifier.verify_token(token)
+        single = threaded_throughput(verifier.verify_token, tokens, 1, rounds=200)
+        striped = threaded_throughput(
+            verifier.verify_token, tokens, THREADS, rounds=200
+        )
+
+        verifier._token_cache = LockedTTLCache(4096, 300)  # type: ignore[assignment]
+        for token in tokens:
+            verifier.verify_token(token)
+        locked = threaded_throughput(verifier.verify_token, tokens, THREADS, rounds=200)
+        report(
+            threads=THREADS,
+            single_thread_ops=single,
+            striped_ops=striped,
+            single_lock_ops=locked,
+        )
+        # cache hits hold the GIL, so neither variant scales with threads and
+        # striping can't add throughput; it must not cost any compared to a single
+        # lock either (with some tolerance for noise)
+        assert striped > locked * 0.75
+
+    def test_verify_throughput(
+        self,
+        verifier: SyncTokenVerifier,
+        issue_token: Callable[..., str],
+        report: Callable[..., None],
+    ):
+        """Cache misses, every token is verified once by one of the threads.
+
+        Only reported: verification mostly holds the GIL, so threads don't scale it.
+        """
+        single = threaded_throughput(
+            verifier.verify_token,
+            [issue_token(sub=f"single-{i}") for i in range(200)],
+            1,
+        )
+        parallel = threaded_throughput(
+            verifier.verify_token,
+            [issue_token(sub=f"parallel-{i}") for i in range(THREADS * 20)],
+            THREADS,
+        )
+        report(
+            threads=THREADS,
+            single_thread_ops=single,
+            parallel_ops=parallel,
+            scaling=parallel / single,
+        )
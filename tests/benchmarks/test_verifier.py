@@ -0,0 +1,37 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+
+from keycloak_oauth import KeycloakOAuth2
+
+
+class TestTokenVerifier:
+    @pytest.mark.asyncio
+    async def test_decode_throughput(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        throughput: Callable[..., Awaitable[float]],
+        report: Callable[..., None],
+    ):
+        token = {"access_token": issue_token()}
+
+        async def parse_claims_per_call() -> Any:
+            """Previous implementation, verifier and keys are rebuilt per call."""
+            metadata = await keycloak_oauth.keycloak.load_server_metadata()
+            jwt = JsonWebToken(metadata["id_token_signing_alg_values_supported"])
+            jwk_set = await keycloak_oauth.keycloak.fetch_jwk_set()
+            return jwt.decode(
+                token["access_token"], key=JsonWebKey.import_key_set(jwk_set)
+            )
+
+        async def parse_claims() -> Any:
+            return await keycloak_oauth.parse_claims(token)
+
+        assert await parse_claims() == await parse_claims_per_call()
+        before = await throughput(parse_claims_per_call)
+        after = await throughput(parse_claims)
+        report(before_ops=before, after_ops=after, speedup=after / before)
+        assert after > before
@@ -0,0 +1,188 @@
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Annotated, Any
+
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.rfc7517 import Key
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from mock_keycloak import MockKeycloak
+from starlette.middleware.sessions import SessionMiddleware
+
+from keycloak_oauth import KeycloakOAuth2, User
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+ISSUER = "http://keycloak.test/realms/bakdata"
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--benchmarks",
+        action="store_true",
+        help="run the benchmarks in tests/benchmarks, skipped by default",
+    )
+
+
+@pytest.fixture(scope="session")
+def signing_key() -> Key:
+    return JsonWebKey.import_key(
+        (RESOURCES_PATH / "keypair.pem").read_bytes(),
+        {"kty": "RSA", "use": "sig", "kid": "test-key"},
+    )
+
+
+@pytest.fixture(scope="session")
+def jwk_set(signing_key: Key) -> dict[str, Any]:
+    return {"keys": [signing_key.as_dict(is_private=False, alg="RS256")]}
+
+
+@pytest.fixture(scope="session")
+def issue_token(signing_key: Key) -> Callable[..., str]:
+    """Sign an access token like Keycloak would, claims can be overridden."""
+    jwt = JsonWebToken(["RS256"])
+
+    def issue(header: dict[str, Any] | None = None, **claims: Any) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": ISSUER,
+            "aud": "account",
+            "sub": "f1b5b2d8-0d1c-4f5a-9d3e-0d9b4e8b2a61",
+            "typ": "Bearer",
+            "iat": now,
+            "exp": now + 300,
+            "preferred_username": "test",
+            "email": "test@bakdata.com",
+            "realm_access": {"roles": ["offline_access", "uma_authorization"]},
+        }
+        payload.update(claims)
+        return jwt.encode(
+            {"alg": "RS256", "kid": signing_key.kid, **(header or {})},
+            payload,
+            signing_key,
+        ).decode()
+
+    return issue
+
+
+@pytest.fixture()
+def make_keycloak_oauth(jwk_set: dict[str, Any]) -> Callable[..., KeycloakOAuth2]:
+    """Create clients with preloaded server metadata, so no Keycloak is required."""
+
+    def make(**kwargs: Any) -> KeycloakOAuth2:
+        keycloak_oauth = KeycloakOAuth2(
+            client_id="test-client",
+            client_secret="secret",
+            server_metadata_url=f"{ISSUER}/.well-known/openid-configuration",
+            client_kwargs={"scope": "openid profile email"},
+            **kwargs,
+        )
+        keycloak_oauth.keycloak.server_metadata.update(
+            {
+                "issuer": ISSUER,
+                "jwks_uri": f"{ISSUER}/protocol/openid-connect/certs",
+                "id_token_signing_alg_values_supported": ["RS256"],
+                "jwks": jwk_set,
+                "_loaded_at": time.time(),
+            }
+        )
+        return keycloak_oauth
+
+    return make
+
+
+@pytest.fixture()
+def keycloak_oauth(
+    make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+) -> KeycloakOAuth2:
+    return make_keycloak_oauth()
+
+
+@pytest.fixture()
+def make_app() -> Callable[[KeycloakOAuth2], FastAPI]:
+    """Create apps with sessions and the routes of a client.
+
+    `/` responds with the name of the user of `keycloak.get_user`, `/cookie` of the
+    class-level `KeycloakOAuth2.get_user`.
+    """
+
+    def make(keycloak_oauth: KeycloakOAuth2) -> FastAPI:
+        app = FastAPI()
+        keycloak_oauth.setup_fastapi_routes()
+        app.include_router(keycloak_oauth.router, prefix="/auth")
+        app.add_middleware(SessionMiddleware, secret_key="!secret")
+
+        @app.get("/")
+        def root(user: Annotated[User, Depends(keycloak_oauth.get_user)]) -> str:
+            return user.name
+
+        @app.get("/cookie")
+        def cookie(user: Annotated[User, Depends(KeycloakOAuth2.get_user)]) -> str:
+            return user.name
+
+        return app
+
+    return make
+
+
+@pytest.fixture()
+def login(
+    make_app: Callable[[KeycloakOAuth2], FastAPI], mocker
+) -> Callable[..., TestClient]:
+    """Log in through `/auth/callback` as if Keycloak returned `token`.
+
+    A string is taken as the access token. Logs in `client`, by default a client of
+    a new app from `make_app`.
+    """
+
+    def login(
+        keycloak_oauth: KeycloakOAuth2,
+        token: str | dict[str, Any],
+        client: TestClient | None = None,
+    ) -> TestClient:
+        if isinstance(token, str):
+            token = {"access_token": token}
+        mocker.patch.object(
+            keycloak_oauth.keycloak, "authorize_access_token", return_value=token
+        )
+        if client is None:
+            client = TestClient(make_app(keycloak_oauth))
+        assert client.get("/auth/callback", follow_redirects=False).is_redirect
+        return client
+
+    return login
+
+
+@pytest.fixture()
+def mock_keycloak() -> MockKeycloak:
+    return MockKeycloak()
+
+
+@pytest.fixture()
+def make_mock_keycloak_oauth(
+    mock_keycloak: MockKeycloak,
+) -> Callable[..., KeycloakOAuth2]:
+    """Create clients talking to the in-process mock Keycloak."""
+
+    def make(**kwargs: Any) -> KeycloakOAuth2:
+        # Starlette's ASGI types are stricter than httpx's
+        transport = httpx.ASGITransport(app=mock_keycloak)  # type: ignore[arg-type]
+        kwargs.setdefault("transport", transport)
+        return KeycloakOAuth2(
+            client_id="test-client",
+            client_secret="secret",
+            server_metadata_url=mock_keycloak.server_metadata_url,
+            client_kwargs={"scope": "openid profile email"},
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture()
+def mock_keycloak_oauth(
+    make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+) -> KeycloakOAuth2:
+    return make_mock_keycloak_oauth()
@@ -0,0 +1,292 @@
+import base64
+import hashlib
+import json
+import secrets
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+import httpx
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.errors import JoseError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.routing import Route
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+
+
+class MockKeycloak(Starlette):
+    """In-process ASGI stand-in for a Keycloak realm.
+
+    Serves discovery metadata, JWKS, authorization and token endpoints and signs
+    real RS256 tokens. Users are logged in without a login form, so the
+    authorization endpoint directly redirects back with a code. Use it with
+    `httpx.ASGITransport` as the transport of `KeycloakOAuth2`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://keycloak.test",
+        realm: str = "bakdata",
+        username: str = "test",
+        roles: tuple[str, ...] = ("offline_access", "uma_authorization"),
+        token_lifetime: int = 300,
+    ) -> None:
+        self.issuer = f"{base_url}/realms/{realm}"
+        self.username = username
+        self.roles = list(roles)
+        self.token_lifetime = token_lifetime
+        self.key = JsonWebKey.import_key(
+            (RESOURCES_PATH / "keypair.pem").read_bytes(),
+            {"kty": "RSA", "use": "sig", "kid": "mock-keycloak"},
+        )
+        self.jwt = JsonWebToken(["RS256"])
+        self.codes: dict[str, dict[str, Any]] = {}
+        self.refresh_tokens: dict[str, dict[str, Any]] = {}
+        self.requests: dict[str, int] = {}
+        # `jti`s of tokens revoked in Keycloak, e.g. by logout
+        self.revoked: set[str] = set()
+
+        prefix = f"/realms/{realm}"
+        oidc = f"{prefix}/protocol/openid-connect"
+        super().__init__(
+            routes=[
+                Route(f"{prefix}/.well-known/openid-configuration", self.metadata),
+                Route(f"{oidc}/certs", self.certs),
+                Route(f"{oidc}/auth", self.authorize),
+                Route(f"{oidc}/token", self.token, methods=["POST"]),
+                Route(f"{oidc}/token/introspect", self.introspect, methods=["POST"]),
+            ]
+        )
+
+    @property
+    def server_metadata_url(self) -> str:
+        return f"{self.issuer}/.well-known/openid-configuration"
+
+    def _count(self, endpoint: str) -> None:
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def sign(self, **claims: Any) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": self.issuer,
+            "iat": now,
+            "exp": now + self.token_lifetime,
+            "jti": str(uuid.uuid4()),
+            **claims,
+        }
+        header = {"alg": "RS256", "kid": self.key.kid, "typ": "JWT"}
+        return self.jwt.encode(header, payload, self.key).decode()
+
+    def issue_token(
+        self, client_id: str, sid: str, scope: str, nonce: str | None = None
+    ) -> dict[str, Any]:
+        user = {
+            "sub": str(uuid.uuid5(uuid.NAMESPACE_DNS, self.username)),
+            "sid": sid,
+            "preferred_username": self.username,
+            "email": f"{self.username}@bakdata.com",
+        }
+        access_token = self.sign(
+            **user,
+            typ="Bearer",
+            aud="account",
+            azp=client_id,
+            scope=scope,
+            realm_access={"roles": self.roles},
+        )
+        refresh_token = secrets.token_urlsafe(32)
+        self.refresh_tokens[refresh_token] = {
+            "client_id": client_id,
+            "sid": sid,
+            "scope": scope,
+        }
+        token = {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": self.token_lifetime,
+            "refresh_token": refresh_token,
+            "refresh_expires_in": 1800,
+            "scope": scope,
+            "session_state": sid,
+        }
+        if "openid" in scope.split():
+            id_claims = {"nonce": nonce} if nonce else {}
+            token["id_token"] = self.sign(
+                **user, **id_claims, typ="ID", aud=client_id, azp=client_id
+            )
+        return token
+
+    def issue_service_token(self, client_id: str, scope: str) -> dict[str, Any]:
+        """Token of the service account of a client, without refresh token."""
+        access_token = self.sign(
+            sub=str(uuid.uuid5(uuid.NAMESPACE_DNS, client_id)),
+            preferred_username=f"service-account-{client_id}",
+            typ="Bearer",
+            aud="account",
+            azp=client_id,
+            scope=scope,
+        )
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": self.token_lifetime,
+            "scope": scope,
+        }
+
+    def exchange_token(
+        self, subject: dict[str, Any], client_id: str, audience: str, scope: str
+    ) -> dict[str, Any]:
+        """Token of the same user for another audience."""
+        claims = ("sub", "sid", "preferred_username", "email", "realm_access")
+        access_token = self.sign(
+            **{claim: subject[claim] for claim in claims if claim in subject},
+            typ="Bearer",
+            aud=audience,
+            azp=client_id,
+            scope=scope,
+        )
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": self.token_lifetime,
+            "scope": scope,
+            "issued_token_type": "urn:ietf:params:oauth:token-type:access_token",
+        }
+
+    async def metadata(self, request: Request) -> JSONResponse:
+        self._count("metadata")
+        oidc = f"{self.issuer}/protocol/openid-connect"
+        return JSONResponse(
+            {
+                "issuer": self.issuer,
+                "authorization_endpoint": f"{oidc}/auth",
+                "token_endpoint": f"{oidc}/token",
+                "introspection_endpoint": f"{oidc}/token/introspect",
+                "end_session_endpoint": f"{oidc}/logout",
+                "jwks_uri": f"{oidc}/certs",
+                "grant_types_supported": [
+                    "authorization_code",
+                    "refresh_token",
+                    "client_credentials",
+                    "urn:ietf:params:oauth:grant-type:token-exchange",
+                ],
+                "id_token_signing_alg_values_supported": ["RS256"],
+                "code_challenge_methods_supported": ["S256"],
+                "token_endpoint_auth_methods_supported": [
+                    "client_secret_basic",
+                    "client_secret_post",
+                    "private_key_jwt",
+                ],
+            }
+        )
+
+    async def certs(self, request: Request) -> JSONResponse:
+        self._count("certs")
+        return JSONResponse({"keys": [self.key.as_dict(is_private=False, alg="RS256")]})
+
+    async def authorize(self, request: Request) -> Response:
+        """Log in the user right away and redirect back with a code."""
+        self._count("authorize")
+        params = request.query_params
+        code = secrets.token_urlsafe(32)
+        self.codes[code] = {
+            "client_id": params["client_id"],
+            "redirect_uri": params["redirect_uri"],
+            "scope": params.get("scope", ""),
+            "nonce": params.get("nonce"),
+            "code_challenge": params.get("code_challenge"),
+        }
+        location = httpx.URL(params["redirect_uri"]).copy_merge_params(
+            {"code": code, "state": params.get("state", "")}
+        )
+        return RedirectResponse(str(location), status_code=302)
+
+    async def token(self, request: Request) -> JSONResponse:
+        self._count("token")
+        form = await request.form()
+        grant_type = form.get("grant_type")
+        if grant_type == "authorization_code":
+            data = self.codes.pop(str(form.get("code")), None)
+            if data is None or data["redirect_uri"] != form.get("redirect_uri"):
+                return _error("invalid_grant", "Code not valid")
+            if data["code_challenge"] and data["code_challenge"] != _s256(
+                str(form.get("code_verifier", ""))
+            ):
+                return _error("invalid_grant", "PKCE verification failed")
+            token = self.issue_token(
+                data["client_id"], str(uuid.uuid4()), data["scope"], data["nonce"]
+            )
+        elif grant_type == "refresh_token":
+            data = self.refresh_tokens.pop(str(form.get("refresh_token")), None)
+            if data is None:
+                return _error("invalid_grant", "Invalid refresh token")
+            token = self.issue_token(data["client_id"], data["sid"], data["scope"])
+        elif grant_type == "urn:ietf:params:oauth:grant-type:token-exchange":
+            client_id = _client_id(request, form)
+            try:
+                subject = self.jwt.decode(
+                    str(form.get("subject_token")), lambda header, payload: self.key
+                )
+                subject.validate()
+            except JoseError:
+                return _error("invalid_token", "Invalid subject token")
+            if client_id is None or subject.get("typ") != "Bearer":
+                return _error("access_denied", "Token exchange not permitted")
+            token = self.exchange_token(
+                subject,
+                client_id,
+                str(form.get("audience")),
+                str(form.get("scope") or subject.get("scope", "")),
+            )
+        elif grant_type == "client_credentials":
+            client_id = _client_id(request, form)
+            if client_id is None:
+                return _error("unauthorized_client", "Client authentication required")
+            token = self.issue_service_token(client_id, str(form.get("scope", "")))
+        else:
+            return _error("unsupported_grant_type", f"Unsupported {grant_type}")
+        return JSONResponse(token)
+
+    async def introspect(self, request: Request) -> JSONResponse:
+        self._count("introspect")
+        form = await request.form()
+        client_id = _client_id(request, form)
+        if client_id is None:
+            return JSONResponse({"error": "invalid_client"}, status_code=401)
+        try:
+            claims = self.jwt.decode(
+                str(form.get("token")), lambda header, payload: self.key
+            )
+            claims.validate()
+        except JoseError:
+            return JSONResponse({"active": False})
+        if claims.get("jti") in self.revoked:
+            return JSONResponse({"active": False})
+        return JSONResponse({**claims, "active": True, "client_id": claims.get("azp")})
+
+
+def _client_id(request: Request, form: Any) -> str | None:
+    """Client of a token request, credentials are not checked."""
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "basic":
+        return base64.b64decode(credentials).decode().partition(":")[0]
+    if assertion := form.get("client_assertion"):
+        payload = str(assertion).split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))["sub"]
+    return form.get("client_id")
+
+
+def _s256(code_verifier: str) -> str:
+    digest = hashlib.sha256(code_verifier.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _error(error: str, description: str) -> JSONResponse:
+    return JSONResponse(
+        {"error": error, "error_description": description}, status_code=400
+    )
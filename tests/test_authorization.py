@@ -0,0 +1,165 @@
+from collections.abc import Callable
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from keycloak_oauth import KeycloakOAuth2, User
+from keycloak_oauth.authorization import (
+    GetUser,
+    require_any,
+    require_roles,
+    require_scope,
+)
+from keycloak_oauth.middleware import KeycloakAuthMiddleware
+from keycloak_oauth.starlette_admin import KeycloakAuthProvider
+
+
+@pytest.fixture()
+def user() -> User:
+    return User(
+        name="test",
+        email=None,
+        roles=frozenset({"offline_access", "uma_authorization"}),
+        token="token",
+        client_roles={"app": frozenset({"editor", "viewer"})},
+        scopes=frozenset({"openid", "profile"}),
+    )
+
+
+@pytest.fixture()
+def get_user(keycloak_oauth: KeycloakOAuth2) -> GetUser:
+    return keycloak_oauth.get_user
+
+
+class TestUser:
+    @pytest.mark.asyncio
+    async def test_from_claims(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        user = await keycloak_oauth.verify_token(
+            issue_token(
+                resource_access={"app": {"roles": ["editor"]}, "other": {}},
+                scope="openid email",
+            )
+        )
+        assert user.client_roles == {"app": {"editor"}, "other": frozenset()}
+        assert isinstance(user.client_roles["app"], frozenset)
+        assert user.scopes == {"openid", "email"}
+        assert User.from_trusted(user.model_dump(mode="json")) == user
+
+    def test_from_trusted_without_client_roles(self):
+        user = User.from_trusted(
+            {"name": "test", "roles": ["offline_access"], "token": "token"}
+        )
+        assert user.client_roles == {}
+        assert user.scopes == frozenset()
+
+
+class TestRequirement:
+    def test_roles(self, user: User, get_user: GetUser):
+        assert require_roles(
+            "offline_access", "uma_authorization", get_user=get_user
+        ).allows(user)
+        assert not require_roles("offline_access", "admin", get_user=get_user).allows(
+            user
+        )
+        assert require_roles("editor", client="app", get_user=get_user).allows(user)
+        assert not require_roles("editor", client="other", get_user=get_user).allows(
+            user
+        )
+        assert not require_roles("editor", get_user=get_user).allows(user)
+
+    def test_any(self, user: User, get_user: GetUser):
+        assert require_any("admin", "offline_access", get_user=get_user).allows(user)
+        assert not require_any("admin", get_user=get_user).allows(user)
+        assert require_any("admin", "viewer", client="app", get_user=get_user).allows(
+            user
+        )
+        assert not require_any("admin", client="app", get_user=get_user).allows(user)
+
+    def test_scope(self, user: User, get_user: GetUser):
+        assert require_scope("openid", get_user=get_user).allows(user)
+        assert not require_scope("openid", "email", get_user=get_user).allows(user)
+
+    def test_combined(self, user: User, get_user: GetUser):
+        assert (
+            require_roles("admin", get_user=get_user)
+            | require_scope("openid", get_user=get_user)
+        ).allows(user)
+        assert not (
+            require_roles("admin", get_user=get_user)
+            & require_scope("openid", get_user=get_user)
+        ).allows(user)
+        assert (
+            require_any("viewer", client="app", get_user=get_user)
+            & require_scope("profile", get_user=get_user)
+        ).allows(user)
+
+    def test_no_user(self, get_user: GetUser):
+        assert not require_roles(get_user=get_user).allows(None)
+
+
+class TestRequirementDependency:
+    @pytest.fixture()
+    def app(self, keycloak_oauth: KeycloakOAuth2) -> FastAPI:
+        app = FastAPI()
+        admin = require_roles("admin", get_user=keycloak_oauth.get_bearer_user)
+        reader = require_scope("profile", get_user=keycloak_oauth.get_bearer_user)
+
+        @app.get("/admin")
+        def admin_only(user: Annotated[User, Depends(admin)]) -> str:
+            return user.name
+
+        @app.get("/read")
+        def read(user: Annotated[User, Depends(reader)]) -> str:
+            return user.name
+
+        return app
+
+    def test_bearer(self, app: FastAPI, issue_token: Callable[..., str]):
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {issue_token(scope='openid profile')}"}
+        assert client.get("/read", headers=headers).json() == "test"
+        assert client.get("/admin", headers=headers).status_code == 403
+        assert client.get("/read").status_code == 401
+
+    def test_middleware(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        mocker,
+    ):
+        app.add_middleware(KeycloakAuthMiddleware, keycloak=keycloak_oauth)
+        get_bearer_user = mocker.spy(keycloak_oauth, "get_bearer_user")
+        headers = {"Authorization": f"Bearer {issue_token(scope='profile')}"}
+        assert TestClient(app).get("/read", headers=headers).json() == "test"
+        get_bearer_user.assert_not_called()
+
+
+class TestKeycloakAuthProvider:
+    def request(self, user: User | None) -> Request:
+        scope = {"type": "http", "headers": [], "state": {}, "session": {}}
+        if user is not None:
+            scope["user"] = user
+        return Request(scope)
+
+    @pytest.mark.asyncio
+    async def test_requirement(
+        self, keycloak_oauth: KeycloakOAuth2, user: User, get_user: GetUser
+    ):
+        provider = KeycloakAuthProvider(
+            keycloak_oauth,
+            requirement=require_roles("editor", client="app", get_user=get_user),
+        )
+        request = self.request(user)
+        assert await provider.is_authenticated(request)
+        assert provider.allows(request, require_scope("openid", get_user=get_user))
+        assert not provider.allows(request, require_roles("admin", get_user=get_user))
+
+        provider.requirement = require_roles("admin", get_user=get_user)
+        assert not await provider.is_authenticated(self.request(user))
+        assert not await provider.is_authenticated(self.request(None))
@@ -0,0 +1,188 @@
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from keycloak_oauth import KeycloakOAuth2, MemorySessionStore, RevocationList
+
+EVENTS = {"http://schemas.openid.net/event/backchannel-logout": {}}
+
+
+class TestRevocationList:
+    def test_session(self):
+        revocations = RevocationList()
+        assert not revocations.is_revoked("sid", "sub", 100)
+        revocations.revoke(sid="sid", sub="sub", revoked_at=200)
+        assert revocations.is_revoked("sid", "sub", 100)
+        assert not revocations.is_revoked("other", "sub", 100)
+
+    def test_subject(self):
+        revocations = RevocationList()
+        revocations.revoke(sub="sub", revoked_at=200)
+        assert revocations.is_revoked("sid", "sub", 100)
+        assert revocations.is_revoked(None, "sub", None)
+        # logged in again after the logout
+        assert not revocations.is_revoked("sid", "sub", 300)
+        assert not revocations.is_revoked("sid", "other", 100)
+
+    def test_bounded(self):
+        revocations = RevocationList(maxsize=2)
+        for sid in ("a", "b", "c"):
+            revocations.revoke(sid=sid)
+        assert len(revocations) == 2
+        assert not revocations.is_revoked("a", None, None)
+        assert revocations.is_revoked("c", None, None)
+
+    def test_logout_token(self):
+        revocations = RevocationList()
+        assert revocations.record_logout_token("jti")
+        assert not revocations.record_logout_token("jti")
+        assert not revocations
+
+
+class TestBackchannelLogout:
+    @pytest.fixture(params=["cookie", "store"])
+    def keycloak_oauth(
+        self,
+        request: pytest.FixtureRequest,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+    ) -> KeycloakOAuth2:
+        store = MemorySessionStore() if request.param == "store" else None
+        return make_keycloak_oauth(session_store=store)
+
+    @pytest.fixture()
+    def logout_token(self, issue_token: Callable[..., str]) -> Callable[..., str]:
+        def logout_token(**claims: Any) -> str:
+            claims = {
+                "aud": "test-client",
+                "events": EVENTS,
+                "sid": "sid-1",
+                "jti": str(uuid.uuid4()),
+                **claims,
+            }
+            return issue_token(**claims)
+
+        return logout_token
+
+    @pytest.fixture()
+    def app(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        make_app: Callable[[KeycloakOAuth2], FastAPI],
+    ) -> FastAPI:
+        return make_app(keycloak_oauth)
+
+    def backchannel_logout(self, app: FastAPI, logout_token: str) -> int:
+        response = TestClient(app).post(
+            "/auth/backchannel-logout", data={"logout_token": logout_token}
+        )
+        assert response.headers["Cache-Control"] == "no-store"
+        return response.status_code
+
+    def test_session_revoked(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        logout_token: Callable[..., str],
+        login: Callable[..., TestClient],
+    ):
+        client = login(keycloak_oauth, issue_token(sid="sid-1"), TestClient(app))
+        other = login(keycloak_oauth, issue_token(sid="sid-2"), TestClient(app))
+        assert client.get("/").status_code == 200
+
+        assert self.backchannel_logout(app, logout_token(sid="sid-1")) == 200
+        assert client.get("/").status_code == 401
+        assert other.get("/").status_code == 200
+
+    def test_class_dependency(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        logout_token: Callable[..., str],
+        login: Callable[..., TestClient],
+    ):
+        if keycloak_oauth.session_store is not None:
+            pytest.skip("the class dependency only reads session cookies")
+        sid = str(uuid.uuid4())
+        client = login(keycloak_oauth, issue_token(sid=sid), TestClient(app))
+        assert client.get("/cookie").status_code == 200
+
+        assert self.backchannel_logout(app, logout_token(sid=sid)) == 200
+        assert client.get("/cookie").status_code == 401
+        assert client.get("/").status_code == 401
+
+    def test_replayed_logout_token(
+        self, app: FastAPI, logout_token: Callable[..., str]
+    ):
+        token = logout_token()
+        assert self.backchannel_logout(app, token) == 200
+        assert self.backchannel_logout(app, token) == 400
+
+    def test_subject_revoked(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        logout_token: Callable[..., str],
+        login: Callable[..., TestClient],
+    ):
+        now = int(time.time())
+        # other tests' sessions share the default subject
+        sub = str(uuid.uuid4())
+        client = login(
+            keycloak_oauth,
+            issue_token(sid="sid-1", sub=sub, iat=now - 10),
+            TestClient(app),
+        )
+        later = login(
+            keycloak_oauth,
+            issue_token(sid="sid-2", sub=sub, iat=now + 10),
+            TestClient(app),
+        )
+        assert client.get("/").status_code == 200
+
+        logout = logout_token(sid=None, sub=sub, iat=now)
+        assert self.backchannel_logout(app, logout) == 200
+        assert client.get("/").status_code == 401
+        assert later.get("/").status_code == 200
+
+    @pytest.mark.parametrize(
+        "claims",
+        [
+            {"aud": "other-client"},
+            {"iss": "http://other.test/realms/bakdata"},
+            {"events": None},
+            {"events": {"other": {}}},
+            {"nonce": "nonce"},
+            {"sid": None, "sub": None},
+            {"jti": None},
+            {"exp": 1},
+        ],
+    )
+    def test_invalid_logout_token(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        logout_token: Callable[..., str],
+        claims: dict[str, Any],
+    ):
+        assert self.backchannel_logout(app, logout_token(**claims)) == 400
+        assert not keycloak_oauth.revocations
+
+    def test_bad_signature(
+        self,
+        app: FastAPI,
+        keycloak_oauth: KeycloakOAuth2,
+        logout_token: Callable[..., str],
+    ):
+        header, payload, signature = logout_token().split(".")
+        tampered = f"{header}.{payload}.{signature[::-1]}"
+        assert self.backchannel_logout(app, tampered) == 400
+        assert self.backchannel_logout(app, "") == 400
+        assert not keycloak_oauth.revocations
@@ -0,0 +1,153 @@
+import time
+from collections.abc import Callable
+from typing import Annotated
+
+import pytest
+from authlib.jose.errors import (
+    BadSignatureError,
+    ExpiredTokenError,
+    InvalidClaimError,
+    InvalidTokenError,
+    JoseError,
+    MissingClaimError,
+)
+from fastapi import Depends, FastAPI, status
+from fastapi.testclient import TestClient
+
+from keycloak_oauth import KeycloakOAuth2, User
+
+
+class TestBearerAuthentication:
+    @pytest.fixture()
+    def client(self, keycloak_oauth: KeycloakOAuth2) -> TestClient:
+        app = FastAPI()
+
+        @app.get("/")
+        def root(user: Annotated[User, Depends(keycloak_oauth.get_bearer_user)]) -> str:
+            return f"Hello {user.name}"
+
+        return TestClient(app)
+
+    def test_valid_token(self, client: TestClient, issue_token: Callable[..., str]):
+        response = client.get("/", headers={"Authorization": f"Bearer {issue_token()}"})
+        assert response.is_success
+        assert response.json() == "Hello test"
+
+    @pytest.mark.parametrize(
+        "headers",
+        [
+            {},
+            {"Authorization": "Bearer"},
+            {"Authorization": "Basic dGVzdDp0ZXN0"},
+            {"Authorization": "Bearer not.a.token"},
+        ],
+    )
+    def test_missing_or_malformed(self, client: TestClient, headers: dict[str, str]):
+        response = client.get("/", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    def test_expired_token(self, client: TestClient, issue_token: Callable[..., str]):
+        token = issue_token(exp=int(time.time()) - 10)
+        response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.asyncio
+    async def test_claims_validation(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        user = await keycloak_oauth.verify_token(issue_token())
+        assert user.name == "test"
+        assert user.roles == {"offline_access", "uma_authorization"}
+
+        with pytest.raises(ExpiredTokenError):
+            await keycloak_oauth.verify_token(issue_token(exp=int(time.time()) - 10))
+        with pytest.raises(InvalidTokenError):
+            await keycloak_oauth.verify_token(issue_token(nbf=int(time.time()) + 60))
+        with pytest.raises(InvalidClaimError):
+            await keycloak_oauth.verify_token(issue_token(iss="http://evil.test"))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("typ", ["ID", "Refresh", None])
+    async def test_token_type(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        typ: str | None,
+    ):
+        with pytest.raises(JoseError):
+            await keycloak_oauth.verify_token(issue_token(typ=typ, aud="test-client"))
+
+    @pytest.mark.asyncio
+    async def test_without_username(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        user = await keycloak_oauth.verify_token(issue_token(preferred_username=None))
+        assert user.name == "f1b5b2d8-0d1c-4f5a-9d3e-0d9b4e8b2a61"
+        with pytest.raises(MissingClaimError):
+            await keycloak_oauth.verify_token(
+                issue_token(preferred_username=None, sub=None)
+            )
+
+    def test_invalid_claims_unauthorized(
+        self, client: TestClient, issue_token: Callable[..., str]
+    ):
+        for token in (
+            issue_token(typ="ID"),
+            issue_token(preferred_username=None, sub=None),
+            issue_token(realm_access=["admin"]),
+        ):
+            response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.asyncio
+    async def test_audience(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        issue_token: Callable[..., str],
+    ):
+        keycloak_oauth = make_keycloak_oauth(audience="test-client")
+        with pytest.raises(InvalidClaimError):
+            await keycloak_oauth.verify_token(issue_token(aud="other-client"))
+        user = await keycloak_oauth.verify_token(
+            issue_token(aud=["other-client", "test-client"])
+        )
+        assert user.name == "test"
+
+    @pytest.mark.asyncio
+    async def test_bad_signature(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        header, _payload, signature = issue_token().split(".")
+        forged = issue_token(preferred_username="admin").split(".")[1]
+        with pytest.raises(BadSignatureError):
+            await keycloak_oauth.verify_token(f"{header}.{forged}.{signature}")
+
+    @pytest.mark.asyncio
+    async def test_cache(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        mocker,
+    ):
+        token = issue_token()
+        parse_claims = mocker.spy(keycloak_oauth, "parse_claims")
+        user = await keycloak_oauth.verify_token(token)
+        assert await keycloak_oauth.verify_token(token) is user
+        assert parse_claims.call_count == 1
+
+        # cache entries never outlive the token
+        keycloak_oauth._token_cache.clear()
+        await keycloak_oauth.verify_token(issue_token(exp=int(time.time()) + 2))
+        ((expires, _),) = keycloak_oauth._token_cache._data.values()
+        assert expires - time.monotonic() <= 2
+
+    @pytest.mark.asyncio
+    async def test_verifier_reused_until_metadata_reload(
+        self, keycloak_oauth: KeycloakOAuth2
+    ):
+        verifier = await keycloak_oauth.get_verifier()
+        assert await keycloak_oauth.get_verifier() is verifier
+
+        keycloak_oauth.keycloak.server_metadata["_loaded_at"] += 1
+        assert await keycloak_oauth.get_verifier() is not verifier
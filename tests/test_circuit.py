@@ -0,0 +1,303 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette import status
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.websockets import WebSocketDisconnect
+
+from keycloak_oauth import KeycloakOAuth2, KeycloakUnavailableError
+from keycloak_oauth.circuit import CircuitBreaker
+from keycloak_oauth.jwks import unverified_claims
+from keycloak_oauth.middleware import KeycloakAuthMiddleware
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingTransport(httpx.AsyncBaseTransport):
+    def __init__(self) -> None:
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        raise httpx.ConnectError("Keycloak is down", request=request)
+
+
+class TestCircuitBreaker:
+    @pytest.fixture()
+    def clock(self) -> Clock:
+        return Clock()
+
+    @pytest.fixture()
+    def breaker(self, clock: Clock) -> CircuitBreaker:
+        return CircuitBreaker(failure_threshold=2, reset_timeout=10, timer=clock)
+
+    def test_opens_after_consecutive_failures(self, breaker: CircuitBreaker):
+        for success in (False, True, False):
+            breaker.acquire()
+            breaker.record(success)
+        assert breaker.state == "closed"
+        breaker.acquire()
+        breaker.record(False)
+        assert breaker.state == "open"
+        with pytest.raises(KeycloakUnavailableError, match="retrying in 10s") as e:
+            breaker.acquire()
+        assert e.value.retry_after == 10
+
+    def test_half_open(self, breaker: CircuitBreaker, clock: Clock):
+        for _ in range(2):
+            breaker.acquire()
+            breaker.record(False)
+        clock.now = 10
+        assert breaker.state == "half_open"
+        trial = breaker.acquire()
+        assert trial
+        # only a single trial request
+        with pytest.raises(KeycloakUnavailableError):
+            breaker.acquire()
+        breaker.record(False, trial)
+        assert breaker.state == "open"
+
+        clock.now = 20
+        trial = breaker.acquire()
+        breaker.record(None, trial)
+        trial = breaker.acquire()
+        breaker.record(True, trial)
+        assert breaker.state == "closed"
+        assert breaker.retry_after == 0
+
+    def test_disabled(self, clock: Clock):
+        breaker = CircuitBreaker(failure_threshold=0, timer=clock)
+        for _ in range(10):
+            breaker.acquire()
+            breaker.record(False)
+        assert breaker.state == "closed"
+
+
+class TestKeycloakCircuitBreaker:
+    @pytest.fixture()
+    def transport(self) -> FailingTransport:
+        return FailingTransport()
+
+    @pytest.fixture()
+    def keycloak_oauth(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        transport: FailingTransport,
+    ) -> KeycloakOAuth2:
+        keycloak_oauth = make_keycloak_oauth(
+            transport=transport, circuit_failure_threshold=2, http_timeout=1
+        )
+        keycloak_oauth.keycloak.server_metadata.clear()
+        return keycloak_oauth
+
+    @pytest.mark.asyncio
+    async def test_fail_fast(
+        self, keycloak_oauth: KeycloakOAuth2, transport: FailingTransport
+    ):
+        assert keycloak_oauth.keycloak.client_kwargs["timeout"] == 1
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await keycloak_oauth.keycloak.load_server_metadata()
+        with pytest.raises(KeycloakUnavailableError):
+            await keycloak_oauth.keycloak.load_server_metadata()
+        assert transport.requests == 2
+        assert keycloak_oauth.circuit_breaker.state == "open"
+
+    @pytest.mark.asyncio
+    async def test_server_errors(
+        self, make_keycloak_oauth: Callable[..., KeycloakOAuth2]
+    ):
+        responses = iter([503, 404, 500, 500])
+        keycloak_oauth = make_keycloak_oauth(
+            transport=httpx.MockTransport(lambda _: httpx.Response(next(responses))),
+            circuit_failure_threshold=2,
+        )
+        keycloak_oauth.keycloak.server_metadata.clear()
+        for _ in range(4):
+            with pytest.raises(httpx.HTTPStatusError):
+                await keycloak_oauth.keycloak.load_server_metadata()
+        assert keycloak_oauth.circuit_breaker.state == "open"
+
+    @pytest.mark.asyncio
+    async def test_bearer_unavailable(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        keycloak_oauth.circuit_breaker.record(False)
+        keycloak_oauth.circuit_breaker.record(False)
+        request = Request(
+            {
+                "type": "http",
+                "headers": [(b"authorization", f"Bearer {issue_token()}".encode())],
+            }
+        )
+        with pytest.raises(HTTPException) as e:
+            await keycloak_oauth.get_bearer_user(request)
+        assert e.value.status_code == 503
+        assert e.value.headers == {"Retry-After": "30"}
+
+    def test_middleware_unavailable(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        app = FastAPI()
+        app.add_middleware(KeycloakAuthMiddleware, keycloak=keycloak_oauth)
+        keycloak_oauth.circuit_breaker.record(False)
+        keycloak_oauth.circuit_breaker.record(False)
+        response = TestClient(app).get(
+            "/", headers={"Authorization": f"Bearer {issue_token()}"}
+        )
+        assert response.status_code == 503
+        assert "Keycloak is unavailable" in response.json()["detail"]
+
+    def test_middleware_websocket_unavailable(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        app = FastAPI()
+        app.add_middleware(KeycloakAuthMiddleware, keycloak=keycloak_oauth)
+        keycloak_oauth.circuit_breaker.record(False)
+        keycloak_oauth.circuit_breaker.record(False)
+        headers = {"Authorization": f"Bearer {issue_token()}"}
+        with pytest.raises(WebSocketDisconnect) as e:
+            with TestClient(app).websocket_connect("/", headers=headers):
+                pass
+        assert e.value.code == status.WS_1013_TRY_AGAIN_LATER
+
+
+class TestKeycloakErrors:
+    @pytest.fixture()
+    def keycloak_oauth(
+        self, make_keycloak_oauth: Callable[..., KeycloakOAuth2]
+    ) -> KeycloakOAuth2:
+        # metadata and keys are loaded, but every further request fails
+        keycloak_oauth = make_keycloak_oauth(
+            transport=httpx.MockTransport(lambda _: httpx.Response(502)),
+            jwks_min_refetch_interval=0,
+        )
+        metadata = keycloak_oauth.keycloak.server_metadata
+        metadata["introspection_endpoint"] = (
+            f"{metadata['issuer']}/protocol/openid-connect/token/introspect"
+        )
+        keycloak_oauth.jwks.load(metadata["jwks"])
+        return keycloak_oauth
+
+    @pytest.fixture()
+    def rotated_token(self, issue_token: Callable[..., str]) -> str:
+        """Token signed with a key which is not known yet."""
+        key = JsonWebKey.generate_key("RSA", 2048, {"kid": "rotated"}, True)
+        claims = unverified_claims(issue_token())
+        return JsonWebToken(["RS256"]).encode({"alg": "RS256"}, claims, key).decode()
+
+    def request(self, token: str) -> Request:
+        return Request(
+            {
+                "type": "http",
+                "headers": [(b"authorization", f"Bearer {token}".encode())],
+            }
+        )
+
+    @pytest.mark.asyncio
+    async def test_bearer_unknown_kid(
+        self, keycloak_oauth: KeycloakOAuth2, rotated_token: str
+    ):
+        with pytest.raises(HTTPException) as e:
+            await keycloak_oauth.get_bearer_user(self.request(rotated_token))
+        assert e.value.status_code == 503
+        assert e.value.detail == "Keycloak is unavailable"
+
+    @pytest.mark.asyncio
+    async def test_introspection(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        with pytest.raises(HTTPException) as e:
+            await keycloak_oauth.get_introspected_user(self.request(issue_token()))
+        assert e.value.status_code == 503
+
+    def test_middleware(self, keycloak_oauth: KeycloakOAuth2, rotated_token: str):
+        app = FastAPI()
+        app.add_middleware(KeycloakAuthMiddleware, keycloak=keycloak_oauth)
+        response = TestClient(app).get(
+            "/", headers={"Authorization": f"Bearer {rotated_token}"}
+        )
+        assert response.status_code == 503
+
+
+class TestStaleWhileRevalidate:
+    @pytest.fixture()
+    def keycloak_oauth(
+        self, make_keycloak_oauth: Callable[..., KeycloakOAuth2]
+    ) -> KeycloakOAuth2:
+        return make_keycloak_oauth(
+            transport=FailingTransport(),
+            metadata_refresh_interval=10,
+            jwks_refresh_interval=10,
+            jwks_min_refetch_interval=0,
+            max_stale=100,
+        )
+
+    def age(self, keycloak_oauth: KeycloakOAuth2, seconds: float) -> None:
+        keycloak_oauth.keycloak.server_metadata["_loaded_at"] = time.time() - seconds
+        keycloak_oauth.jwks._fetched_at = time.monotonic() - seconds
+
+    @pytest.mark.asyncio
+    async def test_metadata(self, keycloak_oauth: KeycloakOAuth2, mocker):
+        warning = mocker.patch("keycloak_oauth.oauth2.log.warning")
+        self.age(keycloak_oauth, 50)
+        metadata = await keycloak_oauth.keycloak.load_server_metadata()
+        assert metadata["issuer"]
+        assert keycloak_oauth.keycloak._background is not None
+        await keycloak_oauth.keycloak._background
+        warning.assert_called_once()
+
+        self.age(keycloak_oauth, 200)
+        with pytest.raises(httpx.ConnectError):
+            await keycloak_oauth.keycloak.load_server_metadata()
+
+    @pytest.mark.asyncio
+    async def test_metadata_refreshed(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+    ):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={"issuer": "refreshed"})
+
+        keycloak_oauth = make_keycloak_oauth(
+            transport=httpx.MockTransport(handler), metadata_refresh_interval=10
+        )
+        self.age(keycloak_oauth, 50)
+        metadata = await keycloak_oauth.keycloak.load_server_metadata()
+        assert metadata["issuer"] != "refreshed"
+        assert keycloak_oauth.keycloak._background is not None
+        await keycloak_oauth.keycloak._background
+        assert metadata["issuer"] == "refreshed"
+        assert time.time() - metadata["_loaded_at"] < 1
+
+    @pytest.mark.asyncio
+    async def test_jwks(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        jwk_set: dict[str, Any],
+        mocker,
+    ):
+        log = mocker.patch("keycloak_oauth.jwks.log")
+        keycloak_oauth.jwks.load(jwk_set)
+        self.age(keycloak_oauth, 50)
+        assert await keycloak_oauth.jwks.get_key("test-key")
+        assert keycloak_oauth.jwks._background is not None
+        await keycloak_oauth.jwks._background
+        log.exception.assert_called_once()
+
+        self.age(keycloak_oauth, 200)
+        with pytest.raises(httpx.ConnectError):
+            await keycloak_oauth.jwks.get_key("test-key")
@@ -0,0 +1,134 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from pathlib import Path
+
+import httpx
+import pytest
+import pytest_asyncio
+from mock_keycloak import MockKeycloak
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from keycloak_oauth import ClientCredentials, KeycloakOAuth2
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+
+
+class TestClientCredentials:
+    @pytest.mark.asyncio
+    async def test_cached(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        credentials = mock_keycloak_oauth.client_credentials()
+        token = await credentials.get_token()
+        assert await credentials.get_token() is token
+        assert mock_keycloak.requests["token"] == 1
+
+        claims = await mock_keycloak_oauth.parse_claims(token)
+        assert claims["preferred_username"] == "service-account-test-client"
+        assert claims["azp"] == "test-client"
+
+    @pytest.mark.asyncio
+    async def test_scope(self, mock_keycloak_oauth: KeycloakOAuth2):
+        credentials = mock_keycloak_oauth.client_credentials(scope="profile")
+        token = await credentials.get_token()
+        assert token["scope"] == "profile"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_fetches_coalesced(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        credentials = mock_keycloak_oauth.client_credentials()
+        tokens = await asyncio.gather(*(credentials.get_token() for _ in range(10)))
+        assert all(token is tokens[0] for token in tokens)
+        assert mock_keycloak.requests["token"] == 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_ahead(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        # token lifetime of 300s is within the refresh window right away
+        credentials = mock_keycloak_oauth.client_credentials(refresh_ahead=400)
+        token = await credentials.get_token()
+        assert await credentials.get_token() is token
+        assert credentials._background is not None
+        await credentials._background
+        assert mock_keycloak.requests["token"] == 2
+        credentials.refresh_ahead = 0
+        assert await credentials.get_token() is not token
+
+    @pytest.mark.asyncio
+    async def test_expired(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        credentials = mock_keycloak_oauth.client_credentials(min_validity=400)
+        token = await credentials.get_token()
+        assert await credentials.get_token() is not token
+        assert mock_keycloak.requests["token"] == 2
+
+    @pytest.mark.asyncio
+    async def test_signed_jwt(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        await mock_keycloak_oauth.setup_signed_jwt(
+            RESOURCES_PATH / "keypair.pem", RESOURCES_PATH / "publickey.crt"
+        )
+        token = await mock_keycloak_oauth.client_credentials().get_token()
+        claims = await mock_keycloak_oauth.parse_claims(token)
+        assert claims["azp"] == "test-client"
+
+
+class TestClientCredentialsAuth:
+    @pytest.fixture()
+    def credentials(self, mock_keycloak_oauth: KeycloakOAuth2) -> ClientCredentials:
+        return mock_keycloak_oauth.client_credentials()
+
+    @pytest.fixture()
+    def service(self) -> Starlette:
+        """Downstream service which rejects the first request."""
+        calls: list[str] = []
+
+        async def echo(request: Request) -> JSONResponse:
+            calls.append(request.headers["Authorization"])
+            status_code = 401 if len(calls) == 1 else 200
+            return JSONResponse(calls, status_code=status_code)
+
+        return Starlette(routes=[Route("/", echo, methods=["GET", "POST"])])
+
+    @pytest_asyncio.fixture()
+    async def client(
+        self, service: Starlette, credentials: ClientCredentials
+    ) -> AsyncIterator[httpx.AsyncClient]:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=service),  # type: ignore[arg-type]
+            base_url="http://service.test",
+            auth=credentials,
+        ) as client:
+            yield client
+
+    @pytest.mark.asyncio
+    async def test_bearer_header(
+        self,
+        client: httpx.AsyncClient,
+        mock_keycloak: MockKeycloak,
+        credentials: ClientCredentials,
+    ):
+        response = await client.post("/", json={"payload": 1})
+        assert response.status_code == 200
+        rejected, accepted = response.json()
+        assert rejected.startswith("Bearer ")
+        assert rejected != accepted
+        token = await credentials.get_token()
+        assert accepted == f"Bearer {token['access_token']}"
+        assert mock_keycloak.requests["token"] == 2
+
+        response = await client.get("/")
+        assert response.json()[-1] == accepted
+        assert mock_keycloak.requests["token"] == 2
+
+    def test_sync_client(self, make_keycloak_oauth: Callable[..., KeycloakOAuth2]):
+        credentials = make_keycloak_oauth().client_credentials()
+        with httpx.Client(auth=credentials) as client, pytest.raises(RuntimeError):
+            client.get("http://service.test")
@@ -0,0 +1,127 @@
+import threading
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from authlib.jose.errors import BadSignatureError
+from mock_keycloak import MockKeycloak
+
+from keycloak_oauth import KeycloakOAuth2, crypto
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+
+
+class TestCryptoExecutor:
+    @pytest_asyncio.fixture(params=[None, "thread", "thread_pool", "process_pool"])
+    async def keycloak_oauth(
+        self,
+        request: pytest.FixtureRequest,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+    ) -> AsyncIterator[KeycloakOAuth2]:
+        executor: Any = request.param
+        if executor == "thread_pool":
+            executor = ThreadPoolExecutor(max_workers=1)
+        elif executor == "process_pool":
+            executor = ProcessPoolExecutor(max_workers=1)
+        yield make_keycloak_oauth(crypto_executor=executor)
+        if isinstance(executor, ThreadPoolExecutor | ProcessPoolExecutor):
+            executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_parse_claims(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        claims = await keycloak_oauth.parse_claims(
+            {"access_token": issue_token()}, {"exp": {"essential": True}}
+        )
+        assert claims["preferred_username"] == "test"
+        assert claims.header["kid"] == "test-key"
+        assert claims.options == {"exp": {"essential": True}}
+        claims.validate()
+
+    @pytest.mark.asyncio
+    async def test_bad_signature(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        header, payload, signature = issue_token().split(".")
+        tampered = f"{header}.{payload}.{signature[::-1]}"
+        with pytest.raises(BadSignatureError):
+            await keycloak_oauth.parse_claims({"access_token": tampered})
+
+    @pytest.mark.asyncio
+    async def test_verify_token(
+        self, keycloak_oauth: KeycloakOAuth2, issue_token: Callable[..., str]
+    ):
+        user = await keycloak_oauth.verify_token(issue_token())
+        assert user.name == "test"
+
+    @pytest.mark.asyncio
+    async def test_key_serialized_once(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        issue_token: Callable[..., str],
+    ):
+        crypto._serialize_key.cache_clear()
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            keycloak_oauth = make_keycloak_oauth(crypto_executor=executor)
+            for sub in ("a", "b"):
+                await keycloak_oauth.parse_claims(
+                    {"access_token": issue_token(sub=sub)}
+                )
+        assert crypto._serialize_key.cache_info().misses == 1
+
+
+class TestSignedJWT:
+    async def refresh(
+        self,
+        mock_keycloak: MockKeycloak,
+        keycloak_oauth: KeycloakOAuth2,
+    ) -> dict[str, Any]:
+        await keycloak_oauth.setup_signed_jwt(
+            RESOURCES_PATH / "keypair.pem", RESOURCES_PATH / "publickey.crt"
+        )
+        token = mock_keycloak.issue_token("test-client", "sid", "openid")
+        return await keycloak_oauth.refresh_token(token["refresh_token"])
+
+    @pytest.mark.asyncio
+    async def test_client_assertion_signed_off_loop(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mocker,
+    ):
+        threads: list[int] = []
+        private_key_jwt_sign = crypto.private_key_jwt_sign
+
+        def sign(*args: Any, **kwargs: Any) -> bytes:
+            threads.append(threading.get_ident())
+            return private_key_jwt_sign(*args, **kwargs)
+
+        mocker.patch("keycloak_oauth.crypto.private_key_jwt_sign", side_effect=sign)
+        inline_sign = mocker.spy(crypto.PrivateKeyJWT, "sign")
+
+        keycloak_oauth = make_mock_keycloak_oauth(crypto_executor="thread")
+        token = await self.refresh(mock_keycloak, keycloak_oauth)
+
+        assert token["access_token"]
+        assert len(threads) == 1
+        assert threads[0] != threading.get_ident()
+        inline_sign.assert_not_called()
+        assert crypto._client_assertion.get() is None
+
+    @pytest.mark.asyncio
+    async def test_client_assertion_signed_inline(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mocker,
+    ):
+        inline_sign = mocker.spy(crypto.PrivateKeyJWT, "sign")
+
+        token = await self.refresh(mock_keycloak, make_mock_keycloak_oauth())
+
+        assert token["access_token"]
+        inline_sign.assert_called_once()
@@ -0,0 +1,72 @@
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import pytest
+
+from keycloak_oauth import KeycloakOAuth2
+
+ISSUER = "http://keycloak.test/realms/bakdata"
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, jwk_set: dict[str, Any]) -> None:
+        self.jwk_set = jwk_set
+        self.requests: list[httpx.Request] = []
+        self.closed = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path.endswith("/certs"):
+            return httpx.Response(200, json=self.jwk_set)
+        issuer = str(request.url).removesuffix("/.well-known/openid-configuration")
+        return httpx.Response(
+            200,
+            json={
+                "issuer": issuer,
+                "jwks_uri": f"{issuer}/protocol/openid-connect/certs",
+            },
+        )
+
+    async def aclose(self) -> None:
+        self.closed += 1
+
+
+class TestSharedTransport:
+    @pytest.mark.asyncio
+    async def test_shared_by_all_clients(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        jwk_set: dict[str, Any],
+    ):
+        transport = RecordingTransport(jwk_set)
+        keycloak_oauth = make_keycloak_oauth(transport=transport)
+        keycloak_oauth.keycloak.server_metadata.clear()
+
+        async with keycloak_oauth.lifespan():
+            await keycloak_oauth.keycloak.load_server_metadata()
+            await keycloak_oauth.jwks.refresh()
+            await keycloak_oauth.jwks.refresh()
+            assert {request.url.path for request in transport.requests} == {
+                "/realms/bakdata/.well-known/openid-configuration",
+                "/realms/bakdata/protocol/openid-connect/certs",
+            }
+            # clients opened by authlib must not close the pool
+            assert transport.closed == 0
+        assert transport.closed == 1
+
+    def test_custom_certificate(self, mocker):
+        transport = mocker.patch("httpx.AsyncHTTPTransport")
+        keycloak_oauth = KeycloakOAuth2(
+            client_id="test-client",
+            client_secret="secret",
+            server_metadata_url=f"{ISSUER}/.well-known/openid-configuration",
+            client_kwargs={"verify": "/etc/keycloak/ca.pem", "scope": "openid"},
+        )
+        # verification stays enabled, using the given CA bundle
+        assert transport.call_args.kwargs["verify"] == "/etc/keycloak/ca.pem"
+        assert keycloak_oauth.keycloak.client_kwargs == {
+            "scope": "openid",
+            "transport": keycloak_oauth._transport,
+            "timeout": mocker.ANY,
+        }
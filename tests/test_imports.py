@@ -0,0 +1,73 @@
+import subprocess
+import sys
+
+import pytest
+
+import keycloak_oauth
+
+HEAVY = ("authlib.integrations", "httpx", "starlette", "fastapi")
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by
+    `statement` in a fresh interpreter, as reported by `python -X importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def heavy_modules(times: dict[str, int]) -> list[str]:
+    return sorted(name for name in times if name.startswith(HEAVY))
+
+
+class TestImportTime:
+    def test_package(self):
+        times = import_times("import keycloak_oauth")
+        assert heavy_modules(times) == []
+        assert "pydantic" not in times
+
+    def test_user(self):
+        times = import_times("from keycloak_oauth import User")
+        assert heavy_modules(times) == []
+        assert "authlib" not in times
+
+    def test_verification(self):
+        times = import_times(
+            "import keycloak_oauth.jwks, keycloak_oauth.verifier, keycloak_oauth.cache"
+        )
+        assert heavy_modules(times) == []
+
+    def test_sync(self):
+        times = import_times("from keycloak_oauth import SyncTokenVerifier")
+        assert not [
+            name
+            for name in heavy_modules(times)
+            if name.startswith(("authlib.integrations", "starlette", "fastapi"))
+        ]
+
+    def test_client(self):
+        times = import_times("from keycloak_oauth import KeycloakOAuth2")
+        assert "authlib.integrations.starlette_client" in times
+
+
+class TestPublicApi:
+    @pytest.mark.parametrize("name", keycloak_oauth.__all__)
+    def test_exported(self, name: str):
+        value = getattr(keycloak_oauth, name)
+        assert value.__name__ == name
+        assert name in dir(keycloak_oauth)
+
+    def test_unknown(self):
+        with pytest.raises(AttributeError, match="no attribute 'Unknown'"):
+            keycloak_oauth.Unknown  # noqa: B018
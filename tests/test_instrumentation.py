@@ -0,0 +1,113 @@
+from collections.abc import Callable
+
+import pytest
+from authlib.jose.errors import ExpiredTokenError
+from mock_keycloak import MockKeycloak
+
+from keycloak_oauth import Event, Instrumentation, KeycloakOAuth2
+
+
+class RecordingInstrumentation(Instrumentation):
+    def __init__(self) -> None:
+        self.events: list[Event] = []
+
+    def on_event(self, event: Event) -> None:
+        self.events.append(event)
+
+    @property
+    def outcomes(self) -> list[tuple[str, str]]:
+        return [(event.name, event.outcome) for event in self.events]
+
+
+class TestInstrumentation:
+    @pytest.fixture()
+    def instrumentation(self) -> RecordingInstrumentation:
+        return RecordingInstrumentation()
+
+    @pytest.fixture()
+    def mock_keycloak_oauth(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        instrumentation: RecordingInstrumentation,
+    ) -> KeycloakOAuth2:
+        return make_mock_keycloak_oauth(instrumentation=instrumentation)
+
+    @pytest.mark.asyncio
+    async def test_verify_token(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        instrumentation: RecordingInstrumentation,
+    ):
+        token = mock_keycloak.issue_token("test-client", "sid", "openid")
+        await mock_keycloak_oauth.verify_token(token["access_token"])
+        await mock_keycloak_oauth.verify_token(token["access_token"])
+        assert instrumentation.outcomes == [
+            ("metadata", "miss"),
+            ("jwks", "miss"),
+            ("decode", "ok"),
+            ("verify_token", "miss"),
+            ("verify_token", "hit"),
+        ]
+        assert all(event.duration >= 0 for event in instrumentation.events)
+
+    @pytest.mark.asyncio
+    async def test_error(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        instrumentation: RecordingInstrumentation,
+    ):
+        expired = mock_keycloak.sign(exp=1, typ="Bearer")
+        with pytest.raises(ExpiredTokenError):
+            await mock_keycloak_oauth.verify_token(expired)
+        event = instrumentation.events[-1]
+        assert (event.name, event.outcome) == ("verify_token", "error")
+        assert event.error == "ExpiredTokenError"
+
+    def test_prometheus(self):
+        prometheus_client = pytest.importorskip("prometheus_client")
+        from keycloak_oauth.prometheus import PrometheusInstrumentation
+
+        registry = prometheus_client.CollectorRegistry()
+        instrumentation = PrometheusInstrumentation(registry)
+        with pytest.raises(RuntimeError), instrumentation.measure("token"):
+            raise RuntimeError
+        instrumentation.on_event(Event("jwks", "refresh", duration=0.2))
+
+        labels = {"event": "token", "outcome": "error", "error": "RuntimeError"}
+        count = "keycloak_oauth_duration_seconds_count"
+        assert registry.get_sample_value(count, labels) == 1
+        labels = {"event": "jwks", "outcome": "refresh", "error": ""}
+        total = "keycloak_oauth_duration_seconds_sum"
+        assert registry.get_sample_value(total, labels) == 0.2
+
+    def test_opentelemetry(self):
+        pytest.importorskip("opentelemetry.sdk")
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+            InMemorySpanExporter,
+        )
+        from opentelemetry.trace import StatusCode
+
+        from keycloak_oauth.opentelemetry import OpenTelemetryInstrumentation
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        instrumentation = OpenTelemetryInstrumentation(provider)
+        instrumentation.on_event(Event("verify_token", "hit", duration=0.001))
+        instrumentation.on_event(Event("token", "error", error="HTTPStatusError"))
+
+        hit, error = exporter.get_finished_spans()
+        assert hit.name == "keycloak_oauth.verify_token"
+        assert hit.attributes == {"keycloak_oauth.outcome": "hit"}
+        assert hit.start_time is not None
+        assert hit.end_time is not None
+        assert hit.end_time - hit.start_time == 1_000_000
+        assert error.status.status_code == StatusCode.ERROR
+        assert error.attributes == {
+            "keycloak_oauth.outcome": "error",
+            "error.type": "HTTPStatusError",
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from mock_keycloak import MockKeycloak
+
+from keycloak_oauth import KeycloakOAuth2, User, crypto
+from keycloak_oauth.jwks import unverified_claims
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+
+
+class TestIntrospection:
+    @pytest.fixture()
+    def access_token(self, mock_keycloak: MockKeycloak) -> str:
+        return mock_keycloak.issue_token("test-client", "sid", "openid")["access_token"]
+
+    def revoke(self, mock_keycloak: MockKeycloak, access_token: str) -> None:
+        mock_keycloak.revoked.add(unverified_claims(access_token)["jti"])
+
+    @pytest.mark.asyncio
+    async def test_active(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        access_token: str,
+    ):
+        result = await mock_keycloak_oauth.introspect_token(access_token)
+        assert result["active"] is True
+        assert result["preferred_username"] == "test"
+        assert result["client_id"] == "test-client"
+        assert await mock_keycloak_oauth.introspect_token(access_token) is result
+        assert mock_keycloak.requests["introspect"] == 1
+
+    @pytest.mark.asyncio
+    async def test_inactive(
+        self, mock_keycloak: MockKeycloak, mock_keycloak_oauth: KeycloakOAuth2
+    ):
+        result = await mock_keycloak_oauth.introspect_token("opaque")
+        assert result == {"active": False}
+        assert await mock_keycloak_oauth.introspect_token("opaque") is result
+        assert mock_keycloak.requests["introspect"] == 1
+
+    @pytest.mark.asyncio
+    async def test_revoked(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        access_token: str,
+    ):
+        keycloak_oauth = make_mock_keycloak_oauth(introspection_cache_ttl=0)
+        assert (await keycloak_oauth.introspect_token(access_token))["active"]
+        self.revoke(mock_keycloak, access_token)
+        assert not (await keycloak_oauth.introspect_token(access_token))["active"]
+        assert mock_keycloak.requests["introspect"] == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_until_expiry(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+    ):
+        mock_keycloak.token_lifetime = 5
+        access_token = mock_keycloak.issue_token("test-client", "sid", "openid")[
+            "access_token"
+        ]
+        keycloak_oauth = make_mock_keycloak_oauth(introspection_cache_ttl=60)
+        await keycloak_oauth.introspect_token(access_token)
+        [(expires, _)] = keycloak_oauth._introspections._data.values()
+        assert expires - time.monotonic() <= 5
+
+    @pytest.mark.asyncio
+    async def test_concurrent_introspections_coalesced(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        access_token: str,
+    ):
+        results = await asyncio.gather(
+            *(mock_keycloak_oauth.introspect_token(access_token) for _ in range(10))
+        )
+        assert all(result is results[0] for result in results)
+        assert mock_keycloak.requests["introspect"] == 1
+
+    @pytest.mark.asyncio
+    async def test_signed_jwt(
+        self, mock_keycloak_oauth: KeycloakOAuth2, access_token: str, mocker
+    ):
+        await mock_keycloak_oauth.setup_signed_jwt(
+            RESOURCES_PATH / "keypair.pem", RESOURCES_PATH / "publickey.crt"
+        )
+        sign = mocker.spy(crypto.PrivateKeyJWT, "sign")
+        result = await mock_keycloak_oauth.introspect_token(access_token)
+        assert result["active"]
+        sign.assert_called_once()
+
+    def test_get_introspected_user(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        access_token: str,
+    ):
+        keycloak_oauth = make_mock_keycloak_oauth(introspection_cache_ttl=0)
+        app = FastAPI()
+
+        @app.get("/")
+        def root(
+            user: Annotated[User, Depends(keycloak_oauth.get_introspected_user)],
+        ) -> str:
+            return user.name
+
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {access_token}"}
+        assert client.get("/", headers=headers).json() == "test"
+
+        self.revoke(mock_keycloak, access_token)
+        response = client.get("/", headers=headers)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+        assert client.get("/").status_code == 401
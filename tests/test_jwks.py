@@ -0,0 +1,111 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from authlib.jose import JsonWebKey
+
+from keycloak_oauth import KeycloakOAuth2
+
+
+class JWKSEndpoint:
+    """Serves a key set with some latency, replaceable to simulate a rotation."""
+
+    def __init__(self, jwk_set: dict[str, Any]) -> None:
+        self.jwk_set = jwk_set
+
+    async def fetch(self, force: bool = False) -> dict[str, Any]:
+        await asyncio.sleep(0.01)
+        return self.jwk_set
+
+
+class TestJWKSManager:
+    @pytest.fixture()
+    def rotated_jwk_set(self, jwk_set: dict[str, Any]) -> dict[str, Any]:
+        new_key = JsonWebKey.generate_key("RSA", 2048, {"kid": "rotated-key"}, True)
+        return {"keys": [*jwk_set["keys"], new_key.as_dict(is_private=False)]}
+
+    @pytest.fixture()
+    def endpoint(self, jwk_set: dict[str, Any]) -> JWKSEndpoint:
+        return JWKSEndpoint(jwk_set)
+
+    @pytest.fixture()
+    def fetch_jwk_set(
+        self, keycloak_oauth: KeycloakOAuth2, mocker, endpoint: JWKSEndpoint
+    ):
+        return mocker.patch.object(
+            keycloak_oauth.keycloak, "fetch_jwk_set", side_effect=endpoint.fetch
+        )
+
+    @pytest.mark.asyncio
+    async def test_keys_indexed_by_kid(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        fetch_jwk_set,
+    ):
+        for _ in range(3):
+            await keycloak_oauth.verify_token(issue_token())
+        assert fetch_jwk_set.call_count == 1
+        assert set(keycloak_oauth.jwks.keys) == {"test-key"}
+
+    @pytest.mark.asyncio
+    async def test_unknown_kid_single_flight(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        fetch_jwk_set,
+        endpoint: JWKSEndpoint,
+        rotated_jwk_set: dict[str, Any],
+    ):
+        await keycloak_oauth.jwks.get_key("test-key")
+        keycloak_oauth.jwks.min_refetch_interval = 0
+        endpoint.jwk_set = rotated_jwk_set
+
+        keys = await asyncio.gather(
+            *(keycloak_oauth.jwks.get_key("rotated-key") for _ in range(100))
+        )
+        assert {key.kid for key in keys} == {"rotated-key"}
+        assert fetch_jwk_set.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_min_refetch_interval(
+        self, keycloak_oauth: KeycloakOAuth2, fetch_jwk_set
+    ):
+        await keycloak_oauth.jwks.get_key("test-key")
+        for _ in range(10):
+            with pytest.raises(ValueError):
+                await keycloak_oauth.jwks.get_key("unknown-key")
+        assert fetch_jwk_set.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_min_refetch_interval_after_failure(
+        self, keycloak_oauth: KeycloakOAuth2, fetch_jwk_set
+    ):
+        await keycloak_oauth.jwks.get_key("test-key")
+        # keys loaded long ago, the last attempt failed just now
+        keycloak_oauth.jwks._fetched_at -= 60
+        keycloak_oauth.jwks._refetched_at -= 60
+        fetch_jwk_set.side_effect = ConnectionError("Keycloak is down")
+        with pytest.raises(ConnectionError):
+            await keycloak_oauth.jwks.get_key("unknown-key")
+        for _ in range(10):
+            with pytest.raises(ValueError):
+                await keycloak_oauth.jwks.get_key("unknown-key")
+        assert fetch_jwk_set.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_refresh_in_background(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        fetch_jwk_set,
+        endpoint: JWKSEndpoint,
+        rotated_jwk_set: dict[str, Any],
+    ):
+        keycloak_oauth.jwks.refresh_interval = 0.05
+        endpoint.jwk_set = rotated_jwk_set
+        keycloak_oauth.jwks.start()
+        await asyncio.sleep(0.02)
+        assert "rotated-key" in keycloak_oauth.jwks.keys
+        await asyncio.sleep(0.1)
+        await keycloak_oauth.jwks.stop()
+        assert fetch_jwk_set.call_count >= 2
@@ -0,0 +1,127 @@
+from collections.abc import Callable
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.authentication import requires
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.websockets import WebSocket
+
+from keycloak_oauth import KeycloakOAuth2, User
+from keycloak_oauth.middleware import KeycloakAuthMiddleware
+
+
+class TestKeycloakAuthMiddleware:
+    @pytest.fixture()
+    def app(self, keycloak_oauth: KeycloakOAuth2) -> FastAPI:
+        app = FastAPI()
+        keycloak_oauth.setup_fastapi_routes()
+        app.include_router(keycloak_oauth.router, prefix="/auth")
+        app.add_middleware(
+            KeycloakAuthMiddleware, keycloak=keycloak_oauth, public_paths=["/public"]
+        )
+        app.add_middleware(SessionMiddleware, secret_key="!secret")
+
+        @app.get("/")
+        def root(request: Request) -> dict[str, object]:
+            return {
+                "user": request.user.display_name,
+                "authenticated": request.user.is_authenticated,
+                "scopes": request.auth.scopes,
+            }
+
+        @app.get("/private")
+        @requires("authenticated")
+        def private(request: Request) -> str:
+            return request.user.display_name
+
+        @app.get("/depends")
+        def depends(user: Annotated[User, Depends(keycloak_oauth.get_user)]) -> str:
+            return user.name
+
+        @app.get("/public/stream")
+        def stream(request: Request) -> StreamingResponse:
+            assert not request.user.is_authenticated
+            assert request.auth.scopes == []
+            return StreamingResponse(iter([b"a", b"b"]))
+
+        @app.get("/publicity")
+        @requires("authenticated")
+        def publicity(request: Request) -> str:
+            return request.user.display_name
+
+        @app.websocket("/ws")
+        async def ws(websocket: WebSocket) -> None:
+            await websocket.accept()
+            await websocket.send_json(websocket.user.display_name)
+            await websocket.close()
+
+        return app
+
+    @pytest.fixture()
+    def client(self, app: FastAPI) -> TestClient:
+        return TestClient(app)
+
+    def test_anonymous(self, client: TestClient):
+        assert client.get("/").json() == {
+            "user": "",
+            "authenticated": False,
+            "scopes": [],
+        }
+        assert client.get("/private").status_code == 403
+
+    def test_bearer(self, client: TestClient, issue_token: Callable[..., str]):
+        headers = {"Authorization": f"Bearer {issue_token()}"}
+        assert client.get("/", headers=headers).json() == {
+            "user": "test",
+            "authenticated": True,
+            "scopes": ["authenticated"],
+        }
+        assert client.get("/private", headers=headers).json() == "test"
+
+    def test_invalid_bearer(self, client: TestClient, issue_token: Callable[..., str]):
+        headers = {"Authorization": f"Bearer {issue_token(exp=1)}"}
+        assert client.get("/", headers=headers).json()["authenticated"] is False
+
+    def test_session(
+        self,
+        client: TestClient,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        login: Callable[..., TestClient],
+        mocker,
+    ):
+        login(keycloak_oauth, issue_token(), client)
+        assert client.get("/").json()["user"] == "test"
+
+        # resolved once by the middleware, reused by the dependency
+        load_session = mocker.spy(keycloak_oauth, "_load_session")
+        assert client.get("/depends").json() == "test"
+        assert load_session.call_count == 1
+
+    def test_public_paths(
+        self, client: TestClient, keycloak_oauth: KeycloakOAuth2, mocker
+    ):
+        verify_token = mocker.spy(keycloak_oauth, "verify_token")
+        response = client.get(
+            "/public/stream", headers={"Authorization": "Bearer token"}
+        )
+        assert response.content == b"ab"
+        verify_token.assert_not_called()
+
+    def test_public_path_boundary(
+        self, client: TestClient, issue_token: Callable[..., str]
+    ):
+        assert client.get("/publicity").status_code == 403
+        headers = {"Authorization": f"Bearer {issue_token()}"}
+        assert client.get("/publicity", headers=headers).json() == "test"
+
+    def test_websocket(self, client: TestClient, issue_token: Callable[..., str]):
+        headers = {"Authorization": f"Bearer {issue_token()}"}
+        with client.websocket_connect("/ws", headers=headers) as websocket:
+            assert websocket.receive_json() == "test"
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json() == ""
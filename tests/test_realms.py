@@ -0,0 +1,231 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import httpx
+import pytest
+import pytest_asyncio
+from authlib.jose import JsonWebKey
+from authlib.jose.errors import DecodeError, InvalidClaimError
+from mock_keycloak import MockKeycloak
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from keycloak_oauth import KeycloakUnavailableError
+from keycloak_oauth.realms import RealmRegistry
+
+
+class TestRealmRegistry:
+    @pytest.fixture()
+    def realms(self) -> dict[str, MockKeycloak]:
+        realms = {name: MockKeycloak(realm=name) for name in ("a", "b", "c")}
+        for name, realm in realms.items():
+            realm.key = JsonWebKey.generate_key(
+                "RSA", 2048, {"kid": name}, is_private=True
+            )
+        return realms
+
+    @pytest.fixture()
+    def keycloak(self, realms: dict[str, MockKeycloak]) -> Any:
+        """Keycloak server hosting the mock realms."""
+
+        async def app(scope: Any, receive: Any, send: Any) -> None:
+            _, prefix, realm, *_ = scope["path"].split("/")
+            if prefix == "realms" and realm in realms:
+                await realms[realm](scope, receive, send)
+            else:
+                await PlainTextResponse("Not found", 404)(scope, receive, send)
+
+        return app
+
+    @pytest.fixture()
+    def make_registry(self, keycloak: Any) -> Callable[..., RealmRegistry]:
+        def make(**kwargs: Any) -> RealmRegistry:
+            return RealmRegistry(
+                "http://keycloak.test",
+                "test-client",
+                transport=httpx.ASGITransport(app=keycloak),
+                **kwargs,
+            )
+
+        return make
+
+    @pytest_asyncio.fixture()
+    async def registry(
+        self, make_registry: Callable[..., RealmRegistry]
+    ) -> AsyncIterator[RealmRegistry]:
+        registry = make_registry()
+        yield registry
+        await registry.aclose()
+
+    def access_token(self, realm: MockKeycloak) -> str:
+        return realm.issue_token("test-client", "sid", "openid")["access_token"]
+
+    @pytest.mark.asyncio
+    async def test_routed_by_issuer(
+        self, registry: RealmRegistry, realms: dict[str, MockKeycloak]
+    ):
+        assert len(registry) == 0
+        user = await registry.verify_token(self.access_token(realms["a"]))
+        assert user.name == "test"
+        assert len(registry) == 1
+        await registry.verify_token(self.access_token(realms["b"]))
+        assert len(registry) == 2
+        assert "c" not in realms["c"].requests
+
+        realm_a = registry.get_realm(realms["a"].issuer)
+        realm_b = registry.get_realm(realms["b"].issuer)
+        assert realm_a is not realm_b
+        assert realm_a._transport.transport is realm_b._transport.transport
+
+    @pytest.mark.asyncio
+    async def test_lazy_load_coalesced(
+        self, registry: RealmRegistry, realms: dict[str, MockKeycloak]
+    ):
+        await asyncio.gather(
+            *(registry.verify_token(self.access_token(realms["a"])) for _ in range(10))
+        )
+        assert realms["a"].requests == {"metadata": 1, "certs": 1}
+
+    @pytest.mark.asyncio
+    async def test_forged_issuer(
+        self, registry: RealmRegistry, realms: dict[str, MockKeycloak]
+    ):
+        # token of realm a, claiming to be issued by realm b
+        token = realms["a"].sign(iss=realms["b"].issuer, preferred_username="test")
+        with pytest.raises(ValueError, match="Unknown JSON Web Key"):
+            await registry.verify_token(token)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "issuer",
+        [
+            "http://evil.test/realms/a",
+            "http://keycloak.test/realms/",
+            "http://keycloak.test/realms/a/../b",
+            "http://keycloak.test/realms/..",
+            "http://keycloak.test/realms/a?b",
+            "http://keycloak.test/realms/a#b",
+            "http://keycloak.test/realms/a%2Fb",
+            None,
+        ],
+    )
+    async def test_invalid_issuer(
+        self,
+        registry: RealmRegistry,
+        realms: dict[str, MockKeycloak],
+        issuer: str | None,
+    ):
+        with pytest.raises(InvalidClaimError):
+            await registry.verify_token(realms["a"].sign(iss=issuer))
+        assert len(registry) == 0
+
+    @pytest.mark.asyncio
+    async def test_not_a_jwt(self, registry: RealmRegistry):
+        with pytest.raises(DecodeError):
+            await registry.verify_token("opaque")
+
+    @pytest.mark.asyncio
+    async def test_unknown_realm(
+        self,
+        make_registry: Callable[..., RealmRegistry],
+        realms: dict[str, MockKeycloak],
+    ):
+        registry = make_registry(max_realms=2)
+        for name in ("a", "b"):
+            await registry.verify_token(self.access_token(realms[name]))
+        unknown = MockKeycloak(realm="unknown")
+        with pytest.raises(InvalidClaimError):
+            await registry.verify_token(unknown.sign())
+        # known realms are not evicted
+        assert list(registry._realms._data) == [realms["a"].issuer, realms["b"].issuer]
+        # and Keycloak is not asked again for a while
+        with pytest.raises(InvalidClaimError):
+            registry.get_realm(unknown.issuer)
+
+    @pytest.mark.asyncio
+    async def test_allowed_realms(
+        self,
+        make_registry: Callable[..., RealmRegistry],
+        realms: dict[str, MockKeycloak],
+    ):
+        registry = make_registry(allowed_realms=["a"])
+        await registry.verify_token(self.access_token(realms["a"]))
+        with pytest.raises(InvalidClaimError):
+            await registry.verify_token(self.access_token(realms["b"]))
+        assert "metadata" not in realms["b"].requests
+
+    @pytest.mark.asyncio
+    async def test_kept_once_loaded(
+        self, registry: RealmRegistry, realms: dict[str, MockKeycloak]
+    ):
+        registry.get_realm(realms["a"].issuer)
+        assert len(registry) == 0
+        # invalid token, but the realm's metadata is loaded
+        with pytest.raises(ValueError, match="Unknown JSON Web Key"):
+            await registry.verify_token(realms["b"].sign(iss=realms["a"].issuer))
+        assert len(registry) == 1
+
+    @pytest.mark.asyncio
+    async def test_max_realms(
+        self,
+        make_registry: Callable[..., RealmRegistry],
+        realms: dict[str, MockKeycloak],
+    ):
+        registry = make_registry(max_realms=2)
+        for name in ("a", "b", "a", "c"):
+            await registry.verify_token(self.access_token(realms[name]))
+        assert list(registry._realms._data) == [realms["a"].issuer, realms["c"].issuer]
+
+    @pytest.mark.asyncio
+    async def test_idle_timeout(
+        self,
+        make_registry: Callable[..., RealmRegistry],
+        realms: dict[str, MockKeycloak],
+    ):
+        registry = make_registry(idle_timeout=0.05)
+        await registry.verify_token(self.access_token(realms["a"]))
+        realm = registry.get_realm(realms["a"].issuer)
+        assert registry.get_realm(realms["a"].issuer) is realm
+        await asyncio.sleep(0.1)
+        assert registry.get_realm(realms["a"].issuer) is not realm
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker(self, realms: dict[str, MockKeycloak]):
+        def unreachable(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("Keycloak is down", request=request)
+
+        registry = RealmRegistry(
+            "http://keycloak.test",
+            "test-client",
+            transport=httpx.MockTransport(unreachable),
+            circuit_failure_threshold=1,
+        )
+        token = self.access_token(realms["a"])
+        with pytest.raises(httpx.ConnectError):
+            await registry.verify_token(token)
+        with pytest.raises(KeycloakUnavailableError):
+            await registry.verify_token(self.access_token(realms["b"]))
+        assert (
+            registry.get_realm(realms["b"].issuer).circuit_breaker.failure_threshold
+            == 0
+        )
+
+    @pytest.mark.asyncio
+    async def test_keycloak_error(self, realms: dict[str, MockKeycloak]):
+        registry = RealmRegistry(
+            "http://keycloak.test",
+            "test-client",
+            transport=httpx.MockTransport(lambda _: httpx.Response(502)),
+        )
+        token = self.access_token(realms["a"])
+        request = Request(
+            {
+                "type": "http",
+                "headers": [(b"authorization", f"Bearer {token}".encode())],
+            }
+        )
+        with pytest.raises(HTTPException) as e:
+            await registry.get_bearer_user(request)
+        assert e.value.status_code == 503
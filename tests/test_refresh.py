@@ -0,0 +1,95 @@
+import asyncio
+import time
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from authlib.integrations.starlette_client import OAuthError
+from fastapi.testclient import TestClient
+
+from keycloak_oauth import KeycloakOAuth2, MemorySessionStore
+
+
+class TestTokenRefresh:
+    @pytest.fixture()
+    def token(self, issue_token: Callable[..., str]) -> Callable[..., dict[str, Any]]:
+        def token(expires_in: int = 300, **claims: Any) -> dict[str, Any]:
+            expires_at = int(time.time()) + expires_in
+            return {
+                "access_token": issue_token(exp=expires_at, **claims),
+                "refresh_token": f"refresh-{expires_at}-{claims}",
+                "expires_at": expires_at,
+            }
+
+        return token
+
+    @pytest.fixture()
+    def fetch_access_token(self, keycloak_oauth: KeycloakOAuth2, token, mocker) -> Any:
+        async def fetch(**kwargs: Any) -> dict[str, Any]:
+            await asyncio.sleep(0.01)
+            return token(preferred_username="refreshed")
+
+        return mocker.patch.object(
+            keycloak_oauth.keycloak, "fetch_access_token", side_effect=fetch
+        )
+
+    @pytest.fixture(params=["cookie", "store"])
+    def keycloak_oauth(
+        self,
+        request: pytest.FixtureRequest,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+    ) -> KeycloakOAuth2:
+        store = MemorySessionStore() if request.param == "store" else None
+        return make_keycloak_oauth(session_store=store)
+
+    def test_refresh_before_expiry(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        token,
+        fetch_access_token,
+        login: Callable[..., TestClient],
+    ):
+        client = login(keycloak_oauth, token(expires_in=10))
+        assert client.get("/").json() == "refreshed"
+        assert fetch_access_token.call_count == 1
+        # session now holds the refreshed token
+        assert client.get("/").json() == "refreshed"
+        assert fetch_access_token.call_count == 1
+
+    def test_no_refresh_if_valid(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        token,
+        fetch_access_token,
+        login: Callable[..., TestClient],
+    ):
+        client = login(keycloak_oauth, token(expires_in=300))
+        assert client.get("/").json() == "test"
+        assert fetch_access_token.call_count == 0
+
+    def test_invalid_refresh_token(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        token,
+        fetch_access_token,
+        login: Callable[..., TestClient],
+    ):
+        fetch_access_token.side_effect = OAuthError("invalid_grant")
+        client = login(keycloak_oauth, token(expires_in=10))
+        assert client.get("/").json() == "test"
+        assert client.get("/").json() == "test"
+        assert fetch_access_token.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_single_flight(
+        self, keycloak_oauth: KeycloakOAuth2, fetch_access_token
+    ):
+        tokens = await asyncio.gather(
+            *(keycloak_oauth.refresh_token("refresh") for _ in range(50))
+        )
+        assert fetch_access_token.call_count == 1
+        assert all(token is tokens[0] for token in tokens)
+
+        # late requests with the rotated refresh token get the same result
+        assert await keycloak_oauth.refresh_token("refresh") is tokens[0]
+        assert fetch_access_token.call_count == 1
@@ -0,0 +1,177 @@
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from keycloak_oauth import KeycloakOAuth2, MemorySessionStore, SessionCodec, User
+
+
+class TestSessionStore:
+    @pytest.fixture()
+    def store(self) -> MemorySessionStore:
+        return MemorySessionStore()
+
+    @pytest.fixture()
+    def keycloak_oauth(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        store: MemorySessionStore,
+    ) -> KeycloakOAuth2:
+        return make_keycloak_oauth(session_store=store)
+
+    @pytest.fixture()
+    def client(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        make_app: Callable[[KeycloakOAuth2], FastAPI],
+    ) -> TestClient:
+        return TestClient(make_app(keycloak_oauth))
+
+    def test_auth_flow(
+        self,
+        client: TestClient,
+        keycloak_oauth: KeycloakOAuth2,
+        store: MemorySessionStore,
+        issue_token: Callable[..., str],
+        login: Callable[..., TestClient],
+    ):
+        response = client.get("/")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        login(keycloak_oauth, issue_token(), client)
+        # cookie only carries the session id, not the access token
+        assert len(client.cookies["session"]) < 200
+        assert len(store._sessions) == 1
+
+        response = client.get("/")
+        assert response.is_success
+        assert response.json() == "test"
+
+        # cookie sessions can't be read without the store
+        response = client.get("/cookie")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        client.get("/auth/logout", follow_redirects=False)
+        assert len(store._sessions) == 0
+        response = client.get("/")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_new_session_id_on_login(
+        self,
+        client: TestClient,
+        keycloak_oauth: KeycloakOAuth2,
+        store: MemorySessionStore,
+        issue_token: Callable[..., str],
+        login: Callable[..., TestClient],
+    ):
+        login(keycloak_oauth, issue_token(), client)
+        (first,) = store._sessions._data
+        login(keycloak_oauth, issue_token(), client)
+        (second,) = store._sessions._data
+        assert first != second
+
+    @pytest.mark.asyncio
+    async def test_memory_store_expiry(self):
+        store = MemorySessionStore(maxsize=2, ttl=0)
+        await store.set("a", {"user": {}})
+        assert await store.get("a") is None
+
+        store = MemorySessionStore(maxsize=2)
+        for session_id in "abc":
+            await store.set(session_id, {"user": {}})
+        assert await store.get("a") is None
+        assert await store.get("c") == {"user": {}}
+
+
+class TestSessionCodec:
+    @pytest.fixture()
+    def data(self, issue_token: Callable[..., str]) -> dict[str, Any]:
+        user = User(
+            name="test",
+            email="test@bakdata.com",
+            roles=frozenset({"offline_access", "uma_authorization"}),
+            token=issue_token(),
+            client_roles={"app": frozenset({"editor"})},
+            scopes=frozenset({"openid", "email"}),
+        )
+        return {
+            "user": user.model_dump(mode="json"),
+            "refresh_token": "refresh",
+            "expires_at": 1700000000,
+            "sid": "sid",
+            "sub": "sub",
+            "auth_time": 1699990000,
+        }
+
+    @pytest.mark.parametrize("compress", [True, False])
+    @pytest.mark.parametrize("format", ["json", "msgpack"])
+    def test_round_trip(self, data: dict[str, Any], compress: bool, format: str):
+        if format == "msgpack":
+            pytest.importorskip("msgpack")
+        codec = SessionCodec(compress=compress, format=format)  # type: ignore[arg-type]
+        decoded = SessionCodec.decode(codec.encode(data))
+        assert User.from_trusted(decoded.pop("user")) == User.from_trusted(data["user"])
+        assert decoded == {key: value for key, value in data.items() if key != "user"}
+
+    def test_projection(self, data: dict[str, Any]):
+        codec = SessionCodec(fields=["roles"])
+        encoded = codec.encode(data)
+        assert len(encoded) < len(SessionCodec().encode(data)) / 2
+        user = User.from_trusted(SessionCodec.decode(encoded)["user"])
+        assert user == User(
+            name="test",
+            email=None,
+            roles=frozenset({"offline_access", "uma_authorization"}),
+            token="",
+        )
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match="Unknown user fields"):
+            SessionCodec(fields=["password"])
+        for value in ("", "not a session", "EFtdCg"):
+            with pytest.raises(ValueError):
+                SessionCodec.decode(value)
+
+    @pytest.fixture()
+    def token(self, issue_token: Callable[..., str]) -> dict[str, Any]:
+        return {"access_token": issue_token(), "refresh_token": "r"}
+
+    def test_cookie(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        make_app: Callable[[KeycloakOAuth2], FastAPI],
+        login: Callable[..., TestClient],
+        token: dict[str, Any],
+    ):
+        client = login(make_keycloak_oauth(), token)
+        plain = len(client.cookies["session"])
+
+        keycloak_oauth = make_keycloak_oauth(
+            session_codec=SessionCodec(fields=["roles"])
+        )
+        client = TestClient(make_app(keycloak_oauth))
+        assert client.get("/").status_code == status.HTTP_401_UNAUTHORIZED
+        login(keycloak_oauth, token, client)
+        assert len(client.cookies["session"]) < plain / 3
+        assert client.get("/").json() == "test"
+        assert client.get("/cookie").json() == "test"
+
+        client.get("/auth/logout", follow_redirects=False)
+        assert client.get("/").status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_store(
+        self,
+        make_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        login: Callable[..., TestClient],
+        token: dict[str, Any],
+    ):
+        store = MemorySessionStore()
+        keycloak_oauth = make_keycloak_oauth(
+            session_store=store, session_codec=SessionCodec()
+        )
+        client = login(keycloak_oauth, token)
+        ((_, data),) = store._sessions._data.values()
+        assert list(data) == ["keycloak"]
+        assert client.get("/").json() == "test"
@@ -0,0 +1,195 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.oauth2.rfc7523 import PrivateKeyJWT
+from mock_keycloak import MockKeycloak
+from private_keys import PRIVATE_KEYS, private_pem
+
+from keycloak_oauth import KeycloakOAuth2, crypto
+from keycloak_oauth.crypto import AssertionPool, CryptoRunner
+from keycloak_oauth.signing import SigningKeys, load_signing_key
+
+RESOURCES_PATH = Path(__file__).parent.absolute() / "resources/keycloak"
+
+
+def verify(assertion: bytes, jwk_set: dict[str, Any]) -> Any:
+    jwt = JsonWebToken(["RS256", "ES256", "EdDSA"])
+    claims = jwt.decode(assertion, JsonWebKey.import_key_set(jwk_set))
+    claims.validate()
+    return claims
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSigningKeys:
+    @pytest.mark.parametrize("alg", list(PRIVATE_KEYS))
+    def test_load(self, alg: str):
+        signing_key = load_signing_key(private_pem(alg))
+        assert signing_key.alg == alg
+        assert signing_key.kid == signing_key.key.thumbprint()
+        jwk = signing_key.public_jwk
+        assert jwk["alg"] == alg
+        assert jwk["use"] == "sig"
+        assert jwk["kid"] == signing_key.kid
+        assert "d" not in jwk
+
+    def test_public_key(self):
+        with pytest.raises(ValueError, match="must be a private key"):
+            load_signing_key((RESOURCES_PATH / "publickey.crt").read_bytes())
+
+    def test_rotate(self):
+        clock = Clock()
+        old, new = (load_signing_key(private_pem("ES256")) for _ in range(2))
+        keys = SigningKeys(old, timer=clock)
+        keys.rotate(old, overlap=60)
+        assert keys.public_keys() == [old.public_jwk]
+
+        keys.rotate(new, overlap=60)
+        assert keys.current is new
+        assert keys.public_keys() == [new.public_jwk, old.public_jwk]
+        clock.now = 60
+        assert keys.public_keys() == [new.public_jwk]
+
+
+class TestAssertionPool:
+    @pytest.fixture()
+    def clock(self) -> Clock:
+        return Clock()
+
+    @pytest.fixture()
+    def pool(self, clock: Clock) -> AssertionPool:
+        signed = iter(range(1000))
+
+        async def sign(expires_in: int) -> bytes:
+            assert expires_in == 60
+            return str(next(signed)).encode()
+
+        return AssertionPool(sign, size=3, expires_in=60, timer=clock)
+
+    @pytest.mark.asyncio
+    async def test_fill(self, pool: AssertionPool, clock: Clock):
+        assert pool.take() is None
+        await pool.fill()
+        assert len(pool) == 3
+        assert pool.take() == b"0"
+        await pool.fill()
+        assert [pool.take() for _ in range(3)] == [b"1", b"2", b"3"]
+
+    @pytest.mark.asyncio
+    async def test_half_lifetime(self, pool: AssertionPool, clock: Clock):
+        await pool.fill()
+        clock.now = 30
+        assert pool.take() is None
+        await pool.fill()
+        assert pool.take() == b"3"
+
+    @pytest.mark.asyncio
+    async def test_clear(self, pool: AssertionPool):
+        await pool.fill()
+        pool.clear()
+        assert len(pool) == 0
+
+    @pytest.mark.asyncio
+    async def test_background(self, pool: AssertionPool):
+        pool.start()
+        await asyncio.sleep(0.01)
+        assert len(pool) == 3
+        assert pool.take() is not None
+        await asyncio.sleep(0.01)
+        assert len(pool) == 3
+        await pool.stop()
+
+
+class TestSignedJWT:
+    @pytest.fixture()
+    def keypair(self, tmp_path: Path) -> Path:
+        path = tmp_path / "keypair.pem"
+        path.write_bytes(private_pem("ES256"))
+        return path
+
+    async def public_keys(self, keycloak_oauth: KeycloakOAuth2) -> dict[str, Any]:
+        return await keycloak_oauth.public_keys(None)  # type: ignore[arg-type]
+
+    @pytest.mark.asyncio
+    async def test_assertion_pool(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        keypair: Path,
+        mocker,
+    ):
+        inline_sign = mocker.spy(PrivateKeyJWT, "sign")
+        keycloak_oauth = make_mock_keycloak_oauth()
+        await keycloak_oauth.setup_signed_jwt(keypair, assertion_pool_size=4)
+        assert keycloak_oauth.assertions is not None
+        await asyncio.sleep(0.01)
+        assert len(keycloak_oauth.assertions) == 4
+
+        token = mock_keycloak.issue_token("test-client", "sid", "openid")
+        assert await keycloak_oauth.refresh_token(token["refresh_token"])
+        inline_sign.assert_not_called()
+
+        jwk_set = await self.public_keys(keycloak_oauth)
+        claims = []
+        for _ in range(3):
+            assertion = keycloak_oauth.assertions.take()
+            assert assertion is not None
+            claims.append(verify(assertion, jwk_set))
+        assert len({c["jti"] for c in claims}) == 3
+        assert all(c["exp"] - c["iat"] == 60 for c in claims)
+        assert claims[0].header["alg"] == "ES256"
+        await keycloak_oauth.aclose()
+        assert keycloak_oauth.assertions._task is None
+
+    @pytest.mark.asyncio
+    async def test_rotate(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        keypair: Path,
+        tmp_path: Path,
+    ):
+        keycloak_oauth = make_mock_keycloak_oauth()
+        with pytest.raises(RuntimeError):
+            keycloak_oauth.rotate_signing_key(keypair)
+        await keycloak_oauth.setup_signed_jwt(keypair, assertion_pool_size=2)
+        await asyncio.sleep(0.01)
+        assert keycloak_oauth.signing_keys is not None
+        old_kid = keycloak_oauth.signing_keys.current.kid
+
+        new_keypair = tmp_path / "new.pem"
+        new_keypair.write_bytes(private_pem("EdDSA"))
+        keycloak_oauth.rotate_signing_key(new_keypair)
+        jwk_set = await self.public_keys(keycloak_oauth)
+        new_kid = keycloak_oauth.signing_keys.current.kid
+        assert [key["kid"] for key in jwk_set["keys"]] == [new_kid, old_kid]
+
+        await asyncio.sleep(0.01)
+        assertion = keycloak_oauth.assertions.take()  # type: ignore[union-attr]
+        assert assertion is not None
+        assert verify(assertion, jwk_set).header["kid"] == new_kid
+        await keycloak_oauth.aclose()
+
+    @pytest.mark.asyncio
+    async def test_sign_in_process(self, keypair: Path):
+        signing_key = load_signing_key(keypair.read_bytes())
+        auth_method = crypto.PresignedPrivateKeyJWT(
+            "http://keycloak.test/token", alg=signing_key.alg
+        )
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            assertion = await CryptoRunner(executor).sign_client_assertion(
+                auth_method, "test-client", signing_key.key, expires_in=60
+            )
+        claims = verify(assertion, {"keys": [signing_key.public_jwk]})
+        assert claims["sub"] == "test-client"
+        assert claims["aud"] == "http://keycloak.test/token"
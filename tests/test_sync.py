@@ -0,0 +1,246 @@
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.errors import JoseError
+from authlib.jose.rfc7517 import Key
+
+from keycloak_oauth import KeycloakOAuth2, SyncTokenVerifier
+from keycloak_oauth.cache import StripedTTLCache
+from keycloak_oauth.jwks import unverified_claims
+
+ISSUER = "http://keycloak.test/realms/bakdata"
+METADATA_URL = f"{ISSUER}/.well-known/openid-configuration"
+
+
+class Keycloak:
+    """Serves server metadata and key set to a sync client, counting requests."""
+
+    def __init__(self, jwk_set: dict[str, Any], delay: float = 0) -> None:
+        self.jwk_set = jwk_set
+        self.delay = delay
+        self.requests: dict[str, int] = {}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.delay)
+        if request.url == METADATA_URL:
+            endpoint = "metadata"
+            content = {
+                "issuer": ISSUER,
+                "jwks_uri": f"{ISSUER}/protocol/openid-connect/certs",
+                "id_token_signing_alg_values_supported": ["RS256"],
+            }
+        elif request.url.path.endswith("/certs"):
+            endpoint, content = "certs", self.jwk_set
+        else:
+            return httpx.Response(404)
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        return httpx.Response(200, json=content)
+
+
+def resign(token: str, key: Key) -> str:
+    """Sign the claims of a token with another key."""
+    return (
+        JsonWebToken(["RS256"])
+        .encode({"alg": "RS256"}, unverified_claims(token), key)
+        .decode()
+    )
+
+
+class TestStripedTTLCache:
+    def test_cache(self):
+        cache: StripedTTLCache[str, int] = StripedTTLCache(100, 10, stripes=4)
+        for i in range(8):
+            cache.set(str(i), i)
+        assert cache.get("3") == 3
+        assert "7" in cache
+        assert cache.pop("3") == 3
+        assert cache.get("3") is None
+        cache.set("ttl", 1, ttl=0)
+        assert "ttl" not in cache
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_bounded(self):
+        cache: StripedTTLCache[int, int] = StripedTTLCache(8, 10, stripes=4)
+        for i in range(100):
+            cache.set(i, i)
+        assert len(cache) <= 8
+
+
+class TestSyncTokenVerifier:
+    @pytest.fixture()
+    def keycloak(self, jwk_set: dict[str, Any]) -> Keycloak:
+        return Keycloak(jwk_set)
+
+    @pytest.fixture()
+    def make_verifier(self, keycloak: Keycloak) -> Callable[..., SyncTokenVerifier]:
+        def make(**kwargs: Any) -> SyncTokenVerifier:
+            kwargs.setdefault("transport", httpx.MockTransport(keycloak))
+            return SyncTokenVerifier(METADATA_URL, **kwargs)
+
+        return make
+
+    def test_verify_token(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        keycloak: Keycloak,
+        issue_token: Callable[..., str],
+    ):
+        with make_verifier(audience="account") as verifier:
+            token = issue_token()
+            user = verifier.verify_token(token)
+            assert user.name == "test"
+            assert user.token == token
+            assert verifier.verify_token(token) is user
+            verifier.verify_token(issue_token(sub="other"))
+        assert keycloak.requests == {"metadata": 1, "certs": 1}
+
+    @pytest.mark.parametrize(
+        "claims", [{"exp": 0}, {"aud": "other"}, {"iss": "http://evil.test"}]
+    )
+    def test_invalid_token(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        issue_token: Callable[..., str],
+        claims: dict[str, Any],
+    ):
+        verifier = make_verifier(audience="account")
+        with pytest.raises(JoseError):
+            verifier.verify_token(issue_token(**claims))
+
+    def test_concurrent_first_use(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        keycloak: Keycloak,
+        issue_token: Callable[..., str],
+    ):
+        keycloak.delay = 0.05
+        verifier = make_verifier()
+        tokens = [issue_token(sub=str(i)) for i in range(64)]
+        with ThreadPoolExecutor(32) as executor:
+            users = list(executor.map(verifier.verify_token, tokens))
+        assert [user.token for user in users] == tokens
+        assert keycloak.requests == {"metadata": 1, "certs": 1}
+
+    def test_key_rotation(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        keycloak: Keycloak,
+        jwk_set: dict[str, Any],
+        issue_token: Callable[..., str],
+    ):
+        verifier = make_verifier(jwks_min_refetch_interval=0)
+        verifier.verify_token(issue_token())
+        rotated = JsonWebKey.generate_key("RSA", 2048, {"kid": "rotated"}, True)
+        keycloak.jwk_set = {
+            "keys": [*jwk_set["keys"], rotated.as_dict(is_private=False)]
+        }
+        token = resign(issue_token(), rotated)
+        tokens = [resign(issue_token(sub=str(i)), rotated) for i in range(32)]
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(verifier.verify_token, [token, *tokens]))
+        assert set(verifier.jwks.keys) == {"test-key", "rotated"}
+        assert keycloak.requests == {"metadata": 1, "certs": 2}
+
+    def test_unknown_kid_refetch_limited(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        keycloak: Keycloak,
+        issue_token: Callable[..., str],
+    ):
+        verifier = make_verifier()
+        verifier.verify_token(issue_token())
+        unknown = JsonWebKey.generate_key("RSA", 2048, {"kid": "unknown"}, True)
+        for _ in range(3):
+            with pytest.raises(ValueError, match="Unknown JSON Web Key 'unknown'"):
+                verifier.verify_token(resign(issue_token(), unknown))
+        assert keycloak.requests == {"metadata": 1, "certs": 1}
+
+    def test_unknown_kid_refetch_limited_after_failure(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        issue_token: Callable[..., str],
+    ):
+        verifier = make_verifier()
+        verifier.verify_token(issue_token())
+        attempts: list[httpx.Request] = []
+
+        def unreachable(request: httpx.Request) -> httpx.Response:
+            attempts.append(request)
+            raise httpx.ConnectError("Keycloak is down", request=request)
+
+        verifier.close()
+        verifier._client_kwargs["transport"] = httpx.MockTransport(unreachable)
+        # keys loaded long ago, the last attempt fails just now
+        verifier.jwks._fetched_at -= 60
+        verifier._jwks_refetched_at -= 60
+        unknown = JsonWebKey.generate_key("RSA", 2048, {"kid": "unknown"}, True)
+        with pytest.raises(httpx.ConnectError):
+            verifier.verify_token(resign(issue_token(), unknown))
+        for _ in range(3):
+            with pytest.raises(ValueError, match="Unknown JSON Web Key 'unknown'"):
+                verifier.verify_token(resign(issue_token(), unknown))
+        assert len(attempts) == 1
+
+    def test_stale_keys_refreshed_once(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        keycloak: Keycloak,
+        issue_token: Callable[..., str],
+    ):
+        verifier = make_verifier(
+            jwks_refresh_interval=10, jwks_min_refetch_interval=0, max_stale=100
+        )
+        verifier.verify_token(issue_token())
+        verifier.jwks._fetched_at -= 50
+        tokens = [issue_token(sub=str(i)) for i in range(32)]
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(verifier.verify_token, tokens))
+        assert keycloak.requests == {"metadata": 1, "certs": 2}
+        assert verifier.jwks.age < 10
+
+    def test_stale_keys_keycloak_down(
+        self,
+        make_verifier: Callable[..., SyncTokenVerifier],
+        issue_token: Callable[..., str],
+        mocker,
+    ):
+        log = mocker.patch("keycloak_oauth.sync.log")
+        verifier = make_verifier(
+            jwks_refresh_interval=10, jwks_min_refetch_interval=0, max_stale=100
+        )
+        verifier.verify_token(issue_token())
+
+        def unreachable(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("Keycloak is down", request=request)
+
+        verifier.close()
+        verifier._client_kwargs["transport"] = httpx.MockTransport(unreachable)
+        verifier.jwks._fetched_at -= 50
+        assert verifier.verify_token(issue_token(sub="other")).name == "test"
+        log.exception.assert_called_once()
+
+        verifier.jwks._fetched_at -= 100
+        with pytest.raises(httpx.ConnectError):
+            verifier.verify_token(issue_token(sub="another"))
+
+    def test_shared_with_async_client(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+    ):
+        def unexpected(request: httpx.Request) -> httpx.Response:
+            raise AssertionError(f"Unexpected request to {request.url}")
+
+        verifier = keycloak_oauth.sync_verifier(
+            transport=httpx.MockTransport(unexpected)
+        )
+        assert verifier.verify_token(issue_token()).name == "test"
+        # keys loaded by the sync verifier are used by the async client
+        assert verifier.jwks is keycloak_oauth.jwks
+        assert set(keycloak_oauth.jwks.keys) == {"test-key"}
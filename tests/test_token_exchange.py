@@ -0,0 +1,87 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+from authlib.integrations.starlette_client import OAuthError
+from mock_keycloak import MockKeycloak
+
+from keycloak_oauth import KeycloakOAuth2
+
+
+class TestTokenExchange:
+    @pytest.fixture()
+    def subject_token(self, mock_keycloak: MockKeycloak) -> str:
+        return mock_keycloak.issue_token("test-client", "sid", "openid")["access_token"]
+
+    @pytest.mark.asyncio
+    async def test_exchange(
+        self, mock_keycloak_oauth: KeycloakOAuth2, subject_token: str
+    ):
+        token = await mock_keycloak_oauth.exchange_token(subject_token, "downstream")
+        claims = await mock_keycloak_oauth.parse_claims(token)
+        subject = await mock_keycloak_oauth.parse_claims(
+            {"access_token": subject_token}
+        )
+        assert claims["aud"] == "downstream"
+        assert claims["azp"] == "test-client"
+        assert claims["sub"] == subject["sub"]
+        assert claims["preferred_username"] == "test"
+
+    @pytest.mark.asyncio
+    async def test_cached_per_audience_and_scope(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        subject_token: str,
+    ):
+        token = await mock_keycloak_oauth.exchange_token(subject_token, "downstream")
+        assert (
+            await mock_keycloak_oauth.exchange_token(subject_token, "downstream")
+            is token
+        )
+        assert mock_keycloak.requests["token"] == 1
+
+        other = await mock_keycloak_oauth.exchange_token(subject_token, "other")
+        assert other is not token
+        scoped = await mock_keycloak_oauth.exchange_token(
+            subject_token, "downstream", scope="profile"
+        )
+        assert scoped is not token
+        assert scoped["scope"] == "profile"
+        assert mock_keycloak.requests["token"] == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrent_exchanges_coalesced(
+        self,
+        mock_keycloak: MockKeycloak,
+        mock_keycloak_oauth: KeycloakOAuth2,
+        subject_token: str,
+    ):
+        tokens = await asyncio.gather(
+            *(
+                mock_keycloak_oauth.exchange_token(subject_token, "downstream")
+                for _ in range(10)
+            )
+        )
+        assert all(token is tokens[0] for token in tokens)
+        assert mock_keycloak.requests["token"] == 1
+
+    @pytest.mark.asyncio
+    async def test_not_cached_close_to_expiry(
+        self,
+        mock_keycloak: MockKeycloak,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        subject_token: str,
+    ):
+        # token lifetime of 300s is within the leeway right away
+        keycloak_oauth = make_mock_keycloak_oauth(token_refresh_leeway=400)
+        await keycloak_oauth.exchange_token(subject_token, "downstream")
+        await keycloak_oauth.exchange_token(subject_token, "downstream")
+        assert mock_keycloak.requests["token"] == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_subject_token(
+        self, mock_keycloak_oauth: KeycloakOAuth2, subject_token: str
+    ):
+        with pytest.raises(OAuthError):
+            await mock_keycloak_oauth.exchange_token(subject_token[:-4], "downstream")
@@ -0,0 +1,72 @@
+from collections.abc import Callable
+from typing import Annotated, Any
+
+import pytest
+from authlib.jose.errors import InvalidClaimError
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from keycloak_oauth import KeycloakOAuth2, User
+
+
+class TestUser:
+    def test_from_trusted(self):
+        user = User.model_validate(
+            {
+                "name": "test",
+                "email": "test@bakdata.com",
+                "roles": ["offline_access", "uma_authorization"],
+                "token": "token",
+            }
+        )
+        assert isinstance(user.roles, frozenset)
+        data = user.model_dump(mode="json")
+        assert sorted(data["roles"]) == ["offline_access", "uma_authorization"]
+        assert User.from_trusted(data) == user
+
+    def test_from_claims_null_access(self):
+        user = User.from_claims(
+            {"sub": "test", "realm_access": None, "resource_access": None}, "token"
+        )
+        assert user.roles == frozenset()
+        assert user.client_roles == {}
+
+    @pytest.mark.parametrize(
+        ("claims", "invalid"),
+        [
+            ({"realm_access": ["admin"]}, "realm_access"),
+            ({"resource_access": "admin"}, "resource_access"),
+            ({"resource_access": {"my-app": ["admin"]}}, "resource_access"),
+        ],
+    )
+    def test_from_claims_invalid_access(self, claims: dict[str, Any], invalid: str):
+        with pytest.raises(InvalidClaimError, match=invalid):
+            User.from_claims({"sub": "test", **claims}, "token")
+
+    def test_memoized_per_request(
+        self,
+        keycloak_oauth: KeycloakOAuth2,
+        issue_token: Callable[..., str],
+        make_app: Callable[[KeycloakOAuth2], FastAPI],
+        login: Callable[..., TestClient],
+        mocker,
+    ):
+        load_session = mocker.spy(keycloak_oauth, "_load_session")
+        app = make_app(keycloak_oauth)
+
+        # e.g. `KeycloakAuthProvider` and dependencies which are not cached by FastAPI
+        get_user = Depends(keycloak_oauth.get_user, use_cache=False)
+
+        def name(user: Annotated[User, get_user]) -> str:
+            return user.name
+
+        @app.get("/name")
+        def memoized(
+            user: Annotated[User, get_user],
+            name: Annotated[str, Depends(name)],
+        ) -> str:
+            return name
+
+        client = login(keycloak_oauth, issue_token(), TestClient(app))
+        assert client.get("/name").json() == "test"
+        assert load_session.call_count == 1
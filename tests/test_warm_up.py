@@ -0,0 +1,186 @@
+import asyncio
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+import httpx
+import pytest
+from mock_keycloak import MockKeycloak
+
+from keycloak_oauth import KeycloakOAuth2
+
+
+class SlowTransport(httpx.AsyncBaseTransport):
+    """Delays requests to the mock Keycloak and tracks how many run concurrently."""
+
+    def __init__(self, app: MockKeycloak) -> None:
+        self.transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await self.transport.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+
+def unreachable(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("Keycloak is down", request=request)
+
+
+class TestWarmUp:
+    @pytest.fixture()
+    def snapshot_path(self, tmp_path: Path) -> Path:
+        return tmp_path / "keycloak" / "snapshot.json"
+
+    def access_token(self, mock_keycloak: MockKeycloak) -> str:
+        return mock_keycloak.issue_token("test-client", "sid", "openid")["access_token"]
+
+    @pytest.mark.asyncio
+    async def test_parallel(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+    ):
+        transport = SlowTransport(mock_keycloak)
+        keycloak_oauth = make_mock_keycloak_oauth(transport=transport)
+        await keycloak_oauth.warm_up()
+        assert transport.max_in_flight == 2
+        assert set(keycloak_oauth.jwks.keys) == {"mock-keycloak"}
+        assert "token_endpoint" in keycloak_oauth.keycloak.server_metadata
+
+        # already loaded
+        await keycloak_oauth.warm_up()
+        await keycloak_oauth.verify_token(self.access_token(mock_keycloak))
+        assert mock_keycloak.requests == {"metadata": 1, "certs": 1}
+
+    @pytest.mark.asyncio
+    async def test_other_jwks_uri(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+    ):
+        """Key set announced at another location than Keycloak's default."""
+        jwks_uri = "http://keys.test/certs"
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.endswith("/openid-configuration"):
+                return httpx.Response(
+                    200, json={"issuer": mock_keycloak.issuer, "jwks_uri": jwks_uri}
+                )
+            if request.url == jwks_uri:
+                return httpx.Response(200, json={"keys": []})
+            return httpx.Response(404)
+
+        keycloak_oauth = make_mock_keycloak_oauth(
+            transport=httpx.MockTransport(handler)
+        )
+        await keycloak_oauth.warm_up()
+        assert keycloak_oauth.keycloak.server_metadata["jwks"] == {"keys": []}
+
+    @pytest.mark.asyncio
+    async def test_snapshot(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+        snapshot_path: Path,
+    ):
+        await make_mock_keycloak_oauth(snapshot_path=snapshot_path).warm_up()
+        snapshot = json.loads(snapshot_path.read_text())
+        assert snapshot["metadata_url"] == mock_keycloak.server_metadata_url
+        assert snapshot["metadata"]["issuer"] == mock_keycloak.issuer
+        assert "jwks" not in snapshot["metadata"]
+        assert mock_keycloak.requests == {"metadata": 1, "certs": 1}
+
+        # restart while Keycloak is down
+        keycloak_oauth = make_mock_keycloak_oauth(
+            snapshot_path=snapshot_path, transport=httpx.MockTransport(unreachable)
+        )
+        await keycloak_oauth.warm_up()
+        user = await keycloak_oauth.verify_token(self.access_token(mock_keycloak))
+        assert user.name == "test"
+        assert keycloak_oauth._revalidation is not None
+        await keycloak_oauth._revalidation
+        assert snapshot_path.read_text() == json.dumps(snapshot)
+
+    @pytest.mark.asyncio
+    async def test_snapshot_revalidated(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+        snapshot_path: Path,
+    ):
+        await make_mock_keycloak_oauth(snapshot_path=snapshot_path).warm_up()
+        fetched_at = json.loads(snapshot_path.read_text())["fetched_at"]
+
+        keycloak_oauth = make_mock_keycloak_oauth(snapshot_path=snapshot_path)
+        await keycloak_oauth.warm_up()
+        assert mock_keycloak.requests == {"metadata": 1, "certs": 1}
+        assert keycloak_oauth._revalidation is not None
+        await keycloak_oauth._revalidation
+        assert mock_keycloak.requests == {"metadata": 2, "certs": 2}
+        assert json.loads(snapshot_path.read_text())["fetched_at"] > fetched_at
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        ("max_age", "metadata_url", "content"),
+        [
+            (0, None, None),
+            (3600, "http://keycloak.test/realms/other/", None),
+            (3600, None, "not json"),
+        ],
+    )
+    async def test_snapshot_not_used(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+        snapshot_path: Path,
+        max_age: float,
+        metadata_url: str | None,
+        content: str | None,
+    ):
+        await make_mock_keycloak_oauth(snapshot_path=snapshot_path).warm_up()
+        if metadata_url is not None:
+            snapshot = json.loads(snapshot_path.read_text())
+            snapshot_path.write_text(
+                json.dumps({**snapshot, "metadata_url": metadata_url})
+            )
+        if content is not None:
+            snapshot_path.write_text(content)
+
+        keycloak_oauth = make_mock_keycloak_oauth(
+            snapshot_path=snapshot_path, snapshot_max_age=max_age
+        )
+        await keycloak_oauth.warm_up()
+        assert keycloak_oauth._revalidation is None
+        assert mock_keycloak.requests == {"metadata": 2, "certs": 2}
+        snapshot = json.loads(snapshot_path.read_text())
+        assert snapshot["metadata_url"] == mock_keycloak.server_metadata_url
+
+    @pytest.mark.asyncio
+    async def test_lifespan(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        mock_keycloak: MockKeycloak,
+    ):
+        keycloak_oauth = make_mock_keycloak_oauth()
+        async with keycloak_oauth.lifespan():
+            assert mock_keycloak.requests == {"metadata": 1, "certs": 1}
+            await keycloak_oauth.verify_token(self.access_token(mock_keycloak))
+        assert mock_keycloak.requests == {"metadata": 1, "certs": 1}
+
+    @pytest.mark.asyncio
+    async def test_lifespan_keycloak_down(
+        self,
+        make_mock_keycloak_oauth: Callable[..., KeycloakOAuth2],
+        caplog,
+    ):
+        keycloak_oauth = make_mock_keycloak_oauth(
+            transport=httpx.MockTransport(unreachable)
+        )
+        async with keycloak_oauth.lifespan():
+            assert "Failed to load Keycloak's server metadata" in caplog.text